@@ -0,0 +1,28 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List, Literal
+
+
+class ApprovalDecisionDTO(BaseModel):
+    """DTO para una decisión de aprobación dentro de un lote."""
+    expenseId: str
+    action: Literal["approve", "reject"]
+    comments: Optional[str] = None
+
+
+class ApprovalBatchRequestDTO(BaseModel):
+    """DTO para solicitud de aprobación/rechazo masivo."""
+    decisions: List[ApprovalDecisionDTO] = Field(..., min_length=1, max_length=500)
+
+
+class ApprovalBatchResultDTO(BaseModel):
+    """DTO para el resultado de una decisión del lote."""
+    expenseId: Optional[str] = None
+    status: Optional[str] = None
+    result: str
+
+
+class ApprovalBatchResponseDTO(BaseModel):
+    """DTO para respuesta de aprobación/rechazo masivo."""
+    processed: int
+    updated: int
+    results: List[ApprovalBatchResultDTO]
@@ -4,18 +4,29 @@ from bson import ObjectId
 
 from app.domain.services.expense_service import ExpenseService
 from app.domain.services.company_service import CompanyService
-from app.infrastructure.external.ocr_service import OCRService
+from app.infrastructure.external.fx_service import FXRateNotFound
+
+# Campos del gasto de los que depende su monto en la moneda de la empresa
+FX_FIELDS = ("amount", "currency", "date")
 
 
 class ExpenseUseCase:
     """Caso de uso para gestión de gastos."""
     
-    def __init__(self, expense_service: ExpenseService, company_service: CompanyService, ocr_service: OCRService = None):
+    def __init__(self, expense_service: ExpenseService, company_service: CompanyService, ocr_service=None):
         self.expense_service = expense_service
         self.company_service = company_service
-        self.ocr_service = ocr_service
+        self._ocr_service = ocr_service
+    
+    @property
+    def ocr_service(self):
+        """Servicio OCR; si no se inyectó uno, se importa y crea con el primer uso."""
+        if self._ocr_service is None:
+            from app.infrastructure.external.ocr_service import OCRService
+            self._ocr_service = OCRService()
+        return self._ocr_service
     
-    async def create_expense(self, expense_data: Dict[str, Any], user_id: str) -> Optional[Dict[str, Any]]:
+    async def create_expense(self, expense_data: Dict[str, Any], user_id: str, user_role: str = None) -> Optional[Dict[str, Any]]:
         """Crea un nuevo gasto."""
         # Asegurarse de que el usuario está asignado como creador del gasto
         expense_data["userId"] = ObjectId(user_id)
@@ -24,14 +35,23 @@ class ExpenseUseCase:
         if "companyId" in expense_data and isinstance(expense_data["companyId"], str):
             expense_data["companyId"] = ObjectId(expense_data["companyId"])
         
-        # Validar datos del gasto según la configuración de la empresa
-        company_settings = None
+        # Validar datos del gasto según la política de la empresa
+        company = None
         if "companyId" in expense_data:
             company = await self.company_service.get_by_id(str(expense_data["companyId"]))
-            if company and "settings" in company:
-                company_settings = company["settings"]
         
-        validation = await self.expense_service.validate_expense_data(expense_data, company_settings)
+        if company:
+            # Convertir a la moneda de la empresa una sola vez, al escribir
+            try:
+                self.expense_service.convert_to_company_currency(expense_data, company)
+            except FXRateNotFound as e:
+                return {
+                    "success": False,
+                    "errors": [str(e)]
+                }
+            validation = await self.expense_service.validate_expense_data(expense_data, company=company, user_role=user_role)
+        else:
+            validation = await self.expense_service.validate_expense_data(expense_data, user_role=user_role)
         if not validation["is_valid"]:
             return {
                 "success": False,
@@ -44,6 +64,15 @@ class ExpenseUseCase:
             vendor = expense_data.get("vendor", "")
             expense_data["category"] = await self.expense_service.categorize_expense_auto(description, vendor)
         
+        # Verificar el presupuesto mensual con los contadores del usuario y la categoría
+        if company:
+            budget_errors = await self.expense_service.check_budget(expense_data, company.get("settings"))
+            if budget_errors:
+                return {
+                    "success": False,
+                    "errors": budget_errors
+                }
+        
         # Crear gasto
         new_expense = await self.expense_service.create(expense_data)
         if new_expense:
@@ -74,13 +103,27 @@ class ExpenseUseCase:
         return await self.expense_service.get_by_status(status, company_id, skip, limit)
     
     async def update_expense(self, expense_id: str, expense_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Actualiza un gasto existente."""
+        """Actualiza un gasto existente.
+        
+        Lanza `FXRateNotFound` si la nueva moneda del gasto no tiene tasa.
+        """
         # Convertir IDs a ObjectId
         if "userId" in expense_data and isinstance(expense_data["userId"], str):
             expense_data["userId"] = ObjectId(expense_data["userId"])
         if "companyId" in expense_data and isinstance(expense_data["companyId"], str):
             expense_data["companyId"] = ObjectId(expense_data["companyId"])
         
+        # Recalcular el monto en la moneda de la empresa si cambia el monto, la moneda o la fecha
+        if any(field in expense_data for field in FX_FIELDS):
+            current = await self.expense_service.get_by_id(expense_id)
+            if not current:
+                return None
+            company = await self.company_service.get_by_id(str(current["companyId"]))
+            if company:
+                merged = self.expense_service.convert_to_company_currency({**current, **expense_data}, company)
+                for field in ("companyAmount", "companyCurrency", "fxRate", "fxSource"):
+                    expense_data[field] = merged[field]
+        
         # Añadir fecha de actualización
         expense_data["updatedAt"] = datetime.now()
         
@@ -104,12 +147,6 @@ class ExpenseUseCase:
     
     async def process_receipt_image(self, image_bytes: bytes) -> Dict[str, Any]:
         """Procesa una imagen de boleta/factura y extrae información."""
-        if not self.ocr_service:
-            return {
-                "success": False,
-                "error": "Servicio OCR no disponible"
-            }
-        
         try:
             ocr_result = await self.ocr_service.process_receipt(image_bytes)
             return ocr_result
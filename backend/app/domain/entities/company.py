@@ -10,7 +10,7 @@ class PyObjectId(ObjectId):
         yield cls.validate
 
     @classmethod
-    def validate(cls, v):
+    def validate(cls, v, _info=None):
         if not ObjectId.is_valid(v):
             raise ValueError("ID de MongoDB inválido")
         return ObjectId(v)
@@ -29,12 +29,23 @@ class CompanyAddress(BaseModel):
     country: str = "Chile"
 
 
+class PolicyRule(BaseModel):
+    type: str  # categoryCap, roleLimit, receiptRequired, maxAmount
+    amount: float
+    category: Optional[str] = None
+    role: Optional[str] = None
+    message: Optional[str] = None
+
+
 class CompanySettings(BaseModel):
     currency: str = "CLP"
     approvalWorkflow: bool = True
     categories: List[str] = ["Alimentación", "Transporte", "Alojamiento", "Material Oficina", "Otros"]
     allowedExpenseTypes: List[str] = ["Boleta", "Factura", "Recibo", "Otro"]
     maxExpenseAmount: Optional[int] = None
+    policyRules: List[PolicyRule] = []
+    monthlyUserBudget: Optional[float] = None
+    categoryMonthlyBudgets: Dict[str, float] = {}
 
 
 class CompanyBase(BaseModel):
@@ -44,6 +55,7 @@ class CompanyBase(BaseModel):
     settings: CompanySettings = Field(default_factory=CompanySettings)
     createdAt: datetime = Field(default_factory=datetime.now)
     updatedAt: Optional[datetime] = None
+    settingsVersion: int = 0
     isActive: bool = True
 
 
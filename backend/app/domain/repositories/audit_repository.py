@@ -0,0 +1,28 @@
+from typing import Optional, List, Dict, Any
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+from app.domain.repositories.base_repository import BaseRepository
+from app.domain.repositories.pagination import keyset_after
+
+
+class AuditRepository(BaseRepository):
+    """Repositorio de lectura del registro de auditoría (colección `audit_log`, solo inserciones)."""
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        super().__init__(collection)
+
+    async def find_by_entity(self, entity: str, entity_id: str, after: Optional[tuple] = None,
+                             limit: int = 50) -> List[Dict[str, Any]]:
+        """Registros de una entidad, del más reciente al más antiguo, con paginación por cursor (at, _id).
+
+        Usa el índice {entity, entityId, at, _id}.
+        """
+        query: Dict[str, Any] = {
+            "entity": entity,
+            "entityId": ObjectId(entity_id) if ObjectId.is_valid(entity_id) else entity_id
+        }
+        if after:
+            query.update(keyset_after("at", after[0], after[1]))
+
+        cursor = self.collection.find(query).sort([("at", -1), ("_id", -1)]).limit(limit)
+        return await cursor.to_list(length=limit)
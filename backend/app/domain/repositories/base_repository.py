@@ -1,30 +1,37 @@
 from typing import Generic, TypeVar, List, Optional, Dict, Any
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorCollection
+from app.infrastructure.audit.audit_log import get_audit_log
 
 T = TypeVar('T')
 
 class BaseRepository(Generic[T]):
     """Repositorio base para operaciones CRUD con MongoDB."""
     
+    # Campos internos que no se devuelven en las lecturas (p. ej. índices desnormalizados)
+    default_projection: Optional[Dict[str, Any]] = None
+    # Nombre con el que se auditan las modificaciones (`None`: el repositorio no se audita)
+    audit_entity: Optional[str] = None
+    
     def __init__(self, collection: AsyncIOMotorCollection):
         self.collection = collection
     
     async def find_all(self, query: Dict[str, Any] = None, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
         """Encuentra todos los documentos que coinciden con la consulta."""
         query = query or {}
-        cursor = self.collection.find(query).skip(skip).limit(limit)
+        cursor = self.collection.find(query, self.default_projection).skip(skip).limit(limit)
         return await cursor.to_list(length=limit)
     
     async def find_by_id(self, id: str) -> Optional[Dict[str, Any]]:
         """Encuentra un documento por su ID."""
         if not ObjectId.is_valid(id):
             return None
-        return await self.collection.find_one({"_id": ObjectId(id)})
+        return await self.collection.find_one({"_id": ObjectId(id)}, self.default_projection)
     
     async def create(self, document: Dict[str, Any]) -> Dict[str, Any]:
         """Crea un nuevo documento."""
         result = await self.collection.insert_one(document)
+        self.audit("create", result.inserted_id, document)
         return await self.find_by_id(str(result.inserted_id))
     
     async def update(self, id: str, document: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -42,6 +49,7 @@ class BaseRepository(Generic[T]):
         )
         
         if result.modified_count:
+            self.audit("update", id, document)
             return await self.find_by_id(id)
         return None
     
@@ -51,9 +59,19 @@ class BaseRepository(Generic[T]):
             return False
             
         result = await self.collection.delete_one({"_id": ObjectId(id)})
+        if result.deleted_count:
+            self.audit("delete", id)
         return result.deleted_count > 0
     
     async def count(self, query: Dict[str, Any] = None) -> int:
         """Cuenta documentos que coinciden con la consulta."""
         query = query or {}
-        return await self.collection.count_documents(query)
\ No newline at end of file
+        return await self.collection.count_documents(query)
+    
+    def audit(self, action: str, id: Any, changes: Dict[str, Any] = None):
+        """Encola el registro de auditoría de una modificación; no espera su escritura."""
+        if self.audit_entity is None:
+            return
+        audit_log = get_audit_log()
+        if audit_log is not None:
+            audit_log.record(self.audit_entity, id, action, changes)
@@ -0,0 +1,164 @@
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from motor.motor_asyncio import AsyncIOMotorCollection
+from app.domain.repositories.base_repository import BaseRepository
+
+# Campos del gasto que determinan a qué contadores aporta
+BUDGET_FIELDS = ("companyId", "userId", "category", "date", "amount", "companyAmount", "status")
+
+# Los gastos rechazados no consumen presupuesto
+EXCLUDED_STATUSES = ("rejected",)
+
+
+def budget_period(date: datetime) -> str:
+    """Periodo mensual (AAAA-MM) al que se imputa un gasto."""
+    return f"{date.year:04d}-{date.month:02d}"
+
+
+def budget_keys(expense: Dict[str, Any]) -> List[Tuple[ObjectId, str, Any, str]]:
+    """Contadores (empresa, alcance, clave, periodo) a los que aporta un gasto."""
+    if expense.get("status") in EXCLUDED_STATUSES or not isinstance(expense.get("date"), datetime):
+        return []
+    if not expense.get("companyId"):
+        return []
+
+    period = budget_period(expense["date"])
+    keys = []
+    if expense.get("userId"):
+        keys.append((expense["companyId"], "user", expense["userId"], period))
+    if expense.get("category"):
+        keys.append((expense["companyId"], "category", expense["category"], period))
+    return keys
+
+
+class BudgetRepository(BaseRepository):
+    """Repositorio de contadores de gasto por usuario o categoría y por mes.
+
+    Los montos se acumulan en la moneda de la empresa.
+
+    Los contadores se mantienen en cada escritura de gastos con `$inc`, de modo
+    que consultar cuánto lleva gastado un usuario en el mes es una lectura por
+    índice en lugar de una agregación sobre su historial.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        super().__init__(collection)
+
+    def build_changes(self, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> Dict[tuple, List[float]]:
+        """Calcula los incrementos (monto, cantidad) de cada contador entre dos versiones de un gasto."""
+        changes: Dict[tuple, List[float]] = {}
+        for expense, sign in ((before, -1), (after, 1)):
+            if not expense:
+                continue
+            for key in budget_keys(expense):
+                delta = changes.setdefault(key, [0.0, 0])
+                delta[0] += sign * (expense.get("companyAmount", expense.get("amount")) or 0)
+                delta[1] += sign
+        # Un cambio que no altera el aporte del gasto no genera escritura
+        return {key: delta for key, delta in changes.items() if delta[0] or delta[1]}
+
+    async def apply_changes(self, changes: Dict[tuple, List[float]]) -> None:
+        """Aplica los incrementos en un único `bulk_write`, creando los contadores que falten."""
+        if not changes:
+            return
+
+        now = datetime.now()
+        operations = [
+            UpdateOne(
+                {"companyId": company_id, "scope": scope, "key": key, "period": period},
+                {"$inc": {"amount": amount, "count": count}, "$set": {"updatedAt": now}},
+                upsert=True
+            )
+            for (company_id, scope, key, period), (amount, count) in changes.items()
+        ]
+        await self.collection.bulk_write(operations, ordered=False)
+
+    async def record(self, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> None:
+        """Actualiza los contadores por la transición de un gasto (`None` si no existía o ya no existe)."""
+        await self.apply_changes(self.build_changes(before, after))
+
+    async def record_many(self, transitions: Iterable[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]) -> None:
+        """Actualiza los contadores por varias transiciones en una sola escritura."""
+        changes: Dict[tuple, List[float]] = {}
+        for before, after in transitions:
+            for key, (amount, count) in self.build_changes(before, after).items():
+                delta = changes.setdefault(key, [0.0, 0])
+                delta[0] += amount
+                delta[1] += count
+        await self.apply_changes(changes)
+
+    async def find_for_expense(self, expense: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Obtiene en una lectura los contadores del usuario y la categoría del gasto en su mes.
+
+        Devuelve un dict con las claves `user` y/o `category`.
+        """
+        keys = budget_keys({**expense, "status": "pending"})
+        if not keys:
+            return {}
+
+        company_id, _, _, period = keys[0]
+        query = {
+            "companyId": company_id,
+            "period": period,
+            "$or": [{"scope": scope, "key": key} for _, scope, key, _ in keys]
+        }
+        return {doc["scope"]: doc async for doc in self.collection.find(query)}
+
+    async def rebuild(self, expenses: AsyncIOMotorCollection, company_id: str = None,
+                      archive: AsyncIOMotorCollection = None) -> int:
+        """Recalcula los contadores desde los gastos y elimina los que quedaron sin gastos.
+
+        Si se entrega `archive`, los gastos archivados también cuentan.
+
+        Los totales se calculan y escriben en el servidor con `$merge`. Las
+        escrituras de gastos concurrentes con la reconstrucción pueden perderse,
+        por lo que conviene ejecutarla en horario de poca actividad. Devuelve la
+        cantidad de contadores vigentes.
+        """
+        # MongoDB guarda milisegundos; se trunca para comparar con lo que queda escrito
+        started = datetime.now()
+        started = started.replace(microsecond=started.microsecond - started.microsecond % 1000)
+        match = {"status": {"$nin": list(EXCLUDED_STATUSES)}, "date": {"$type": "date"}}
+        scope_filter = {}
+        if company_id:
+            match["companyId"] = ObjectId(company_id)
+            scope_filter["companyId"] = ObjectId(company_id)
+
+        for scope, field in (("user", "$userId"), ("category", "$category")):
+            stages = [{"$match": {**match, field[1:]: {"$ne": None}}}]
+            if archive is not None:
+                stages.append({"$unionWith": {"coll": archive.name, "pipeline": list(stages)}})
+            pipeline = stages + [
+                {"$group": {
+                    "_id": {
+                        "companyId": "$companyId",
+                        "key": field,
+                        "period": {"$dateToString": {"format": "%Y-%m", "date": "$date"}}
+                    },
+                    "amount": {"$sum": {"$ifNull": ["$companyAmount", "$amount"]}},
+                    "count": {"$sum": 1}
+                }},
+                {"$project": {
+                    "_id": 0,
+                    "companyId": "$_id.companyId",
+                    "scope": {"$literal": scope},
+                    "key": "$_id.key",
+                    "period": "$_id.period",
+                    "amount": 1,
+                    "count": 1,
+                    "updatedAt": {"$literal": started}
+                }},
+                {"$merge": {
+                    "into": self.collection.name,
+                    "on": ["companyId", "scope", "key", "period"],
+                    "whenMatched": "replace",
+                    "whenNotMatched": "insert"
+                }}
+            ]
+            await expenses.aggregate(pipeline).to_list(None)
+
+        # Los contadores que no se reescribieron ya no tienen gastos que los respalden
+        await self.collection.delete_many({**scope_filter, "updatedAt": {"$lt": started}})
+        return await self.collection.count_documents(scope_filter)
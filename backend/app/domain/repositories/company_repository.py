@@ -1,14 +1,20 @@
 from typing import Optional, List, Dict, Any
+from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorCollection
 from app.domain.repositories.base_repository import BaseRepository
 from app.domain.entities.company import Company
+from app.infrastructure.cache.invalidation import InvalidationBus, company_key
 
 
 class CompanyRepository(BaseRepository[Company]):
     """Repositorio para operaciones con empresas."""
     
-    def __init__(self, collection: AsyncIOMotorCollection):
+    audit_entity = "company"
+    
+    def __init__(self, collection: AsyncIOMotorCollection, invalidation_bus: InvalidationBus = None):
         super().__init__(collection)
+        # Si está presente, cada modificación avisa a los demás workers para que descarten su caché
+        self.invalidation_bus = invalidation_bus
     
     async def find_by_rut(self, rut: str) -> Optional[Dict[str, Any]]:
         """Encuentra una empresa por su RUT."""
@@ -19,6 +25,46 @@ class CompanyRepository(BaseRepository[Company]):
         cursor = self.collection.find({"isActive": True}).skip(skip).limit(limit)
         return await cursor.to_list(length=limit)
     
+    async def update(self, id: str, document: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Actualiza una empresa.
+        
+        Si cambia la configuración se incrementa `settingsVersion`, que identifica
+        la versión de la política compilada que se puede reutilizar.
+        """
+        return await self._update(id, document, "update_settings" if "settings" in document else "update")
+    
+    async def _update(self, id: str, document: Dict[str, Any], action: str) -> Optional[Dict[str, Any]]:
+        """Aplica la actualización, avisa a los demás workers y la audita con la acción indicada."""
+        if not ObjectId.is_valid(id):
+            return None
+            
+        document.pop("_id", None)
+        document.pop("settingsVersion", None)
+        
+        update = {"$set": document}
+        if "settings" in document:
+            update["$inc"] = {"settingsVersion": 1}
+        
+        result = await self.collection.update_one({"_id": ObjectId(id)}, update)
+        
+        if result.modified_count:
+            self.audit(action, id, document)
+            await self.publish_change(id)
+            return await self.find_by_id(id)
+        return None
+    
+    async def delete(self, id: str) -> bool:
+        """Elimina una empresa."""
+        deleted = await super().delete(id)
+        if deleted:
+            await self.publish_change(id)
+        return deleted
+    
+    async def publish_change(self, id: str):
+        """Avisa a todos los workers que la empresa cambió."""
+        if self.invalidation_bus:
+            await self.invalidation_bus.publish(company_key(id))
+    
     async def update_settings(self, id: str, settings: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Actualiza la configuración de una empresa."""
         from datetime import datetime
@@ -40,5 +86,5 @@ class CompanyRepository(BaseRepository[Company]):
             "updatedAt": datetime.now()
         }
         
-        result = await self.update(id, update_doc)
+        result = await self._update(id, update_doc, "deactivate")
         return result is not None
\ No newline at end of file
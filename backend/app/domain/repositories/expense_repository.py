@@ -1,32 +1,275 @@
+import asyncio
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from bson import ObjectId
+from pymongo import UpdateOne, ReplaceOne, DeleteOne
 from motor.motor_asyncio import AsyncIOMotorCollection
 from app.domain.repositories.base_repository import BaseRepository
+from app.domain.repositories.pagination import keyset_after
+from app.domain.repositories.budget_repository import BudgetRepository, BUDGET_FIELDS
 from app.domain.entities.expense import Expense
+from app.domain.services.text_search import build_search_fields, SEARCH_FIELDS
+from app.infrastructure.cache.ttl_cache import TTLCache
+from app.infrastructure.external.fx_service import FX_SOURCE_FALLBACK
+
+# Monto en la moneda de la empresa, calculado al escribir; los gastos aún sin migrar usan su monto original
+COMPANY_AMOUNT = {"$ifNull": ["$companyAmount", "$amount"]}
+
+# Gastos antiguos movidos fuera de la colección activa y marca de agua con la fecha de corte
+ARCHIVE_COLLECTION = "expenses_archive"
+WATERMARK_COLLECTION = "archive_watermarks"
+
+# Gastos eliminados, para que la sincronización incremental de los clientes pueda informarlos
+TOMBSTONE_COLLECTION = "expense_tombstones"
+
+# Solo se archivan gastos cerrados; los pendientes siguen en la colección activa aunque sean antiguos
+ARCHIVED_STATUSES = ("approved", "rejected")
+
+# Campo que se marca en la colección activa justo antes de borrar un gasto ya copiado al archivo:
+# el change stream reconoce así los traslados y no los anuncia como eliminaciones
+ARCHIVE_MARKER = "archivedAt"
+
+# Cada worker relee la marca de agua del archivo cada este número de segundos
+WATERMARK_CACHE_SECONDS = 30
+_watermark_cache = TTLCache(WATERMARK_CACHE_SECONDS, max_entries=16)
+_NO_WATERMARK = object()
 
 
 class ExpenseRepository(BaseRepository[Expense]):
     """Repositorio para operaciones con gastos."""
     
-    def __init__(self, collection: AsyncIOMotorCollection):
+    default_projection = {"search": 0}
+    audit_entity = "expense"
+    
+    def __init__(self, collection: AsyncIOMotorCollection, budget_repository: BudgetRepository = None,
+                 archive: AsyncIOMotorCollection = None, watermarks: AsyncIOMotorCollection = None,
+                 tombstones: AsyncIOMotorCollection = None):
         super().__init__(collection)
+        # Si está presente, cada escritura mantiene los contadores de presupuesto
+        self.budget_repository = budget_repository
+        # Gastos antiguos movidos fuera de la colección activa y la marca de agua que indica hasta qué fecha
+        self.archive = archive
+        self.watermarks = watermarks
+        # Si está presente, cada eliminación deja una lápida con su fecha
+        self.tombstones = tombstones
+    
+    async def archive_cutoff(self, fresh: bool = False) -> Optional[datetime]:
+        """Fecha de corte del archivo: todo gasto archivado es anterior a ella. `None` si no se ha archivado nada."""
+        if self.archive is None or self.watermarks is None:
+            return None
+        cutoff = _NO_WATERMARK if fresh else _watermark_cache.get(self.archive.name, _NO_WATERMARK)
+        if cutoff is _NO_WATERMARK:
+            watermark = await self.watermarks.find_one({"_id": self.archive.name})
+            cutoff = watermark["cutoff"] if watermark else None
+            _watermark_cache.set(self.archive.name, cutoff)
+        return cutoff
+    
+    async def _needs_archive(self, start_date: datetime = None) -> bool:
+        """Indica si una consulta desde `start_date` (o sin límite inferior) puede encontrar gastos archivados."""
+        cutoff = await self.archive_cutoff()
+        return cutoff is not None and (start_date is None or start_date < cutoff)
+    
+    def _union_archive(self, stages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Aplica las mismas etapas a la colección activa y al archivo, y une los resultados."""
+        return stages + [{"$unionWith": {"coll": self.archive.name, "pipeline": stages}}]
+    
+    async def _find_sorted(self, query: Dict[str, Any], sort: List[tuple], skip: int, limit: int,
+                           start_date: datetime = None) -> List[Dict[str, Any]]:
+        """Busca gastos ordenados por fecha descendente, consultando el archivo solo si hace falta.
+        
+        Primero se lee la página en la colección activa. Como todo lo archivado es
+        anterior al corte, si la página se completó con gastos posteriores al corte
+        el archivo no puede cambiarla; si no, se repite la consulta sobre ambas
+        colecciones con `$unionWith`.
+        """
+        cursor = self.collection.find(query, self.default_projection).sort(sort).skip(skip).limit(limit)
+        documents = await cursor.to_list(length=limit)
+        
+        if not await self._needs_archive(start_date):
+            return documents
+        cutoff = await self.archive_cutoff()
+        last_date = documents[-1].get("date") if documents else None
+        if len(documents) == limit and isinstance(last_date, datetime) and last_date >= cutoff:
+            return documents
+        
+        order = dict(sort)
+        pipeline = self._union_archive([
+            {"$match": query},
+            {"$sort": order},
+            {"$limit": skip + limit},
+            {"$project": self.default_projection}
+        ]) + [{"$sort": order}, {"$skip": skip}, {"$limit": limit}]
+        return await self.collection.aggregate(pipeline).to_list(length=limit)
+    
+    async def find_by_id(self, id: str) -> Optional[Dict[str, Any]]:
+        """Encuentra un gasto por su ID, buscándolo en el archivo si ya no está en la colección activa."""
+        document = await super().find_by_id(id)
+        if document is None and ObjectId.is_valid(id) and await self.archive_cutoff() is not None:
+            document = await self.archive.find_one({"_id": ObjectId(id)}, self.default_projection)
+        return document
+    
+    async def create(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        """Crea un gasto calculando sus términos de búsqueda y sumándolo a los presupuestos."""
+        document["search"] = build_search_fields(document)
+        # La sincronización de los clientes recorre los gastos por fecha de modificación;
+        # `ExpenseCreate` trae `updatedAt: None`, así que no basta con `setdefault`
+        if not document.get("updatedAt"):
+            document["updatedAt"] = document.get("createdAt") or datetime.now()
+        created = await super().create(document)
+        if self.budget_repository and created:
+            await self.budget_repository.record(None, created)
+        return created
+    
+    async def restore_from_archive(self, id: str) -> bool:
+        """Devuelve un gasto archivado a la colección activa. Indica si estaba en el archivo.
+        
+        Las escrituras de un gasto archivado se hacen en la colección activa, donde
+        la sincronización y el change stream las ven; el gasto vuelve a archivarse
+        cuando cumpla de nuevo las condiciones.
+        """
+        if not ObjectId.is_valid(id) or await self.archive_cutoff() is None:
+            return False
+        document = await self.archive.find_one({"_id": ObjectId(id)})
+        if not document:
+            return False
+        # Se copia antes de borrarlo del archivo: si se interrumpe, queda en ambas y manda la activa
+        await self.collection.replace_one({"_id": document["_id"]}, document, upsert=True)
+        await self.archive.delete_one({"_id": document["_id"]})
+        return True
+    
+    async def update(self, id: str, document: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Actualiza un gasto, recalculando los términos de búsqueda si cambian campos indexados.
+        
+        Si cambia el monto, la fecha, la categoría, el usuario o el estado, los
+        contadores de presupuesto se ajustan según la versión anterior del gasto.
+        Un gasto archivado vuelve primero a la colección activa.
+        """
+        updated = await self._update(id, document)
+        if updated is None and await self.restore_from_archive(id):
+            updated = await self._update(id, document)
+        return updated
+    
+    async def _update(self, id: str, document: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        document.setdefault("updatedAt", datetime.now())
+        if any(field in document for field in SEARCH_FIELDS):
+            current = await self.find_by_id(id)
+            if not current:
+                return None
+            document["search"] = build_search_fields({**current, **document})
+        
+        if not self.budget_repository or not any(field in document for field in BUDGET_FIELDS):
+            return await super().update(id, document)
+        
+        if not ObjectId.is_valid(id):
+            return None
+        
+        document.pop("_id", None)
+        before = await self.collection.find_one_and_update(
+            {"_id": ObjectId(id)},
+            {"$set": document},
+            projection={field: 1 for field in BUDGET_FIELDS}
+        )
+        if not before:
+            return None
+        
+        self.audit("update", id, document)
+        await self.budget_repository.record(before, {**before, **document})
+        return await self.find_by_id(id)
+    
+    async def delete(self, id: str) -> bool:
+        """Elimina un gasto, lo descuenta de los presupuestos y deja su lápida para la sincronización."""
+        return await self.delete_returning(id) is not None
+    
+    async def delete_returning(self, id: str) -> Optional[Dict[str, Any]]:
+        """Como `delete`, pero devuelve los campos de presupuesto del gasto eliminado (incluido `companyId`).
+        
+        Un gasto archivado vuelve primero a la colección activa, de modo que el
+        borrado también llega al change stream.
+        """
+        deleted = await self._delete_returning(id)
+        if deleted is None and await self.restore_from_archive(id):
+            deleted = await self._delete_returning(id)
+        return deleted
+    
+    async def _delete_returning(self, id: str) -> Optional[Dict[str, Any]]:
+        if not ObjectId.is_valid(id):
+            return None
+        
+        before = await self.collection.find_one_and_delete(
+            {"_id": ObjectId(id)},
+            projection={field: 1 for field in BUDGET_FIELDS}
+        )
+        if not before:
+            return None
+        
+        self.audit("delete", id)
+        if self.tombstones is not None:
+            await self.tombstones.replace_one(
+                {"_id": before["_id"]},
+                {"userId": before.get("userId"), "companyId": before.get("companyId"), "deletedAt": datetime.now()},
+                upsert=True
+            )
+        if self.budget_repository:
+            await self.budget_repository.record(before, None)
+        return before
+    
+    async def find_changes(self, user_id: str, until: datetime, after: Optional[tuple] = None, limit: int = 500,
+                           include_archive: bool = False) -> List[Dict[str, Any]]:
+        """Gastos de un usuario creados, modificados o eliminados hasta `until`, en orden (fecha del cambio, _id).
+        
+        Los eliminados se devuelven como lápidas `{"_id", "deletedAt", "deleted": True}`.
+        Cada fuente se lee como un rango del índice {userId, fecha, _id} a partir
+        del cursor `after`, así que una sincronización sin cambios no recorre
+        documentos. Con `include_archive` también se leen los gastos archivados.
+        """
+        if not ObjectId.is_valid(user_id):
+            return []
+        
+        def range_query(field: str) -> Dict[str, Any]:
+            query = {"userId": ObjectId(user_id), field: {"$lte": until}}
+            if after:
+                query.update(keyset_after(field, after[0], after[1], descending=False))
+            return query
+        
+        changed_sort = [("updatedAt", 1), ("_id", 1)]
+        reads = [
+            self.collection.find(range_query("updatedAt"), self.default_projection)
+            .sort(changed_sort).limit(limit).to_list(length=limit)
+        ]
+        if self.tombstones is not None:
+            reads.append(
+                self.tombstones.find(range_query("deletedAt"), {"deletedAt": 1})
+                .sort([("deletedAt", 1), ("_id", 1)]).limit(limit).to_list(length=limit)
+            )
+        if include_archive and await self._needs_archive():
+            reads.append(
+                self.archive.find(range_query("updatedAt"), self.default_projection)
+                .sort(changed_sort).limit(limit).to_list(length=limit)
+            )
+        
+        changes = {}
+        for documents in await asyncio.gather(*reads):
+            for document in documents:
+                if "deletedAt" in document:
+                    document["deleted"] = True
+                # Un gasto que se está archivando puede estar en ambas colecciones
+                changes[document["_id"]] = document
+        ordered = sorted(changes.values(), key=lambda d: (d.get("updatedAt") or d.get("deletedAt"), d["_id"]))
+        return ordered[:limit]
     
     async def find_by_user(self, user_id: str, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
         """Encuentra gastos por ID de usuario."""
         if not ObjectId.is_valid(user_id):
             return []
             
-        cursor = self.collection.find({"userId": ObjectId(user_id)}).sort("date", -1).skip(skip).limit(limit)
-        return await cursor.to_list(length=limit)
+        return await self._find_sorted({"userId": ObjectId(user_id)}, [("date", -1)], skip, limit)
     
     async def find_by_company(self, company_id: str, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
         """Encuentra gastos por ID de empresa."""
         if not ObjectId.is_valid(company_id):
             return []
             
-        cursor = self.collection.find({"companyId": ObjectId(company_id)}).sort("date", -1).skip(skip).limit(limit)
-        return await cursor.to_list(length=limit)
+        return await self._find_sorted({"companyId": ObjectId(company_id)}, [("date", -1)], skip, limit)
     
     async def find_by_status(self, status: str, company_id: str = None, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
         """Encuentra gastos por estado y opcionalmente por empresa."""
@@ -35,8 +278,10 @@ class ExpenseRepository(BaseRepository[Expense]):
         if company_id and ObjectId.is_valid(company_id):
             query["companyId"] = ObjectId(company_id)
             
-        cursor = self.collection.find(query).sort("date", -1).skip(skip).limit(limit)
-        return await cursor.to_list(length=limit)
+        if status not in ARCHIVED_STATUSES:
+            cursor = self.collection.find(query, self.default_projection).sort("date", -1).skip(skip).limit(limit)
+            return await cursor.to_list(length=limit)
+        return await self._find_sorted(query, [("date", -1)], skip, limit)
     
     async def find_by_date_range(self, start_date: datetime, end_date: datetime, 
                                 company_id: str = None, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
@@ -46,11 +291,16 @@ class ExpenseRepository(BaseRepository[Expense]):
         if company_id and ObjectId.is_valid(company_id):
             query["companyId"] = ObjectId(company_id)
             
-        cursor = self.collection.find(query).sort("date", -1).skip(skip).limit(limit)
-        return await cursor.to_list(length=limit)
+        return await self._find_sorted(query, [("date", -1)], skip, limit, start_date)
     
     async def update_status(self, id: str, status: str, approver_id: str, comments: str = None) -> Optional[Dict[str, Any]]:
-        """Actualiza el estado de un gasto y añade un paso de aprobación."""
+        """Actualiza el estado de un gasto y añade un paso de aprobación; un gasto archivado vuelve a la colección activa."""
+        updated = await self._update_status(id, status, approver_id, comments)
+        if updated is None and await self.restore_from_archive(id):
+            updated = await self._update_status(id, status, approver_id, comments)
+        return updated
+    
+    async def _update_status(self, id: str, status: str, approver_id: str, comments: str = None) -> Optional[Dict[str, Any]]:
         if not ObjectId.is_valid(id) or not ObjectId.is_valid(approver_id):
             return None
             
@@ -62,8 +312,8 @@ class ExpenseRepository(BaseRepository[Expense]):
             "comments": comments
         }
         
-        # Actualizar el documento
-        result = await self.collection.update_one(
+        # Actualizar el documento, conservando su versión anterior para los presupuestos
+        before = await self.collection.find_one_and_update(
             {"_id": ObjectId(id)},
             {
                 "$set": {
@@ -73,19 +323,344 @@ class ExpenseRepository(BaseRepository[Expense]):
                 "$push": {
                     "approvalFlow": approval_step
                 }
-            }
+            },
+            projection={field: 1 for field in BUDGET_FIELDS}
         )
         
-        if result.modified_count:
-            return await self.find_by_id(id)
-        return None
+        if not before:
+            return None
+        
+        self.audit("update_status", id, {"status": status, "comments": comments})
+        if self.budget_repository:
+            await self.budget_repository.record(before, {**before, "status": status})
+        return await self.find_by_id(id)
     
-    async def get_stats_by_category(self, company_id: str, start_date: datetime = None, end_date: datetime = None) -> List[Dict[str, Any]]:
-        """Obtiene estadísticas de gastos por categoría."""
+    async def find_approval_inbox(self, company_id: str, status: str = "pending",
+                                  after: Optional[tuple] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Encuentra gastos de una empresa por estado con paginación por cursor (fecha, _id).
+        
+        Usa el índice {companyId, status, date, _id}, por lo que cada página cuesta
+        lo mismo sin importar cuántas páginas se hayan recorrido antes.
+        """
         if not ObjectId.is_valid(company_id):
             return []
             
-        # Construir el match de la agregación
+        query = {"companyId": ObjectId(company_id), "status": status}
+        
+        if after:
+            query.update(keyset_after("date", after[0], after[1]))
+            
+        if status not in ARCHIVED_STATUSES:
+            cursor = self.collection.find(query, self.default_projection).sort([("date", -1), ("_id", -1)]).limit(limit)
+            return await cursor.to_list(length=limit)
+        return await self._find_sorted(query, [("date", -1), ("_id", -1)], 0, limit)
+    
+    async def bulk_update_status(self, decisions: List[Dict[str, Any]], approver_id: str,
+                                 company_id: str) -> List[Dict[str, Any]]:
+        """Aplica decisiones de aprobación/rechazo en un único `bulk_write`.
+        
+        Cada decisión es un dict con `expenseId`, `status` y `comments` opcionales.
+        Solo se modifican gastos pendientes de la empresa indicada. Devuelve un
+        resultado por decisión, en el mismo orden en que se recibieron.
+        """
+        if not ObjectId.is_valid(approver_id) or not ObjectId.is_valid(company_id):
+            return [{"expenseId": d.get("expenseId"), "result": "invalid"} for d in decisions]
+            
+        valid_ids = [ObjectId(d["expenseId"]) for d in decisions if ObjectId.is_valid(d.get("expenseId"))]
+        
+        # Una sola lectura para saber qué gastos pueden procesarse
+        cursor = self.collection.find(
+            {"_id": {"$in": valid_ids}},
+            {field: 1 for field in BUDGET_FIELDS}
+        )
+        existing = {doc["_id"]: doc async for doc in cursor}
+        
+        # MongoDB guarda milisegundos; truncamos para poder reconocer nuestros pasos después
+        now = datetime.now()
+        now = now.replace(microsecond=now.microsecond - now.microsecond % 1000)
+        company_oid = ObjectId(company_id)
+        operations = []
+        results = []
+        seen = set()
+        
+        for decision in decisions:
+            expense_id = decision.get("expenseId")
+            result = {"expenseId": expense_id, "status": decision.get("status")}
+            results.append(result)
+            
+            if not ObjectId.is_valid(expense_id):
+                result["result"] = "invalid"
+                continue
+                
+            oid = ObjectId(expense_id)
+            current = existing.get(oid)
+            
+            if oid in seen:
+                result["result"] = "duplicate"
+            elif not current or current.get("companyId") != company_oid:
+                result["result"] = "not_found"
+            elif current.get("status") != "pending":
+                result["result"] = "not_pending"
+            else:
+                seen.add(oid)
+                approval_step = {
+                    "userId": ObjectId(approver_id),
+                    "status": decision["status"],
+                    "date": now,
+                    "comments": decision.get("comments")
+                }
+                # El filtro por estado evita pisar una decisión concurrente
+                operations.append(UpdateOne(
+                    {"_id": oid, "companyId": company_oid, "status": "pending"},
+                    {
+                        "$set": {"status": decision["status"], "updatedAt": now},
+                        "$push": {"approvalFlow": approval_step}
+                    }
+                ))
+                result["result"] = "updated"
+        
+        if operations:
+            write_result = await self.collection.bulk_write(operations, ordered=False)
+            
+            # Si otro aprobador se adelantó, no podemos saber cuál falló sin releer
+            if write_result.modified_count < len(operations):
+                updated_ids = [ObjectId(r["expenseId"]) for r in results if r["result"] == "updated"]
+                still_ours = self.collection.find(
+                    {"_id": {"$in": updated_ids}, "approvalFlow": {"$elemMatch": {"userId": ObjectId(approver_id), "date": now}}},
+                    {"_id": 1}
+                )
+                confirmed = {doc["_id"] async for doc in still_ours}
+                for r in results:
+                    if r["result"] == "updated" and ObjectId(r["expenseId"]) not in confirmed:
+                        r["result"] = "not_pending"
+            
+            comments = {d.get("expenseId"): d.get("comments") for d in decisions}
+            for r in results:
+                if r["result"] == "updated":
+                    self.audit("update_status", r["expenseId"], {"status": r["status"], "comments": comments.get(r["expenseId"])})
+            
+            if self.budget_repository:
+                previous = [existing[ObjectId(r["expenseId"])] for r in results if r["result"] == "updated"]
+                statuses = [r["status"] for r in results if r["result"] == "updated"]
+                await self.budget_repository.record_many(
+                    (before, {**before, "status": new_status}) for before, new_status in zip(previous, statuses)
+                )
+        
+        return results
+    
+    async def search(self, terms: List[str], company_id: str = None, user_id: str = None,
+                     after: Optional[tuple] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Busca gastos por términos normalizados, ordenados por relevancia.
+        
+        Cada término debe coincidir con el prefijo de alguna palabra del gasto.
+        La relevancia es el número de términos que coinciden con palabras completas;
+        los empates se ordenan por fecha. `after` es la tupla (puntuación, fecha, _id)
+        del último resultado de la página anterior.
+        """
+        if not terms:
+            return []
+            
+        match = {"search.prefixes": {"$all": terms}}
+        
+        if user_id and ObjectId.is_valid(user_id):
+            match["userId"] = ObjectId(user_id)
+        elif company_id and ObjectId.is_valid(company_id):
+            match["companyId"] = ObjectId(company_id)
+        else:
+            return []
+        
+        pipeline = [
+            {"$match": match},
+            {"$addFields": {"score": {"$size": {"$setIntersection": ["$search.words", terms]}}}}
+        ]
+        
+        if after:
+            score, date, last_id = after
+            pipeline.append({"$match": {"$or": [
+                {"score": {"$lt": score}},
+                {"score": score, "date": {"$lt": date}},
+                {"score": score, "date": date, "_id": {"$lt": last_id}}
+            ]}})
+        
+        ranking = [
+            {"$sort": {"score": -1, "date": -1, "_id": -1}},
+            {"$limit": limit}
+        ]
+        pipeline += ranking
+        # La relevancia no depende de la fecha: si hay archivo, se busca en ambas colecciones
+        if await self._needs_archive():
+            pipeline = self._union_archive(pipeline) + ranking
+        pipeline.append({"$project": {"search": 0}})
+        
+        return await self.collection.aggregate(pipeline).to_list(length=limit)
+    
+    async def rebuild_search_fields(self, batch_size: int = 1000, only_missing: bool = True) -> int:
+        """Recalcula los términos de búsqueda de gastos existentes. Devuelve cuántos se actualizaron.
+        
+        No cambia `updatedAt`: los términos no se entregan a los clientes (quedan
+        fuera de `default_projection`), así que la sincronización no debe reenviar el gasto.
+        """
+        query = {"search": {"$exists": False}} if only_missing else {}
+        projection = {field: 1 for field in SEARCH_FIELDS}
+        updated = 0
+        operations = []
+        
+        async for document in self.collection.find(query, projection):
+            operations.append(UpdateOne(
+                {"_id": document["_id"]},
+                {"$set": {"search": build_search_fields(document)}}
+            ))
+            if len(operations) >= batch_size:
+                result = await self.collection.bulk_write(operations, ordered=False)
+                updated += result.modified_count
+                operations = []
+        
+        if operations:
+            result = await self.collection.bulk_write(operations, ordered=False)
+            updated += result.modified_count
+            
+        return updated
+    
+    async def backfill_company_amounts(self, currency_by_company: Dict[ObjectId, str], fx_service,
+                                       batch_size: int = 1000, only_missing: bool = True,
+                                       include_fallback: bool = False) -> Dict[str, int]:
+        """Calcula el monto en moneda de la empresa de gastos existentes.
+        
+        `currency_by_company` asocia cada empresa con su moneda y `fx_service`
+        entrega los campos convertidos. Con `include_fallback` también se
+        recalculan los convertidos con las tasas de referencia (`fxSource: "fallback"`).
+        Devuelve cuántos gastos se actualizaron y cuántos se omitieron por no tener
+        tasa para su moneda. Se actualiza `updatedAt` para que la sincronización
+        entregue el monto nuevo a los clientes.
+        """
+        query = {}
+        if only_missing:
+            query = {"companyAmount": {"$exists": False}}
+            if include_fallback:
+                query = {"$or": [query, {"fxSource": FX_SOURCE_FALLBACK}]}
+        projection = {"amount": 1, "currency": 1, "date": 1, "companyId": 1}
+        counts = {"updated": 0, "skipped": 0}
+        operations = []
+        
+        async for document in self.collection.find(query, projection, batch_size=batch_size):
+            try:
+                fields = fx_service.company_amount_fields(document, currency_by_company.get(document.get("companyId")))
+            except ValueError:
+                counts["skipped"] += 1
+                continue
+            operations.append(UpdateOne({"_id": document["_id"]}, {"$set": {**fields, "updatedAt": datetime.now()}}))
+            if len(operations) >= batch_size:
+                result = await self.collection.bulk_write(operations, ordered=False)
+                counts["updated"] += result.modified_count
+                operations = []
+        
+        if operations:
+            result = await self.collection.bulk_write(operations, ordered=False)
+            counts["updated"] += result.modified_count
+            
+        return counts
+    
+    async def backfill_updated_at(self, batch_size: int = 1000) -> int:
+        """Asigna `updatedAt` a los gastos que no lo tienen o lo tienen nulo (creados antes de que se guardara al crear).
+        
+        Se usa `createdAt`, o la fecha del gasto si tampoco existe, para que la
+        sincronización completa y el archivo los encuentren sin reenviarlos como
+        modificados recién. Cubre la colección activa y el archivo. Devuelve cuántos se actualizaron.
+        """
+        collections = [self.collection] + ([self.archive] if self.archive is not None else [])
+        updated = 0
+        for collection in collections:
+            operations = []
+            # `None` coincide tanto con el campo ausente como con el nulo
+            async for document in collection.find({"updatedAt": None}, {"createdAt": 1, "date": 1}):
+                updated_at = document.get("createdAt") or document.get("date") or datetime.now()
+                operations.append(UpdateOne(
+                    {"_id": document["_id"], "updatedAt": None},
+                    {"$set": {"updatedAt": updated_at}}
+                ))
+                if len(operations) >= batch_size:
+                    result = await collection.bulk_write(operations, ordered=False)
+                    updated += result.modified_count
+                    operations = []
+            if operations:
+                result = await collection.bulk_write(operations, ordered=False)
+                updated += result.modified_count
+        return updated
+    
+    async def archive_older_than(self, cutoff: datetime, batch_size: int = 500, pause_seconds: float = 0.5,
+                                 watermark_wait_seconds: float = WATERMARK_CACHE_SECONDS,
+                                 updated_before: datetime = None) -> Dict[str, int]:
+        """Mueve al archivo los gastos cerrados con fecha anterior a `cutoff`, en lotes con pausas.
+        
+        Primero se adelanta la marca de agua y se espera a que venza su caché en
+        todos los workers, para que ninguno deje de consultar el archivo en un
+        rango que ya puede contener gastos movidos. Cada lote se copia con upsert
+        y luego se borra de la colección activa; un gasto modificado entretanto
+        se deja en la activa y se quita del archivo. Si la tarea se interrumpe,
+        la siguiente ejecución retoma sin duplicar. Los contadores de presupuesto
+        no cambian: el gasto sigue existiendo, solo cambia de colección.
+        
+        Con `updated_before` solo se mueven gastos sin cambios desde esa fecha, de
+        modo que la sincronización incremental no necesita leer el archivo.
+        
+        Antes de borrarlo de la colección activa, cada gasto se marca con
+        `ARCHIVE_MARKER`: los suscriptores del change stream no reciben un evento
+        `delete` por un gasto que sigue existiendo en el archivo.
+        """
+        counts = {"moved": 0, "skipped": 0}
+        if self.archive is None or self.watermarks is None:
+            return counts
+        
+        current = await self.archive_cutoff(fresh=True)
+        if current is None or cutoff > current:
+            await self.watermarks.update_one(
+                {"_id": self.archive.name},
+                {"$set": {"cutoff": cutoff, "updatedAt": datetime.now()}},
+                upsert=True
+            )
+            _watermark_cache.invalidate(self.archive.name)
+            await asyncio.sleep(watermark_wait_seconds)
+        else:
+            cutoff = current
+        
+        query = {"date": {"$lt": cutoff}, "status": {"$in": list(ARCHIVED_STATUSES)}}
+        if updated_before:
+            query["updatedAt"] = {"$lt": updated_before}
+        while True:
+            batch = await self.collection.find(query).sort("date", 1).limit(batch_size).to_list(length=batch_size)
+            if not batch:
+                break
+            
+            await self.archive.bulk_write(
+                [ReplaceOne({"_id": document["_id"]}, document, upsert=True) for document in batch],
+                ordered=False
+            )
+            # Solo se marca y se borra si el gasto no cambió desde que se copió
+            unchanged = [
+                {"_id": document["_id"], "status": document["status"], "updatedAt": document.get("updatedAt")}
+                for document in batch
+            ]
+            await self.collection.bulk_write(
+                [UpdateOne(query, {"$set": {ARCHIVE_MARKER: datetime.now()}}) for query in unchanged], ordered=False
+            )
+            result = await self.collection.bulk_write([DeleteOne(query) for query in unchanged], ordered=False)
+            counts["moved"] += result.deleted_count
+            
+            if result.deleted_count < len(batch):
+                ids = [document["_id"] for document in batch]
+                still_active = [doc["_id"] async for doc in self.collection.find({"_id": {"$in": ids}}, {"_id": 1})]
+                await self.archive.delete_many({"_id": {"$in": still_active}})
+                await self.collection.update_many({"_id": {"$in": still_active}}, {"$unset": {ARCHIVE_MARKER: ""}})
+                counts["skipped"] += len(still_active)
+                # Lo que se omitió puede volver a calzar con el filtro; se reintenta en la próxima ejecución
+                query["_id"] = {"$nin": still_active + query.get("_id", {}).get("$nin", [])}
+            
+            await asyncio.sleep(pause_seconds)
+        
+        return counts
+    
+    def build_company_match(self, company_id: str, start_date: datetime = None, end_date: datetime = None) -> Dict[str, Any]:
+        """Construye el filtro por empresa y rango de fechas usado por las agregaciones."""
         match = {"companyId": ObjectId(company_id)}
         
         if start_date or end_date:
@@ -94,16 +669,103 @@ class ExpenseRepository(BaseRepository[Expense]):
                 match["date"]["$gte"] = start_date
             if end_date:
                 match["date"]["$lte"] = end_date
+                
+        return match
+    
+    async def get_stats_by_category(self, company_id: str, start_date: datetime = None, end_date: datetime = None) -> List[Dict[str, Any]]:
+        """Obtiene estadísticas de gastos por categoría."""
+        if not ObjectId.is_valid(company_id):
+            return []
+            
+        # Construir el match de la agregación, sumando el archivo si el rango lo alcanza
+        match = [{"$match": self.build_company_match(company_id, start_date, end_date)}]
+        if await self._needs_archive(start_date):
+            match = self._union_archive(match)
         
         # Pipeline de agregación
-        pipeline = [
-            {"$match": match},
+        pipeline = match + [
             {"$group": {
                 "_id": "$category",
                 "count": {"$sum": 1},
-                "totalAmount": {"$sum": "$amount"}
+                "totalAmount": {"$sum": COMPANY_AMOUNT}
             }},
             {"$sort": {"totalAmount": -1}}
         ]
         
-        return await self.collection.aggregate(pipeline).to_list(None)
\ No newline at end of file
+        return await self.collection.aggregate(pipeline).to_list(None)
+    
+    async def stream_analytics_columns(self, company_id: str, start_date: datetime = None, end_date: datetime = None,
+                                       batch_size: int = 10000):
+        """Devuelve un cursor con solo los campos que usa la analítica, leído en lotes grandes."""
+        match = self.build_company_match(company_id, start_date, end_date)
+        projection = {"amount": 1, "companyAmount": 1, "date": 1, "category": 1, "userId": 1}
+        if not await self._needs_archive(start_date):
+            return self.collection.find(match, projection, batch_size=batch_size)
+        stages = self._union_archive([{"$match": match}, {"$project": projection}])
+        return self.collection.aggregate(stages, batchSize=batch_size)
+    
+    def build_dashboard_projection(self) -> Dict[str, Any]:
+        """Campos que usa el dashboard, con `amount` ya expresado en la moneda de la empresa."""
+        return {"category": 1, "date": 1, "userId": 1, "status": 1, "amount": COMPANY_AMOUNT}
+    
+    def build_dashboard_facets(self, top_users: int = 20) -> Dict[str, List[Dict[str, Any]]]:
+        """Devuelve las sub-agregaciones del dashboard, una por indicador.
+        
+        Esperan documentos ya proyectados con `build_dashboard_projection`.
+        """
+        return {
+            "byCategory": [
+                {"$group": {"_id": "$category", "count": {"$sum": 1}, "totalAmount": {"$sum": "$amount"}}},
+                {"$sort": {"totalAmount": -1}}
+            ],
+            "monthlyTrend": [
+                {"$group": {
+                    "_id": {"year": {"$year": "$date"}, "month": {"$month": "$date"}},
+                    "count": {"$sum": 1},
+                    "totalAmount": {"$sum": "$amount"}
+                }},
+                {"$sort": {"_id.year": 1, "_id.month": 1}}
+            ],
+            "byUser": [
+                {"$group": {"_id": "$userId", "count": {"$sum": 1}, "totalAmount": {"$sum": "$amount"}}},
+                {"$sort": {"totalAmount": -1}},
+                {"$limit": top_users}
+            ],
+            "byStatus": [
+                {"$group": {"_id": "$status", "count": {"$sum": 1}, "totalAmount": {"$sum": "$amount"}}}
+            ],
+            "totals": [
+                {"$group": {
+                    "_id": None,
+                    "count": {"$sum": 1},
+                    "totalAmount": {"$sum": "$amount"},
+                    "avgAmount": {"$avg": "$amount"},
+                    "maxAmount": {"$max": "$amount"}
+                }},
+                {"$project": {"_id": 0}}
+            ]
+        }
+    
+    async def get_dashboard_stats(self, company_id: str, start_date: datetime = None, end_date: datetime = None,
+                                  top_users: int = 20) -> Dict[str, Any]:
+        """Obtiene todos los indicadores del dashboard en una sola agregación `$facet`.
+        
+        Los gastos del rango se leen una única vez y cada indicador se calcula
+        sobre el mismo conjunto, en lugar de repetir el `$match` por indicador.
+        """
+        if not ObjectId.is_valid(company_id):
+            return {}
+            
+        pipeline = [
+            {"$match": self.build_company_match(company_id, start_date, end_date)},
+            {"$project": self.build_dashboard_projection()}
+        ]
+        if await self._needs_archive(start_date):
+            pipeline = self._union_archive(pipeline)
+        pipeline.append({"$facet": self.build_dashboard_facets(top_users)})
+        
+        result = await self.collection.aggregate(pipeline).to_list(1)
+        dashboard = result[0] if result else {}
+        totals = dashboard.get("totals") or [{"count": 0, "totalAmount": 0, "avgAmount": None, "maxAmount": None}]
+        dashboard["totals"] = totals[0]
+        return dashboard
\ No newline at end of file
@@ -0,0 +1,105 @@
+from typing import Optional, List, Dict, Any
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from motor.motor_asyncio import AsyncIOMotorCollection
+from app.domain.repositories.base_repository import BaseRepository
+
+
+class JobRepository(BaseRepository):
+    """Repositorio de tareas programadas y de su historial de ejecuciones.
+
+    Cada tarea es un documento de `scheduled_jobs` cuyo `_id` es su nombre. Un
+    worker solo ejecuta una tarea si logra tomar su lease de forma atómica, por
+    lo que con varios workers cada ejecución ocurre una sola vez.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection, runs_collection: AsyncIOMotorCollection):
+        super().__init__(collection)
+        self.runs_collection = runs_collection
+
+    async def ensure_job(self, name: str, trigger: str, next_run_at: datetime) -> None:
+        """Registra una tarea, reprogramándola solo si es nueva o cambió su disparador."""
+        existing = await self.collection.find_one({"_id": name}, {"trigger": 1})
+        if existing and existing.get("trigger") == trigger:
+            return
+        
+        try:
+            await self.collection.update_one(
+                {"_id": name},
+                {"$set": {"trigger": trigger, "nextRunAt": next_run_at, "updatedAt": datetime.now()}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Otro worker la registró al mismo tiempo
+            pass
+
+    async def acquire(self, name: str, worker_id: str, now: datetime, lease_seconds: float,
+                      next_run_at: datetime) -> Optional[Dict[str, Any]]:
+        """Intenta tomar el lease de una tarea vencida y programa su próxima ejecución.
+
+        Devuelve el documento de la tarea si este worker obtuvo el lease, o `None`
+        si no le toca ejecutarla (aún no vence o la tiene otro worker).
+        """
+        return await self.collection.find_one_and_update(
+            {
+                "_id": name,
+                "nextRunAt": {"$lte": now},
+                "$or": [{"leaseUntil": None}, {"leaseUntil": {"$lt": now}}]
+            },
+            {"$set": {
+                "leaseOwner": worker_id,
+                "leaseUntil": now + timedelta(seconds=lease_seconds),
+                "nextRunAt": next_run_at,
+                "lastStartedAt": now
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def release(self, name: str, worker_id: str, run: Dict[str, Any]) -> None:
+        """Libera el lease de una tarea y guarda el resumen de su última ejecución."""
+        await self.collection.update_one(
+            {"_id": name, "leaseOwner": worker_id},
+            {"$set": {
+                "leaseOwner": None,
+                "leaseUntil": None,
+                "lastRun": {k: run.get(k) for k in ("startedAt", "finishedAt", "durationMs", "status", "error")}
+            }}
+        )
+
+    async def next_due(self) -> Optional[datetime]:
+        """Fecha de la próxima ejecución programada entre todas las tareas."""
+        job = await self.collection.find_one({}, {"nextRunAt": 1}, sort=[("nextRunAt", 1)])
+        return job["nextRunAt"] if job else None
+
+    async def record_run(self, run: Dict[str, Any]) -> None:
+        """Guarda una ejecución en el historial."""
+        await self.runs_collection.insert_one(run)
+
+    async def find_jobs(self) -> List[Dict[str, Any]]:
+        """Lista las tareas con su próxima ejecución, su lease y estadísticas de duración."""
+        jobs = await self.collection.find({}).sort("_id", 1).to_list(None)
+        pipeline = [
+            {"$group": {
+                "_id": "$job",
+                "runs": {"$sum": 1},
+                "failures": {"$sum": {"$cond": [{"$eq": ["$status", "success"]}, 0, 1]}},
+                "avgDurationMs": {"$avg": "$durationMs"},
+                "maxDurationMs": {"$max": "$durationMs"}
+            }}
+        ]
+        stats = {doc["_id"]: doc async for doc in self.runs_collection.aggregate(pipeline)}
+        for job in jobs:
+            job_stats = stats.get(job["_id"], {})
+            job["stats"] = {key: job_stats.get(key) for key in ("runs", "failures", "avgDurationMs", "maxDurationMs")}
+        return jobs
+
+    async def find_runs(self, job: str = None, status: str = None, skip: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        """Lista las ejecuciones más recientes, opcionalmente de una tarea o estado."""
+        query = {}
+        if job:
+            query["job"] = job
+        if status:
+            query["status"] = status
+        cursor = self.runs_collection.find(query).sort("startedAt", -1).skip(skip).limit(limit)
+        return await cursor.to_list(length=limit)
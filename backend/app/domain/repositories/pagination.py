@@ -0,0 +1,54 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+
+def encode_cursor(sort_value: Any, id: ObjectId) -> str:
+    """Codifica la posición (valor de orden, _id) de un documento en un cursor opaco."""
+    if isinstance(sort_value, datetime):
+        payload = {"d": sort_value.isoformat(), "i": str(id)}
+    else:
+        payload = {"v": sort_value, "i": str(id)}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[Any, ObjectId]]:
+    """Decodifica un cursor generado por `encode_cursor`. Devuelve None si es inválido."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        id = payload["i"]
+        if not ObjectId.is_valid(id):
+            return None
+        if "d" in payload:
+            return datetime.fromisoformat(payload["d"]), ObjectId(id)
+        return payload["v"], ObjectId(id)
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def keyset_after(field: str, sort_value: Any, id: ObjectId, descending: bool = True) -> Dict[str, Any]:
+    """Construye el filtro que devuelve los documentos posteriores al cursor.
+
+    Equivale a `(field, _id) < (sort_value, id)` en orden descendente, lo que
+    permite usar el índice compuesto sin recorrer los documentos ya entregados.
+    """
+    op = "$lt" if descending else "$gt"
+    return {
+        "$or": [
+            {field: {op: sort_value}},
+            {field: sort_value, "_id": {op: id}}
+        ]
+    }
+
+
+def next_cursor(documents: List[Dict[str, Any]], field: str, limit: int) -> Optional[str]:
+    """Devuelve el cursor de la página siguiente, o None si no quedan más documentos."""
+    if len(documents) < limit or not documents:
+        return None
+    last = documents[-1]
+    return encode_cursor(last[field], last["_id"])
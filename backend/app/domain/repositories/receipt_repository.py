@@ -0,0 +1,49 @@
+from typing import Optional, Dict, Any
+from datetime import datetime
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReturnDocument
+from app.domain.repositories.base_repository import BaseRepository
+
+
+class ReceiptRepository(BaseRepository):
+    """Repositorio de boletas subidas: a qué empresa y usuario pertenece cada archivo.
+
+    El mismo archivo (mismo hash) puede pertenecer a varias empresas; el acceso
+    se autoriza por el registro de la empresa del usuario.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        super().__init__(collection)
+
+    async def record(self, digest: str, company_id: str, user_id: str, content_type: str,
+                     size: int, filename: str = None) -> Dict[str, Any]:
+        """Registra la boleta para la empresa, o devuelve el registro existente."""
+        return await self.collection.find_one_and_update(
+            {"companyId": ObjectId(company_id), "hash": digest},
+            {"$setOnInsert": {
+                "userId": ObjectId(user_id),
+                "contentType": content_type,
+                "size": size,
+                "filename": filename,
+                "createdAt": datetime.now()
+            }},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def find_accessible(self, digest: str, company_id: Optional[str], user_id: str,
+                              role: str) -> Optional[Dict[str, Any]]:
+        """Registro de la boleta si el usuario puede verla.
+
+        Los administradores ven cualquier boleta; los managers, las de su
+        empresa; los empleados, solo las que subieron ellos.
+        """
+        query: Dict[str, Any] = {"hash": digest}
+        if role != "admin":
+            if not company_id or not ObjectId.is_valid(company_id):
+                return None
+            query["companyId"] = ObjectId(company_id)
+            if role != "manager":
+                query["userId"] = ObjectId(user_id)
+        return await self.collection.find_one(query)
@@ -0,0 +1,67 @@
+from typing import List, Dict, Any
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorCollection
+from app.domain.repositories.base_repository import BaseRepository
+
+
+class SlowQueryRepository(BaseRepository):
+    """Repositorio de lectura del registro de consultas lentas (colección capped `slow_queries`)."""
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        super().__init__(collection)
+
+    async def find_top_offenders(self, since: datetime, collection: str = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Agrupa los registros por forma de consulta y los ordena por tiempo total consumido.
+
+        Incluye las rutas que la originaron y el último plan muestreado con `explain`.
+        """
+        match: Dict[str, Any] = {"at": {"$gte": since}}
+        if collection:
+            match["collection"] = collection
+
+        pipeline = [
+            {"$match": match},
+            {"$sort": {"at": 1}},
+            {"$group": {
+                "_id": "$shapeHash",
+                "collection": {"$first": "$collection"},
+                "command": {"$first": "$command"},
+                "shape": {"$first": "$shape"},
+                "count": {"$sum": 1},
+                "totalMs": {"$sum": "$durationMs"},
+                "avgMs": {"$avg": "$durationMs"},
+                "maxMs": {"$max": "$durationMs"},
+                "routes": {"$addToSet": "$route"},
+                "lastSeen": {"$last": "$at"},
+                "plans": {"$push": {"$cond": [
+                    {"$eq": ["$explained", True]},
+                    {"planSummary": "$planSummary", "docsExamined": "$docsExamined",
+                     "keysExamined": "$keysExamined", "nReturned": "$nReturned", "at": "$at"},
+                    "$$REMOVE"
+                ]}}
+            }},
+            {"$sort": {"totalMs": -1}},
+            {"$limit": limit},
+            {"$project": {
+                "_id": 0,
+                "shapeHash": "$_id",
+                "collection": 1,
+                "command": 1,
+                "shape": 1,
+                "count": 1,
+                "totalMs": {"$round": ["$totalMs", 1]},
+                "avgMs": {"$round": ["$avgMs", 1]},
+                "maxMs": 1,
+                "routes": {"$slice": ["$routes", 10]},
+                "lastSeen": 1,
+                "lastPlan": {"$last": "$plans"}
+            }}
+        ]
+        return await self.collection.aggregate(pipeline).to_list(None)
+
+    async def find_recent(self, shape_hash: str = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Devuelve los registros más recientes, opcionalmente de una forma de consulta."""
+        query = {"shapeHash": shape_hash} if shape_hash else {}
+        # En una colección capped el orden natural inverso es el de inserción más reciente primero
+        cursor = self.collection.find(query, {"_id": 0}).sort("$natural", -1).limit(limit)
+        return await cursor.to_list(length=limit)
@@ -8,8 +8,12 @@ from app.domain.entities.user import User, UserInDB
 class UserRepository(BaseRepository[UserInDB]):
     """Repositorio para operaciones con usuarios."""
     
-    def __init__(self, collection: AsyncIOMotorCollection):
+    audit_entity = "user"
+    
+    def __init__(self, collection: AsyncIOMotorCollection, write_behind=None):
         super().__init__(collection)
+        # Si está presente, la fecha de último login se escribe en lote en vez de en cada login
+        self.write_behind = write_behind
     
     async def find_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """Encuentra un usuario por su email."""
@@ -23,13 +27,27 @@ class UserRepository(BaseRepository[UserInDB]):
         cursor = self.collection.find({"companyId": ObjectId(company_id)}).skip(skip).limit(limit)
         return await cursor.to_list(length=limit)
     
+    async def find_by_ids(self, ids: List[ObjectId], projection: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """Encuentra varios usuarios por ID en una sola consulta `$in`, con la proyección indicada."""
+        if not ids:
+            return []
+        cursor = self.collection.find({"_id": {"$in": list(ids)}}, projection)
+        return await cursor.to_list(length=len(ids))
+    
     async def update_last_login(self, id: str) -> bool:
-        """Actualiza la fecha del último inicio de sesión."""
+        """Actualiza la fecha del último inicio de sesión.
+        
+        Con buffer de escrituras diferidas, la fecha queda pendiente y se escribe
+        en el siguiente lote (`$max`, para no retroceder si otro worker escribe después).
+        """
         from datetime import datetime
         
         if not ObjectId.is_valid(id):
             return False
             
+        if self.write_behind is not None:
+            return self.write_behind.record(ObjectId(id), {"$max": {"lastLoginAt": datetime.now()}})
+            
         result = await self.collection.update_one(
             {"_id": ObjectId(id)},
             {"$set": {"lastLoginAt": datetime.now()}}
@@ -47,6 +65,8 @@ class UserRepository(BaseRepository[UserInDB]):
             {"$set": {"hashed_password": hashed_password}}
         )
         
+        if result.modified_count:
+            self.audit("change_password", id, {"hashed_password": hashed_password})
         return result.modified_count > 0
     
     async def deactivate(self, id: str) -> bool:
@@ -59,4 +79,6 @@ class UserRepository(BaseRepository[UserInDB]):
             {"$set": {"isActive": False}}
         )
         
+        if result.modified_count:
+            self.audit("deactivate", id, {"isActive": False})
         return result.modified_count > 0
\ No newline at end of file
@@ -1,6 +1,18 @@
 from typing import Dict, List, Any, Optional
 from app.domain.repositories.company_repository import CompanyRepository
 from app.domain.services.base_service import BaseService
+from app.infrastructure.cache.ttl_cache import TTLCache
+from app.infrastructure.cache.invalidation import on_invalidate, company_key
+from app.infrastructure.cache.single_flight import single_flight
+
+# Empresas por (id, versión en el bus): se leen en cada gasto creado o validado
+_company_cache = TTLCache(ttl_seconds=300, max_entries=4096)
+
+
+@on_invalidate("company:")
+def _evict_company(key: str):
+    company_id = key.split(":", 1)[1]
+    _company_cache.invalidate_where(lambda cached: cached[0] == company_id)
 
 
 class CompanyService(BaseService):
@@ -9,6 +21,27 @@ class CompanyService(BaseService):
     def __init__(self, repository: CompanyRepository):
         super().__init__(repository)
     
+    @single_flight("company.get_by_id")
+    async def get_by_id(self, id: str) -> Optional[Dict[str, Any]]:
+        """Obtiene una empresa por su ID, cacheada en el worker mientras el bus de invalidación esté activo.
+        
+        La clave incluye la versión de la empresa en el bus, de modo que una
+        modificación hecha en otro worker nunca se confunde con la copia local.
+        Las lecturas simultáneas de la misma empresa comparten una consulta.
+        El documento devuelto es compartido y no debe modificarse.
+        """
+        bus = self.repository.invalidation_bus
+        if bus is None or not bus.running:
+            return await self.repository.find_by_id(id)
+        
+        key = (id, bus.version(company_key(id)))
+        company = _company_cache.get(key)
+        if company is None:
+            company = await self.repository.find_by_id(id)
+            if company:
+                _company_cache.set(key, company)
+        return company
+    
     async def get_by_rut(self, rut: str) -> Optional[Dict[str, Any]]:
         """Obtiene una empresa por su RUT."""
         return await self.repository.find_by_rut(rut)
@@ -1,14 +1,55 @@
 from typing import Dict, List, Any, Optional
-from datetime import datetime
+from datetime import datetime, time, timedelta
 from app.domain.repositories.expense_repository import ExpenseRepository
 from app.domain.services.base_service import BaseService
+from app.domain.services.text_search import parse_query
+from app.domain.services.money import format_amount
+from app.domain.services.policy_engine import compile_policy, get_compiled_policy
+from app.infrastructure.cache.ttl_cache import TTLCache
+from app.infrastructure.cache.single_flight import SingleFlight, single_flight
+from app.infrastructure.cache.invalidation import on_invalidate, dashboard_key, get_invalidation_bus
+from app.infrastructure.external.fx_service import FXService, get_fx_service
+
+# Dashboards por (empresa, inicio, fin, generación); compartido por todas las instancias del servicio en el worker
+_dashboard_cache = TTLCache(ttl_seconds=60, max_entries=512)
+# Cálculos de dashboard en curso, para que las solicitudes simultáneas sin caché esperen el mismo
+_dashboard_flight = SingleFlight("expense.get_dashboard")
+# Generación de los dashboards de cada empresa en este worker; sube con cada invalidación, propia o de
+# otro worker, así que un cálculo que empezó antes de un cambio guarda su resultado con una clave ya vieja
+_dashboard_generations: Dict[str, int] = {}
+
+
+@on_invalidate("dashboard:")
+def _evict_dashboards(key: str):
+    company_id = key.split(":", 1)[1]
+    _dashboard_generations[company_id] = _dashboard_generations.get(company_id, 0) + 1
+    _dashboard_cache.invalidate_where(lambda cached: cached[0] == company_id)
 
 
 class ExpenseService(BaseService):
     """Servicio para operaciones de dominio relacionadas con gastos."""
     
-    def __init__(self, repository: ExpenseRepository):
+    def __init__(self, repository: ExpenseRepository, fx_service: FXService = None):
         super().__init__(repository)
+        self.fx_service = fx_service or get_fx_service()
+    
+    async def create(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Crea un gasto e invalida los dashboards cacheados de su empresa."""
+        created = await super().create(item)
+        await self._invalidate_dashboards_of(item)
+        return created
+    
+    async def update(self, id: str, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Actualiza un gasto e invalida los dashboards cacheados de su empresa."""
+        updated = await super().update(id, item)
+        await self._invalidate_dashboards_of(updated)
+        return updated
+    
+    async def delete(self, id: str) -> bool:
+        """Elimina un gasto e invalida los dashboards cacheados de su empresa."""
+        deleted = await self.repository.delete_returning(id)
+        await self._invalidate_dashboards_of(deleted)
+        return deleted is not None
     
     async def get_by_user(self, user_id: str, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
         """Obtiene gastos por ID de usuario."""
@@ -29,47 +70,156 @@ class ExpenseService(BaseService):
     
     async def approve_expense(self, expense_id: str, approver_id: str, comments: str = None) -> Optional[Dict[str, Any]]:
         """Aprueba un gasto."""
-        return await self.repository.update_status(expense_id, "approved", approver_id, comments)
+        approved = await self.repository.update_status(expense_id, "approved", approver_id, comments)
+        await self._invalidate_dashboards_of(approved)
+        return approved
     
     async def reject_expense(self, expense_id: str, approver_id: str, comments: str = None) -> Optional[Dict[str, Any]]:
         """Rechaza un gasto."""
-        return await self.repository.update_status(expense_id, "rejected", approver_id, comments)
+        rejected = await self.repository.update_status(expense_id, "rejected", approver_id, comments)
+        await self._invalidate_dashboards_of(rejected)
+        return rejected
+    
+    async def get_approval_inbox(self, company_id: str, status: str = "pending",
+                                 after: Optional[tuple] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Obtiene la bandeja de aprobación de una empresa paginada por cursor."""
+        return await self.repository.find_approval_inbox(company_id, status, after, limit)
     
+    async def process_approval_batch(self, decisions: List[Dict[str, Any]], approver_id: str,
+                                     company_id: str) -> List[Dict[str, Any]]:
+        """Aprueba o rechaza varios gastos en una sola escritura.
+        
+        Las decisiones usan `action` ("approve" o "reject"), que se traduce al
+        estado que guarda el repositorio.
+        """
+        actions = {"approve": "approved", "reject": "rejected"}
+        normalized = [
+            {
+                "expenseId": decision["expenseId"],
+                "status": actions[decision["action"]],
+                "comments": decision.get("comments")
+            }
+            for decision in decisions
+        ]
+        results = await self.repository.bulk_update_status(normalized, approver_id, company_id)
+        await self.invalidate_dashboards(company_id)
+        return results
+    
+    async def search_expenses(self, query: str, company_id: str = None, user_id: str = None,
+                              after: Optional[tuple] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Busca gastos por texto libre en descripción, proveedor, etiquetas, categoría y número de documento."""
+        return await self.repository.search(parse_query(query), company_id, user_id, after, limit)
+    
+    @single_flight("expense.get_category_stats")
     async def get_category_stats(self, company_id: str, start_date: datetime = None, end_date: datetime = None) -> List[Dict[str, Any]]:
-        """Obtiene estadísticas de gastos por categoría."""
+        """Obtiene estadísticas de gastos por categoría; las llamadas simultáneas iguales comparten la agregación."""
         return await self.repository.get_stats_by_category(company_id, start_date, end_date)
     
-    async def validate_expense_data(self, expense_data: Dict[str, Any], company_settings: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Valida los datos de un gasto según la configuración de la empresa."""
-        validation_results = {
-            "is_valid": True,
-            "errors": []
+    async def get_dashboard(self, company_id: str, start_date: datetime = None, end_date: datetime = None) -> Dict[str, Any]:
+        """Obtiene los indicadores del dashboard de una empresa, cacheados por empresa y ventana.
+        
+        La ventana se redondea a días completos (por defecto, los últimos 12 meses)
+        para que peticiones con horas distintas compartan la misma entrada de caché.
+        Si la entrada no está, las solicitudes simultáneas esperan un solo cálculo.
+        La clave incluye la generación de la empresa, que sube con cada cambio de
+        sus gastos en cualquier worker (ver `invalidate_dashboards`).
+        """
+        today = datetime.now().date()
+        end_day = end_date.date() if end_date else today
+        start_day = start_date.date() if start_date else end_day - timedelta(days=365)
+        
+        key = (company_id, start_day, end_day, _dashboard_generations.get(company_id, 0))
+        dashboard = _dashboard_cache.get(key)
+        if dashboard is None:
+            dashboard = await _dashboard_flight.do(key, lambda: self._compute_dashboard(key))
+            
+        return dashboard
+    
+    async def _compute_dashboard(self, key: tuple) -> Dict[str, Any]:
+        company_id, start_day, end_day, _ = key
+        dashboard = await self.repository.get_dashboard_stats(
+            company_id,
+            datetime.combine(start_day, time.min),
+            datetime.combine(end_day, time.max)
+        )
+        dashboard["window"] = {"start": start_day.isoformat(), "end": end_day.isoformat()}
+        _dashboard_cache.set(key, dashboard)
+        return dashboard
+    
+    async def invalidate_dashboards(self, company_id: str):
+        """Descarta los dashboards cacheados de una empresa en este worker y, por el bus, en los demás."""
+        bus = get_invalidation_bus()
+        if bus is not None:
+            # `publish` aplica la nueva versión aquí mismo, lo que llama a `_evict_dashboards`
+            await bus.publish(dashboard_key(company_id))
+        else:
+            _evict_dashboards(dashboard_key(company_id))
+    
+    async def _invalidate_dashboards_of(self, expense: Optional[Dict[str, Any]]):
+        if expense and expense.get("companyId"):
+            await self.invalidate_dashboards(str(expense["companyId"]))
+    
+    async def validate_expense_data(self, expense_data: Dict[str, Any], company_settings: Dict[str, Any] = None,
+                                    company: Dict[str, Any] = None, user_role: str = None) -> Dict[str, Any]:
+        """Valida los datos de un gasto según la política de la empresa.
+        
+        Si se entrega el documento de la empresa, su política compilada se
+        reutiliza entre llamadas hasta que cambie la configuración.
+        """
+        if company is not None:
+            policy = get_compiled_policy(company)
+        else:
+            policy = compile_policy(company_settings)
+            
+        errors = policy.evaluate(expense_data, user_role)
+        
+        return {
+            "is_valid": not errors,
+            "errors": errors
         }
+    
+    def convert_to_company_currency(self, expense_data: Dict[str, Any], company: Dict[str, Any]) -> Dict[str, Any]:
+        """Agrega al gasto su monto en la moneda de la empresa (`companyAmount`, `companyCurrency`, `fxRate`, `fxSource`).
+        
+        Lanza `FXRateNotFound` si no hay tasa para la moneda del gasto.
+        """
+        company_currency = (company.get("settings") or {}).get("currency")
+        expense_data.update(self.fx_service.company_amount_fields(expense_data, company_currency))
+        return expense_data
+    
+    async def check_budget(self, expense_data: Dict[str, Any], company_settings: Dict[str, Any] = None) -> List[str]:
+        """Verifica que el gasto no exceda los presupuestos mensuales de la empresa.
         
-        # Validar monto máximo si está configurado
-        if company_settings and "maxExpenseAmount" in company_settings and company_settings["maxExpenseAmount"]:
-            if expense_data["amount"] > company_settings["maxExpenseAmount"]:
-                validation_results["is_valid"] = False
-                validation_results["errors"].append(f"El monto excede el máximo permitido de {company_settings['maxExpenseAmount']}")
+        Lee en una sola consulta los contadores del usuario y de la categoría del
+        mes del gasto. Devuelve la lista de errores (vacía si está dentro del presupuesto).
+        """
+        settings = company_settings or {}
+        user_budget = settings.get("monthlyUserBudget")
+        category_budget = (settings.get("categoryMonthlyBudgets") or {}).get(expense_data.get("category"))
         
-        # Validar categoría si hay categorías definidas
-        if company_settings and "categories" in company_settings and company_settings["categories"]:
-            if expense_data["category"] not in company_settings["categories"]:
-                validation_results["is_valid"] = False
-                validation_results["errors"].append("Categoría no permitida")
+        if not self.repository.budget_repository or (user_budget is None and category_budget is None):
+            return []
         
-        # Validar tipo de documento si hay tipos definidos
-        if company_settings and "allowedExpenseTypes" in company_settings and company_settings["allowedExpenseTypes"]:
-            if expense_data["documentType"] not in company_settings["allowedExpenseTypes"]:
-                validation_results["is_valid"] = False
-                validation_results["errors"].append("Tipo de documento no permitido")
+        counters = await self.repository.budget_repository.find_for_expense(expense_data)
+        amount = expense_data.get("companyAmount", expense_data.get("amount", 0))
+        errors = []
         
-        # Validar fecha (no puede ser futura)
-        if "date" in expense_data and expense_data["date"] > datetime.now():
-            validation_results["is_valid"] = False
-            validation_results["errors"].append("La fecha no puede ser futura")
+        for scope, budget, message in (
+            ("user", user_budget, "El gasto excede el presupuesto mensual del usuario"),
+            ("category", category_budget, f"El gasto excede el presupuesto mensual de la categoría {expense_data.get('category')}")
+        ):
+            if budget is None:
+                continue
+            spent = counters.get(scope, {}).get("amount", 0)
+            if spent + amount > budget:
+                errors.append(f"{message} (disponible: {format_amount(max(budget - spent, 0), settings.get('currency'))})")
         
-        return validation_results
+        return errors
+    
+    async def evaluate_policy_batch(self, company: Dict[str, Any], expenses: List[Dict[str, Any]],
+                                    user_role: str = None) -> List[Dict[str, Any]]:
+        """Evalúa un lote de gastos (p. ej. una importación) contra la política de la empresa."""
+        return get_compiled_policy(company).evaluate_batch(expenses, user_role)
     
     async def categorize_expense_auto(self, description: str, vendor: str = None) -> str:
         """Categoriza automáticamente un gasto basado en su descripción y vendedor.
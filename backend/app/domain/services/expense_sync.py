@@ -0,0 +1,92 @@
+import base64
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from app.domain.repositories.expense_repository import ExpenseRepository
+
+# Los cambios de los últimos segundos quedan para la sincronización siguiente: una
+# escritura en curso puede terminar con una fecha anterior a otra que ya es visible
+SYNC_SETTLE_SECONDS = 5
+
+# Las lápidas de gastos eliminados se conservan estos días; un token más antiguo obliga a sincronizar desde cero
+DEFAULT_SYNC_RETENTION_DAYS = 90
+
+DEFAULT_SYNC_PAGE_SIZE = 500
+MAX_SYNC_PAGE_SIZE = 1000
+
+# _id mayor que cualquier otro: una posición (fecha, _END_OF_INSTANT) deja atrás todo lo de esa fecha
+_END_OF_INSTANT = ObjectId("f" * 24)
+
+
+class InvalidSyncToken(ValueError):
+    """El token de sincronización no se pudo interpretar."""
+
+
+class SyncTokenExpired(Exception):
+    """El token es anterior a la retención de las lápidas: el cliente debe sincronizar desde cero."""
+
+
+def sync_retention_days() -> int:
+    """Días de retención de las lápidas (SYNC_RETENTION_DAYS)."""
+    return int(os.getenv("SYNC_RETENTION_DAYS", DEFAULT_SYNC_RETENTION_DAYS))
+
+
+def encode_sync_token(position: Tuple[datetime, ObjectId], issued_at: datetime) -> str:
+    """Codifica la posición alcanzada (fecha del cambio, _id) y la fecha de emisión en un token opaco."""
+    payload = {"t": position[0].isoformat(), "i": str(position[1]), "s": issued_at.isoformat()}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_sync_token(token: str) -> Tuple[Tuple[datetime, ObjectId], datetime]:
+    """Decodifica un token generado por `encode_sync_token`. Lanza `InvalidSyncToken` si es inválido."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        position = (datetime.fromisoformat(payload["t"]), ObjectId(payload["i"]))
+        return position, datetime.fromisoformat(payload["s"])
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise InvalidSyncToken(str(e)) from e
+
+
+async def sync_expenses(repository: ExpenseRepository, user_id: str, since: Optional[str] = None,
+                        limit: int = DEFAULT_SYNC_PAGE_SIZE) -> Dict[str, Any]:
+    """Devuelve los gastos del usuario creados o modificados y los IDs de los eliminados desde `since`.
+
+    Sin `since` se entregan todos. Mientras `hasMore` sea verdadero el cliente
+    pide la página siguiente con `nextToken`; al terminar guarda ese token para
+    la próxima sincronización.
+    """
+    now = datetime.now()
+    horizon = now - timedelta(days=sync_retention_days())
+    after = None
+    if since:
+        after, issued_at = decode_sync_token(since)
+        if issued_at < horizon:
+            raise SyncTokenExpired()
+
+    until = now - timedelta(seconds=SYNC_SETTLE_SECONDS)
+    # Solo se archivan gastos sin cambios desde antes del horizonte, así que una posición posterior no necesita el archivo
+    include_archive = after is None or after[0] < horizon
+    changes = await repository.find_changes(user_id, until, after, limit + 1, include_archive)
+
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    if has_more:
+        last = changes[-1]
+        position = (last.get("updatedAt") or last["deletedAt"], last["_id"])
+    else:
+        # Todo lo anterior a `until` ya se entregó: la próxima sincronización empieza ahí
+        position = max((until, _END_OF_INSTANT), after) if after else (until, _END_OF_INSTANT)
+
+    return {
+        "changed": [document for document in changes if not document.get("deleted")],
+        "deleted": [str(document["_id"]) for document in changes if document.get("deleted")],
+        "nextToken": encode_sync_token(position, now),
+        "hasMore": has_more
+    }
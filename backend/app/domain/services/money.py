@@ -0,0 +1,15 @@
+from typing import Optional
+
+# Monedas sin decimales en el uso habitual; las demás se muestran con dos
+ZERO_DECIMAL_CURRENCIES = frozenset(("CLP", "JPY", "KRW", "PYG"))
+
+DEFAULT_CURRENCY = "CLP"
+
+# Separadores en español: punto para los miles y coma para los decimales
+_SEPARATORS = str.maketrans({",": ".", ".": ","})
+
+
+def format_amount(amount: float, currency: Optional[str] = None) -> str:
+    """Formatea un monto para los mensajes al usuario ("1.500.000" en CLP, "99,50" en USD)."""
+    decimals = 0 if (currency or DEFAULT_CURRENCY).upper() in ZERO_DECIMAL_CURRENCIES else 2
+    return f"{amount:,.{decimals}f}".translate(_SEPARATORS)
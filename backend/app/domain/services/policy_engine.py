@@ -0,0 +1,159 @@
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Callable
+
+from pydantic import ValidationError
+
+from app.domain.entities.company import PolicyRule
+from app.domain.services.money import format_amount
+from app.infrastructure.cache.ttl_cache import TTLCache
+
+# La política compilada recibe (gasto, rol del usuario, fecha actual) y devuelve la lista de errores
+Evaluator = Callable[[Dict[str, Any], Optional[str], datetime], List[str]]
+
+RULE_TYPES = ("maxAmount", "categoryCap", "roleLimit", "receiptRequired")
+
+# Políticas compiladas por (empresa, versión de configuración)
+_policy_cache = TTLCache(ttl_seconds=3600, max_entries=2048)
+
+
+class PolicyError(ValueError):
+    """La política declarada en la configuración de la empresa no es válida."""
+
+
+class CompiledPolicy:
+    """Política de gastos de una empresa lista para evaluarse.
+
+    Las reglas se traducen una sola vez a una closure que consulta diccionarios y
+    conjuntos precalculados, de modo que evaluar un gasto no vuelve a recorrer la
+    configuración ni paga una llamada por regla.
+    """
+
+    def __init__(self, evaluator: Evaluator):
+        self._evaluator = evaluator
+
+    def evaluate(self, expense: Dict[str, Any], user_role: Optional[str] = None,
+                 now: Optional[datetime] = None) -> List[str]:
+        """Devuelve los errores del gasto; una lista vacía significa que cumple la política."""
+        return self._evaluator(expense, user_role, now or datetime.now())
+
+    def evaluate_batch(self, expenses: List[Dict[str, Any]], user_role: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Evalúa varios gastos con la misma fecha de referencia."""
+        now = datetime.now()
+        evaluator = self._evaluator
+        results = []
+        for index, expense in enumerate(expenses):
+            errors = evaluator(expense, user_role, now)
+            results.append({"index": index, "is_valid": not errors, "errors": errors})
+        return results
+
+
+def compile_policy(settings: Optional[Dict[str, Any]]) -> CompiledPolicy:
+    """Compila la configuración de una empresa en una `CompiledPolicy`.
+
+    Incluye las reglas históricas (monto máximo, categorías y tipos de documento
+    permitidos, fecha no futura) y las reglas declarativas de `policyRules`.
+    Los límites se comparan con el monto en la moneda de la empresa si el gasto lo trae,
+    y los mensajes los muestran en el formato de esa moneda.
+    Lanza `PolicyError` si alguna regla es inválida.
+    """
+    settings = settings or {}
+    currency = settings.get("currency")
+    rules = _parse_rules(settings.get("policyRules") or [])
+
+    # Reglas históricas de la configuración
+    limits = [settings["maxExpenseAmount"]] if settings.get("maxExpenseAmount") else []
+    categories = frozenset(settings["categories"]) if settings.get("categories") else None
+    document_types = frozenset(settings["allowedExpenseTypes"]) if settings.get("allowedExpenseTypes") else None
+
+    # Reglas declarativas, agrupadas por tipo y quedándose con el límite más estricto
+    category_caps: Dict[str, float] = {}
+    role_limits: Dict[str, float] = {}
+    receipt_thresholds: Dict[Optional[str], float] = {}
+    messages: Dict[tuple, str] = {}
+
+    for rule in rules:
+        if rule.type == "maxAmount":
+            limits.append(rule.amount)
+            key = ("maxAmount", None)
+        elif rule.type == "categoryCap":
+            category_caps[rule.category] = min(category_caps.get(rule.category, rule.amount), rule.amount)
+            key = ("categoryCap", rule.category)
+        elif rule.type == "roleLimit":
+            role_limits[rule.role] = min(role_limits.get(rule.role, rule.amount), rule.amount)
+            key = ("roleLimit", rule.role)
+        else:
+            # Sin categoría, el umbral aplica a todas las categorías
+            receipt_thresholds[rule.category] = min(receipt_thresholds.get(rule.category, rule.amount), rule.amount)
+            key = ("receiptRequired", rule.category)
+
+        if rule.message:
+            messages[key] = rule.message
+
+    max_amount = min(limits) if limits else None
+    max_amount_message = messages.get(("maxAmount", None), f"El monto excede el máximo permitido de {format_amount(max_amount, currency)}"
+                                      if max_amount is not None else "")
+    default_receipt_threshold = receipt_thresholds.pop(None, None)
+    check_receipts = bool(receipt_thresholds) or default_receipt_threshold is not None
+
+    def evaluator(e: Dict[str, Any], role: Optional[str], now: datetime) -> List[str]:
+        errors = []
+        amount = e.get("companyAmount", e.get("amount", 0))
+        category = e.get("category")
+
+        if max_amount is not None and amount > max_amount:
+            errors.append(max_amount_message)
+        if categories is not None and category not in categories:
+            errors.append("Categoría no permitida")
+        if document_types is not None and e.get("documentType") not in document_types:
+            errors.append("Tipo de documento no permitido")
+
+        date = e.get("date")
+        if isinstance(date, datetime) and date > now:
+            errors.append("La fecha no puede ser futura")
+
+        if category_caps:
+            cap = category_caps.get(category)
+            if cap is not None and amount > cap:
+                errors.append(messages.get(("categoryCap", category),
+                                           f"El monto excede el tope de {format_amount(cap, currency)} para la categoría {category}"))
+        if role_limits:
+            limit = role_limits.get(role)
+            if limit is not None and amount > limit:
+                errors.append(messages.get(("roleLimit", role), f"El monto excede el límite de {format_amount(limit, currency)} para el rol {role}"))
+        if check_receipts:
+            threshold = receipt_thresholds.get(category, default_receipt_threshold)
+            if threshold is not None and amount >= threshold and not e.get("receipt"):
+                errors.append(messages.get(("receiptRequired", category),
+                                           messages.get(("receiptRequired", None),
+                                                        f"Se requiere comprobante para montos desde {format_amount(threshold, currency)}")))
+        return errors
+
+    return CompiledPolicy(evaluator)
+
+
+def get_compiled_policy(company: Dict[str, Any]) -> CompiledPolicy:
+    """Devuelve la política compilada de una empresa, reutilizándola mientras no cambie su configuración."""
+    key = (str(company.get("_id")), company.get("settingsVersion", 0))
+    policy = _policy_cache.get(key)
+    if policy is None:
+        policy = compile_policy(company.get("settings"))
+        _policy_cache.set(key, policy)
+    return policy
+
+
+def _parse_rules(raw_rules: List[Any]) -> List[PolicyRule]:
+    """Valida las reglas declarativas de la configuración."""
+    try:
+        rules = [rule if isinstance(rule, PolicyRule) else PolicyRule(**rule) for rule in raw_rules]
+    except (ValidationError, TypeError) as e:
+        raise PolicyError(f"Regla de política inválida: {e}")
+
+    for rule in rules:
+        if rule.type not in RULE_TYPES:
+            raise PolicyError(f"Tipo de regla desconocido: {rule.type}")
+        if rule.type == "categoryCap" and not rule.category:
+            raise PolicyError("La regla categoryCap requiere una categoría")
+        if rule.type == "roleLimit" and not rule.role:
+            raise PolicyError("La regla roleLimit requiere un rol")
+
+    return rules
@@ -0,0 +1,63 @@
+import re
+import unicodedata
+from typing import Dict, Any, List
+
+# Campos del gasto que se indexan para la búsqueda
+SEARCH_FIELDS = ("description", "vendor", "documentNumber", "category", "tags")
+
+# Los prefijos más cortos generan demasiadas coincidencias y los más largos no aportan
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_LENGTH = 15
+
+STOPWORDS = {
+    "a", "al", "con", "de", "del", "el", "en", "la", "las", "los",
+    "para", "por", "se", "un", "una", "y"
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_text(text: str) -> str:
+    """Pasa el texto a minúsculas y elimina tildes y diacríticos ("Café" -> "cafe")."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    """Divide un texto normalizado en palabras, descartando stopwords."""
+    return [t for t in _TOKEN_RE.findall(normalize_text(text)) if t not in STOPWORDS]
+
+
+def build_search_fields(expense: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Calcula los términos de búsqueda de un gasto.
+
+    `words` guarda las palabras completas (para puntuar coincidencias exactas) y
+    `prefixes` todos sus prefijos, que es lo que consulta el índice.
+    """
+    words = set()
+    for field in SEARCH_FIELDS:
+        value = expense.get(field)
+        if isinstance(value, list):
+            value = " ".join(str(v) for v in value)
+        if value:
+            words.update(tokenize(str(value)))
+
+    prefixes = set()
+    for word in words:
+        if len(word) < MIN_PREFIX_LENGTH:
+            prefixes.add(word)
+            continue
+        for length in range(MIN_PREFIX_LENGTH, min(len(word), MAX_PREFIX_LENGTH) + 1):
+            prefixes.add(word[:length])
+
+    return {"words": sorted(words), "prefixes": sorted(prefixes)}
+
+
+def parse_query(query: str) -> List[str]:
+    """Normaliza una consulta en términos buscables en el índice de prefijos."""
+    terms = []
+    for token in tokenize(query):
+        term = token[:MAX_PREFIX_LENGTH]
+        if term not in terms:
+            terms.append(term)
+    return terms
@@ -0,0 +1,96 @@
+import asyncio
+from typing import Dict, List, Any, Optional, Iterable, Set
+
+from bson import ObjectId
+
+from app.domain.repositories.user_repository import UserRepository
+
+# Campos de un usuario que se incluyen al expandir una referencia
+USER_SUMMARY_PROJECTION = {"email": 1, "role": 1, "profile.firstName": 1, "profile.lastName": 1}
+
+# Referencias de un gasto que se pueden expandir con `expand=`
+EXPANDABLE_FIELDS = ("user", "approvers")
+
+
+class UserLoader:
+    """Resuelve referencias a usuarios dentro de una solicitud agrupándolas en una sola consulta `$in`.
+
+    Las llamadas a `load` hechas en la misma vuelta del event loop se juntan en
+    un lote; cada usuario se consulta una vez por solicitud (los resultados,
+    incluidos los no encontrados, quedan en el loader). Se crea uno por solicitud.
+    """
+
+    def __init__(self, repository: UserRepository, projection: Dict[str, Any] = None):
+        self.repository = repository
+        self.projection = projection or USER_SUMMARY_PROJECTION
+        self._results: Dict[ObjectId, asyncio.Future] = {}
+        self._batch: List[ObjectId] = []
+
+    def load(self, id: Any) -> "asyncio.Future[Optional[Dict[str, Any]]]":
+        """Usuario resumido con el ID indicado, o `None` si no existe."""
+        if not isinstance(id, ObjectId):
+            if not ObjectId.is_valid(id):
+                future = asyncio.get_running_loop().create_future()
+                future.set_result(None)
+                return future
+            id = ObjectId(id)
+
+        future = self._results.get(id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._results[id] = future
+            if not self._batch:
+                asyncio.get_running_loop().call_soon(lambda: asyncio.ensure_future(self._dispatch()))
+            self._batch.append(id)
+        return future
+
+    async def load_many(self, ids: Iterable[Any]) -> List[Optional[Dict[str, Any]]]:
+        """Usuarios resumidos en el mismo orden que `ids`."""
+        return list(await asyncio.gather(*(self.load(id) for id in ids)))
+
+    async def _dispatch(self):
+        batch, self._batch = self._batch, []
+        try:
+            users = await self.repository.find_by_ids(batch, self.projection)
+        except Exception as e:
+            for id in batch:
+                self._results.pop(id).set_exception(e)
+            return
+        found = {user["_id"]: user for user in users}
+        for id in batch:
+            self._results[id].set_result(found.get(id))
+
+
+def referenced_user_ids(expense: Dict[str, Any], fields: Set[str]) -> List[Any]:
+    """IDs de usuario que referencia un gasto en los campos a expandir."""
+    ids = []
+    if "user" in fields and expense.get("userId"):
+        ids.append(expense["userId"])
+    if "approvers" in fields:
+        ids.extend(step["userId"] for step in expense.get("approvalFlow") or [] if step.get("userId"))
+    return ids
+
+
+async def expand_user_references(expenses: List[Dict[str, Any]], fields: Set[str], loader: UserLoader):
+    """Agrega a cada gasto el usuario (`user`) y a cada paso de aprobación su aprobador (`user`).
+
+    Todas las referencias de la página se resuelven en una sola consulta.
+    """
+    if not fields or not expenses:
+        return
+    await loader.load_many(id for expense in expenses for id in referenced_user_ids(expense, fields))
+
+    for expense in expenses:
+        if "user" in fields and expense.get("userId"):
+            expense["user"] = await loader.load(expense["userId"])
+        if "approvers" in fields:
+            for step in expense.get("approvalFlow") or []:
+                if step.get("userId"):
+                    step["user"] = await loader.load(step["userId"])
+
+
+def parse_expand(expand: Optional[str]) -> Set[str]:
+    """Campos pedidos en `expand=user,approvers`."""
+    if not expand:
+        return set()
+    return {field.strip() for field in expand.split(",") if field.strip() in EXPANDABLE_FIELDS}
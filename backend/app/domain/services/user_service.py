@@ -2,6 +2,7 @@ from typing import Dict, List, Any, Optional
 from app.domain.repositories.user_repository import UserRepository
 from app.domain.services.base_service import BaseService
 from app.infrastructure.security.password import get_password_hash, verify_password
+from app.infrastructure.cache.single_flight import single_flight
 
 
 class UserService(BaseService):
@@ -14,8 +15,9 @@ class UserService(BaseService):
         """Obtiene un usuario por su email."""
         return await self.repository.find_by_email(email)
     
+    @single_flight("user.get_by_company")
     async def get_by_company(self, company_id: str, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
-        """Obtiene usuarios por ID de empresa."""
+        """Obtiene usuarios por ID de empresa; las llamadas simultáneas iguales comparten la consulta."""
         return await self.repository.find_by_company(company_id, skip, limit)
     
     async def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -0,0 +1,173 @@
+import asyncio
+import os
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Deque
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from app.infrastructure.monitoring.request_context import current_actor, current_route
+
+AUDIT_COLLECTION = "audit_log"
+# Días que se conservan los registros (índice TTL sobre `at`)
+DEFAULT_RETENTION_DAYS = 730
+
+# Segundos entre escrituras de registros pendientes
+FLUSH_SECONDS = 1
+# Registros por `insert_many`
+BATCH_SIZE = 500
+# Registros pendientes en memoria; si la escritura no da abasto se pierden los más antiguos
+PENDING_LIMIT = 20000
+
+DUPLICATE_KEY = 11000
+
+# Campos que no se copian al registro: secretos se enmascaran y los derivados se omiten
+REDACTED_FIELDS = frozenset(("password", "hashed_password"))
+OMITTED_FIELDS = frozenset(("_id", "search"))
+
+
+def compact_changes(changes: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Campos modificados tal como se registran en la auditoría."""
+    if not changes:
+        return None
+    return {
+        field: "***" if field in REDACTED_FIELDS else value
+        for field, value in changes.items()
+        if field not in OMITTED_FIELDS
+    }
+
+
+class AuditLog:
+    """Registro de auditoría de modificaciones escrito en lotes por un task del event loop.
+
+    Las mutaciones solo encolan un registro compacto (quién, qué entidad, qué
+    acción y qué campos), así que no esperan una escritura adicional. La
+    colección solo recibe inserciones; los registros vencen por TTL.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection, flush_seconds: float = FLUSH_SECONDS):
+        self.collection = collection
+        self.flush_seconds = flush_seconds
+        self.pending: Deque[Dict[str, Any]] = deque(maxlen=PENDING_LIMIT)
+        self.dropped = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, entity: str, entity_id: Any, action: str, changes: Optional[Dict[str, Any]] = None):
+        """Encola el registro de una modificación hecha por el usuario de la solicitud en curso."""
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        if isinstance(entity_id, str) and ObjectId.is_valid(entity_id):
+            entity_id = ObjectId(entity_id)
+        actor = current_actor.get()
+        self.pending.append({
+            "at": datetime.now(),
+            "entity": entity,
+            "entityId": entity_id,
+            "action": action,
+            "actor": {"id": actor.get("sub"), "email": actor.get("email"), "role": actor.get("role")} if actor else None,
+            "route": current_route(),
+            "changes": compact_changes(changes)
+        })
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except PyMongoError as e:
+            print(f"Auditoría: se pierden {len(self.pending)} registros al cerrar: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await self.flush()
+            except Exception as e:
+                # Si el task terminara, los registros se acumularían sin escribirse
+                print(f"Auditoría: error al escribir: {e!r}")
+
+    async def flush(self):
+        """Escribe los registros pendientes en lotes; si una escritura falla, lo no escrito vuelve a la cola.
+
+        `insert_many` asigna el `_id` de cada registro antes de enviarlo y se
+        conserva al reencolar: al reintentar, los que sí se habían escrito fallan
+        por clave duplicada y se descartan en lugar de duplicarse.
+        """
+        if self.dropped:
+            print(f"Auditoría: se descartaron {self.dropped} registros por acumulación")
+            self.dropped = 0
+        while self.pending:
+            batch = [self.pending.popleft() for _ in range(min(BATCH_SIZE, len(self.pending)))]
+            try:
+                await self.collection.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                # Sin orden se intentan todos: solo fallaron los que reporta `writeErrors`
+                failed = {
+                    error["index"] for error in e.details.get("writeErrors", [])
+                    if error.get("code") != DUPLICATE_KEY
+                }
+                if failed:
+                    retry = [document for index, document in enumerate(batch) if index in failed]
+                    self._requeue(retry)
+                    raise
+            except PyMongoError:
+                self._requeue(batch)
+                raise
+            except Exception:
+                # Un lote que no se puede codificar volvería a fallar: se descarta
+                self.dropped += len(batch)
+                raise
+
+    def _requeue(self, documents: List[Dict[str, Any]]):
+        """Devuelve al frente de la cola los registros no escritos, solo hasta llenarla.
+
+        Con la cola llena `extendleft` descartaría por la derecha los registros más
+        nuevos sin contarlos: los que no caben se cuentan como descartados.
+        """
+        free = self.pending.maxlen - len(self.pending)
+        self.dropped += max(len(documents) - free, 0)
+        self.pending.extendleft(reversed(documents[:free]))
+
+
+_audit_log: Optional[AuditLog] = None
+
+
+def audit_enabled() -> bool:
+    """Indica si se registran las modificaciones (AUDIT_LOG, activo por defecto)."""
+    return os.getenv("AUDIT_LOG", "true").lower() != "false"
+
+
+def audit_retention_days() -> int:
+    """Días de retención de los registros (AUDIT_RETENTION_DAYS)."""
+    return int(os.getenv("AUDIT_RETENTION_DAYS", DEFAULT_RETENTION_DAYS))
+
+
+def get_audit_log() -> Optional[AuditLog]:
+    """Registro de auditoría del worker, o `None` si no se inició (scripts, pruebas) o está desactivado."""
+    return _audit_log
+
+
+def start_audit_log(collection: AsyncIOMotorCollection):
+    """Comienza a escribir registros de auditoría en este worker."""
+    global _audit_log
+    if _audit_log is None and audit_enabled():
+        _audit_log = AuditLog(collection)
+        _audit_log.start()
+
+
+async def stop_audit_log():
+    """Detiene la escritura, guardando lo pendiente."""
+    global _audit_log
+    if _audit_log is not None:
+        await _audit_log.stop()
+        _audit_log = None
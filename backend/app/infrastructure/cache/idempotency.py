@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import DuplicateKeyError
+
+IDEMPOTENCY_COLLECTION = "idempotency_keys"
+# Horas que se conserva la respuesta de una clave (índice TTL sobre `expiresAt`)
+DEFAULT_TTL_HOURS = 24
+# Segundos tras los cuales una clave en curso se considera abandonada (el worker murió) y otro la puede retomar
+LOCK_SECONDS = 60
+# Segundos que un duplicado espera a que termine la solicitud original antes de responder 409
+WAIT_SECONDS = 15
+POLL_SECONDS = (0.05, 0.5)
+
+# Encabezado con el que se marcan las respuestas repetidas
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+Handler = Callable[[], Awaitable[Tuple[int, Any]]]
+
+
+class IdempotencyConflict(Exception):
+    """La clave ya se usó con una solicitud distinta."""
+
+
+class IdempotencyInProgress(Exception):
+    """La solicitud original con la misma clave sigue en curso."""
+
+
+def request_fingerprint(*parts: Any) -> str:
+    """Huella de una solicitud, para detectar una clave reutilizada con otro contenido."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else json.dumps(part, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class IdempotencyStore:
+    """Respuestas de solicitudes con `Idempotency-Key`, para repetirlas sin volver a ejecutarlas.
+
+    La primera solicitud reserva la clave con un insert (el `_id` único hace de
+    candado entre workers), ejecuta el trabajo y guarda el código y el cuerpo
+    de la respuesta. Un reintento recibe la respuesta guardada; uno simultáneo
+    espera a que la original termine: en el mismo worker sobre su future y en
+    otro sondeando la colección. Las respuestas 5xx y las excepciones liberan
+    la clave para que el cliente pueda reintentar.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection, ttl_hours: float = DEFAULT_TTL_HOURS):
+        self.collection = collection
+        self.ttl = timedelta(hours=ttl_hours)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def run(self, key: str, scope: str, fingerprint: str, handler: Handler) -> Tuple[int, str, bool]:
+        """Ejecuta `handler` una sola vez por clave. Devuelve (código, cuerpo JSON, si es una repetición)."""
+        record_id = f"{scope}:{key}"
+        pending = self._inflight.get(record_id)
+        if pending is not None:
+            status_code, body, stored_fingerprint = await asyncio.shield(pending)
+            if stored_fingerprint != fingerprint:
+                raise IdempotencyConflict()
+            return status_code, body, True
+
+        if not await self._claim(record_id, fingerprint):
+            stored = await self._wait(record_id, fingerprint)
+            if stored is not None:
+                return stored["statusCode"], stored["body"], True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[record_id] = future
+        try:
+            status_code, content = await handler()
+            body = json.dumps(jsonable_encoder(content))
+            if status_code < 500:
+                await self.collection.update_one(
+                    {"_id": record_id},
+                    {"$set": {"state": "completed", "statusCode": status_code, "body": body, "completedAt": datetime.now()}}
+                )
+            else:
+                await self.collection.delete_one({"_id": record_id, "state": "pending"})
+            future.set_result((status_code, body, fingerprint))
+            return status_code, body, False
+        except BaseException as e:
+            await asyncio.shield(self.collection.delete_one({"_id": record_id, "state": "pending"}))
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                # Los que esperan en este worker reciben la misma excepción; si nadie espera no se informa como no leída
+                future.set_exception(e)
+                future.exception()
+            raise
+        finally:
+            self._inflight.pop(record_id, None)
+
+    async def _claim(self, record_id: str, fingerprint: str) -> bool:
+        now = datetime.now()
+        try:
+            await self.collection.insert_one({
+                "_id": record_id,
+                "state": "pending",
+                "fingerprint": fingerprint,
+                "createdAt": now,
+                "lockedUntil": now + timedelta(seconds=LOCK_SECONDS),
+                "expiresAt": now + self.ttl
+            })
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def _wait(self, record_id: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Espera la respuesta de otra solicitud con la misma clave. Devuelve `None` si la clave se retomó."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + WAIT_SECONDS
+        delay = POLL_SECONDS[0]
+        while True:
+            stored = await self.collection.find_one({"_id": record_id})
+            if stored is None:
+                # La original falló y liberó la clave
+                if await self._claim(record_id, fingerprint):
+                    return None
+                continue
+            if stored["fingerprint"] != fingerprint:
+                raise IdempotencyConflict()
+            if stored["state"] == "completed":
+                return stored
+            if stored["lockedUntil"] < datetime.now():
+                now = datetime.now()
+                retaken = await self.collection.find_one_and_update(
+                    {"_id": record_id, "state": "pending", "lockedUntil": stored["lockedUntil"]},
+                    {"$set": {"lockedUntil": now + timedelta(seconds=LOCK_SECONDS), "expiresAt": now + self.ttl}}
+                )
+                if retaken is not None:
+                    return None
+                continue
+            if loop.time() >= deadline:
+                raise IdempotencyInProgress()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, POLL_SECONDS[1])
+
+
+async def idempotent_response(store: Optional[IdempotencyStore], key: Optional[str], scope: str,
+                              fingerprint: str, success_status: int, work: Callable[[], Awaitable[Any]]) -> Any:
+    """Ejecuta `work` en un endpoint que admite `Idempotency-Key`.
+
+    Sin clave (o sin almacén) se comporta como un endpoint normal. Con clave,
+    los errores 4xx que lance `work` también se guardan y se repiten.
+    """
+    if not key or store is None:
+        return await work()
+
+    async def handler() -> Tuple[int, Any]:
+        try:
+            return success_status, await work()
+        except HTTPException as e:
+            if e.status_code >= 500:
+                raise
+            return e.status_code, {"detail": e.detail}
+
+    try:
+        status_code, body, replayed = await store.run(key, scope, fingerprint, handler)
+    except IdempotencyConflict:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="La clave de idempotencia ya se usó con una solicitud distinta"
+        )
+    except IdempotencyInProgress:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Hay una solicitud con la misma clave de idempotencia en curso; reintente más tarde"
+        )
+
+    headers = {REPLAYED_HEADER: "true"} if replayed else {}
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+_store: Optional[IdempotencyStore] = None
+
+
+def get_idempotency_store(collection: AsyncIOMotorCollection) -> IdempotencyStore:
+    """Devuelve el almacén del worker, creándolo en el primer uso (IDEMPOTENCY_TTL_HOURS ajusta la retención)."""
+    global _store
+    if _store is None:
+        _store = IdempotencyStore(collection, float(os.getenv("IDEMPOTENCY_TTL_HOURS", DEFAULT_TTL_HOURS)))
+    return _store
@@ -0,0 +1,221 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Callable, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError, OperationFailure
+
+INVALIDATION_COLLECTION = "cache_versions"
+
+# Segundos entre consultas cuando MongoDB no admite change streams (servidor sin réplica)
+POLL_SECONDS = 1
+# Segundos entre relecturas completas de las versiones, por si se perdió algún aviso
+RESYNC_SECONDS = 60
+# Margen de la consulta por fecha al sondear: cubre escrituras con la misma marca de tiempo
+POLL_OVERLAP = timedelta(seconds=2)
+
+# Códigos de MongoDB cuando el servidor no admite change streams o el resume token ya no sirve
+CHANGE_STREAMS_UNSUPPORTED = frozenset((40573, 40324))
+CHANGE_STREAM_HISTORY_LOST = 286
+
+# Manejadores por prefijo de clave, registrados por los módulos que mantienen cachés
+_handlers: Dict[str, List[Callable[[str], None]]] = {}
+
+
+def on_invalidate(prefix: str):
+    """Registra una función que descarta las entradas locales de una clave (p. ej. "company:<id>").
+
+    Se usa como decorador en el módulo dueño de la caché; el manejador recibe la
+    clave completa y corre en el event loop, por lo que debe ser rápido.
+    """
+    def register(handler: Callable[[str], None]) -> Callable[[str], None]:
+        _handlers.setdefault(prefix, []).append(handler)
+        return handler
+    return register
+
+
+def company_key(company_id: str) -> str:
+    return f"company:{company_id}"
+
+
+def dashboard_key(company_id: str) -> str:
+    return f"dashboard:{company_id}"
+
+
+class InvalidationBus:
+    """Avisa a todos los workers que una entidad cambió para que descarten sus cachés.
+
+    Cada clave tiene una versión en la colección `cache_versions`; quien escribe
+    la incrementa y cada worker la observa con un change stream (o sondeando, si
+    el servidor no los admite) y llama a los manejadores registrados. Las cachés
+    incluyen la versión conocida en su clave, así que un aviso perdido se corrige
+    con la siguiente relectura completa sin servir datos de otra versión.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection, use_change_stream: bool = True):
+        self.collection = collection
+        self.use_change_stream = use_change_stream
+        self._versions: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._resume_token = None
+        self.received = 0
+
+    @property
+    def running(self) -> bool:
+        """Indica si este worker está recibiendo invalidaciones; sin eso sus versiones no son confiables."""
+        return self._task is not None and not self._task.done()
+
+    def version(self, key: str) -> int:
+        """Última versión conocida de la clave en este worker."""
+        return self._versions.get(key, 0)
+
+    async def publish(self, key: str) -> int:
+        """Incrementa la versión de la clave y la aplica de inmediato en este worker."""
+        document = await self.collection.find_one_and_update(
+            {"_id": key},
+            {"$inc": {"version": 1}, "$currentDate": {"updatedAt": True}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._apply(key, document["version"])
+        return document["version"]
+
+    def _apply(self, key: str, version: int):
+        if version <= self._versions.get(key, 0):
+            return
+        self._versions[key] = version
+        self.received += 1
+        prefix = key.split(":", 1)[0] + ":"
+        for handler in _handlers.get(prefix, ()):
+            try:
+                handler(key)
+            except Exception as e:
+                print(f"Error al invalidar caché para {key}: {e}")
+
+    async def resync(self, since: Optional[datetime] = None) -> Optional[datetime]:
+        """Relee las versiones (todas o las cambiadas desde `since`) y aplica las nuevas.
+
+        Devuelve la fecha de la última versión leída, para continuar desde ahí.
+        """
+        query = {"updatedAt": {"$gte": since - POLL_OVERLAP}} if since else {}
+        latest = since
+        async for document in self.collection.find(query):
+            self._apply(document["_id"], document["version"])
+            updated_at = document.get("updatedAt")
+            if updated_at and (latest is None or updated_at > latest):
+                latest = updated_at
+        return latest
+
+    def start(self):
+        """Comienza a observar las versiones en este worker."""
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        try:
+            await self.resync()
+        except PyMongoError as e:
+            print(f"Bus de invalidación: error al leer versiones: {e}")
+        if not self.use_change_stream or not await self._watch():
+            await self._poll()
+
+    async def _watch(self) -> bool:
+        """Observa la colección con un change stream. Devuelve False si el servidor no los admite."""
+        backoff = 1
+        loop = asyncio.get_running_loop()
+        last_resync = loop.time()
+
+        while True:
+            try:
+                async with self.collection.watch(
+                    [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}],
+                    full_document="updateLookup",
+                    resume_after=self._resume_token,
+                    max_await_time_ms=RESYNC_SECONDS * 1000
+                ) as stream:
+                    backoff = 1
+                    while stream.alive:
+                        change = await stream.try_next()
+                        self._resume_token = stream.resume_token
+                        document = change and change.get("fullDocument")
+                        if document:
+                            self._apply(document["_id"], document["version"])
+                        if loop.time() - last_resync > RESYNC_SECONDS:
+                            await self.resync()
+                            last_resync = loop.time()
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code in CHANGE_STREAMS_UNSUPPORTED:
+                    print("Bus de invalidación: el servidor no admite change streams; se sondea la colección")
+                    return False
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    self._resume_token = None
+                print(f"Bus de invalidación: error en change stream: {e}")
+            except PyMongoError as e:
+                print(f"Bus de invalidación: error en change stream: {e}")
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+            # Lo que cambió mientras el stream estaba caído
+            try:
+                await self.resync()
+            except PyMongoError:
+                pass
+
+    async def _poll(self):
+        loop = asyncio.get_running_loop()
+        since = None
+        last_resync = loop.time()
+        while True:
+            await asyncio.sleep(POLL_SECONDS)
+            try:
+                if loop.time() - last_resync > RESYNC_SECONDS:
+                    since = await self.resync()
+                    last_resync = loop.time()
+                else:
+                    since = await self.resync(since)
+            except PyMongoError as e:
+                print(f"Bus de invalidación: error al sondear versiones: {e}")
+
+
+_bus: Optional[InvalidationBus] = None
+
+
+def invalidation_enabled() -> bool:
+    """Indica si las cachés entre workers se invalidan por el bus (CACHE_INVALIDATION, activo por defecto)."""
+    return os.getenv("CACHE_INVALIDATION", "true").lower() != "false"
+
+
+def get_invalidation_bus(collection: AsyncIOMotorCollection = None) -> Optional[InvalidationBus]:
+    """Devuelve el bus del worker, creándolo en el primer uso; `None` si está desactivado."""
+    global _bus
+    if _bus is None and collection is not None and invalidation_enabled():
+        _bus = InvalidationBus(collection)
+    return _bus
+
+
+async def start_invalidation_bus(collection: AsyncIOMotorCollection):
+    """Comienza a recibir invalidaciones en este worker."""
+    bus = get_invalidation_bus(collection)
+    if bus is not None:
+        bus.start()
+
+
+async def stop_invalidation_bus():
+    """Detiene la recepción de invalidaciones."""
+    global _bus
+    if _bus is not None:
+        await _bus.stop()
+        _bus = None
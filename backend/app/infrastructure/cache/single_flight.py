@@ -0,0 +1,63 @@
+import asyncio
+import functools
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from app.infrastructure.monitoring.metrics import SINGLE_FLIGHT_CALLS
+
+
+class SingleFlight:
+    """Comparte una sola ejecución entre llamadas concurrentes con la misma clave.
+
+    La primera llamada lanza la operación en su propio task y las que llegan
+    mientras está en curso esperan ese mismo resultado (o excepción). Si quien
+    la inició se cancela (p. ej. el cliente cortó la conexión), la operación
+    sigue para los demás. No es una caché: al terminar, la siguiente llamada
+    vuelve a ejecutar. El resultado es compartido y no debe modificarse.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            SINGLE_FLIGHT_CALLS.labels(self.name, "executed").inc()
+            call = asyncio.ensure_future(func())
+            self._calls[key] = call
+            call.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            SINGLE_FLIGHT_CALLS.labels(self.name, "coalesced").inc()
+        return await asyncio.shield(call)
+
+    def _finish(self, key: Hashable, call: asyncio.Future):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Si todos los que esperaban se cancelaron, la excepción no queda como no leída
+        if not call.cancelled():
+            call.exception()
+
+
+def single_flight(name: str):
+    """Decorador para métodos async de servicio: llamadas concurrentes con los mismos argumentos comparten la consulta.
+
+    La instancia (`self`) no forma parte de la clave, porque los servicios se
+    crean por solicitud sobre los mismos repositorios. Argumentos no hashables
+    ejecutan la llamada sin compartirla.
+    """
+    group = SingleFlight(name)
+
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                return await method(self, *args, **kwargs)
+            return await group.do(key, lambda: method(self, *args, **kwargs))
+
+        wrapper.single_flight = group
+        return wrapper
+
+    return decorator
@@ -1,8 +1,23 @@
 from typing import Dict, Any
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase, AsyncIOMotorCollection
+from pymongo.errors import OperationFailure
 from app.domain.repositories.user_repository import UserRepository
 from app.domain.repositories.company_repository import CompanyRepository
-from app.domain.repositories.expense_repository import ExpenseRepository
+from app.domain.repositories.expense_repository import (
+    ExpenseRepository, ARCHIVE_COLLECTION, WATERMARK_COLLECTION, TOMBSTONE_COLLECTION
+)
+from app.domain.services.expense_sync import sync_retention_days
+from app.domain.repositories.budget_repository import BudgetRepository
+from app.domain.repositories.job_repository import JobRepository
+from app.domain.repositories.slow_query_repository import SlowQueryRepository
+from app.domain.repositories.receipt_repository import ReceiptRepository
+from app.domain.repositories.audit_repository import AuditRepository
+from app.infrastructure.audit.audit_log import AUDIT_COLLECTION, audit_retention_days
+from app.infrastructure.monitoring.metrics import get_mongo_listeners
+from app.infrastructure.monitoring.slow_queries import get_slow_query_listeners, SLOW_QUERY_COLLECTION
+from app.infrastructure.database.write_behind import get_write_behind_buffer
+from app.infrastructure.cache.idempotency import IdempotencyStore, get_idempotency_store, IDEMPOTENCY_COLLECTION
+from app.infrastructure.cache.invalidation import InvalidationBus, get_invalidation_bus, INVALIDATION_COLLECTION
 
 
 class Database:
@@ -16,15 +31,24 @@ class Database:
         self.db_name = db_name
         
     async def connect(self):
-        """Conecta a MongoDB."""
-        self.client = AsyncIOMotorClient(self.mongodb_url)
-        self.db = self.client[self.db_name]
+        """Conecta a MongoDB.
+        
+        El cliente se guarda a nivel de clase para que todas las instancias
+        creadas por las dependencias de los routers compartan el mismo pool.
+        Los listeners de métricas miden cada comando y el estado del pool, y el
+        de consultas lentas registra las que superan el umbral configurado.
+        """
+        listeners = get_mongo_listeners() + get_slow_query_listeners()
+        Database.client = AsyncIOMotorClient(self.mongodb_url, event_listeners=listeners)
+        Database.db = Database.client[self.db_name]
         print(f"Conectado a MongoDB: {self.mongodb_url}/{self.db_name}")
         
     async def close(self):
         """Cierra la conexión a MongoDB."""
-        if self.client:
-            self.client.close()
+        if Database.client:
+            Database.client.close()
+            Database.client = None
+            Database.db = None
             print("Conexión a MongoDB cerrada")
             
     def get_collection(self, collection_name: str) -> AsyncIOMotorCollection:
@@ -33,15 +57,65 @@ class Database:
     
     def get_user_repository(self) -> UserRepository:
         """Devuelve un repositorio de usuarios."""
-        return UserRepository(self.get_collection("users"))
+        users = self.get_collection("users")
+        return UserRepository(users, get_write_behind_buffer("users", users))
         
     def get_company_repository(self) -> CompanyRepository:
         """Devuelve un repositorio de empresas."""
-        return CompanyRepository(self.get_collection("companies"))
+        return CompanyRepository(self.get_collection("companies"), self.get_invalidation_bus())
         
     def get_expense_repository(self) -> ExpenseRepository:
-        """Devuelve un repositorio de gastos."""
-        return ExpenseRepository(self.get_collection("expenses"))
+        """Devuelve un repositorio de gastos, que consulta también el archivo de gastos antiguos."""
+        return ExpenseRepository(
+            self.get_collection("expenses"),
+            self.get_budget_repository(),
+            self.get_collection(ARCHIVE_COLLECTION),
+            self.get_collection(WATERMARK_COLLECTION),
+            self.get_collection(TOMBSTONE_COLLECTION)
+        )
+    
+    def get_invalidation_bus(self) -> InvalidationBus:
+        """Devuelve el bus de invalidación de cachés del worker (o `None` si está desactivado)."""
+        return get_invalidation_bus(self.get_collection(INVALIDATION_COLLECTION))
+    
+    def get_idempotency_store(self) -> IdempotencyStore:
+        """Devuelve el almacén de respuestas por `Idempotency-Key` del worker."""
+        return get_idempotency_store(self.get_collection(IDEMPOTENCY_COLLECTION))
+    
+    def get_budget_repository(self) -> BudgetRepository:
+        """Devuelve un repositorio de contadores de presupuesto."""
+        return BudgetRepository(self.get_collection("budget_counters"))
+    
+    def get_job_repository(self) -> JobRepository:
+        """Devuelve un repositorio de tareas programadas y sus ejecuciones."""
+        return JobRepository(self.get_collection("scheduled_jobs"), self.get_collection("job_runs"))
+    
+    def get_receipt_repository(self) -> ReceiptRepository:
+        """Devuelve un repositorio de boletas subidas."""
+        return ReceiptRepository(self.get_collection("receipts"))
+    
+    def get_audit_repository(self) -> AuditRepository:
+        """Devuelve un repositorio del registro de auditoría."""
+        return AuditRepository(self.get_collection(AUDIT_COLLECTION))
+    
+    async def enable_pre_images(self, collection_name: str) -> bool:
+        """Activa `changeStreamPreAndPostImages` en una colección existente (MongoDB 6.0 o superior).
+        
+        Si el servidor no lo admite se avisa y se sigue. En MongoDB 6.0 o
+        superior los cambios se siguen notificando sin los borrados; en versiones
+        anteriores `ExpenseChangeBroker` observa sin pedir pre-imágenes, con el mismo efecto.
+        """
+        try:
+            await self.db.command("collMod", collection_name, changeStreamPreAndPostImages={"enabled": True})
+            return True
+        except OperationFailure as e:
+            print(f"No se pudieron activar las pre-imágenes de {collection_name}; "
+                  f"los borrados no se notificarán por el change stream: {e}")
+            return False
+    
+    def get_slow_query_repository(self) -> SlowQueryRepository:
+        """Devuelve un repositorio del registro de consultas lentas."""
+        return SlowQueryRepository(self.get_collection(SLOW_QUERY_COLLECTION))
         
     async def create_indexes(self):
         """Crea índices para optimizar las consultas."""
@@ -56,4 +130,49 @@ class Database:
         await self.db.expenses.create_index("userId")
         await self.db.expenses.create_index("companyId")
         await self.db.expenses.create_index("status")
-        await self.db.expenses.create_index("date")
\ No newline at end of file
+        await self.db.expenses.create_index("date")
+        # Bandeja de aprobación: filtra por empresa y estado, ordena por fecha con paginación por cursor
+        await self.db.expenses.create_index([("companyId", 1), ("status", 1), ("date", -1), ("_id", -1)])
+        # Búsqueda por prefijos normalizados, acotada a la empresa o al usuario
+        await self.db.expenses.create_index([("companyId", 1), ("search.prefixes", 1)])
+        await self.db.expenses.create_index([("userId", 1), ("search.prefixes", 1)])
+        # Sincronización incremental: cambios de un usuario por fecha de modificación, con cursor
+        await self.db.expenses.create_index([("userId", 1), ("updatedAt", 1), ("_id", 1)])
+        # Pre-imágenes para que el change stream sepa a qué empresa pertenece un gasto eliminado
+        await self.enable_pre_images("expenses")
+        
+        # Archivo de gastos antiguos: se consulta por usuario o empresa con orden por fecha
+        await self.db.expenses_archive.create_index([("userId", 1), ("date", -1)])
+        await self.db.expenses_archive.create_index([("companyId", 1), ("date", -1)])
+        await self.db.expenses_archive.create_index([("companyId", 1), ("status", 1), ("date", -1), ("_id", -1)])
+        await self.db.expenses_archive.create_index([("companyId", 1), ("search.prefixes", 1)])
+        await self.db.expenses_archive.create_index([("userId", 1), ("search.prefixes", 1)])
+        await self.db.expenses_archive.create_index([("userId", 1), ("updatedAt", 1), ("_id", 1)])
+        
+        # Lápidas de gastos eliminados, que vencen junto con los tokens de sincronización
+        await self.db.expense_tombstones.create_index([("userId", 1), ("deletedAt", 1), ("_id", 1)])
+        await self.db.expense_tombstones.create_index("deletedAt", expireAfterSeconds=sync_retention_days() * 24 * 3600)
+        
+        # Contadores de presupuesto: uno por empresa, alcance (usuario o categoría), clave y mes
+        await self.db.budget_counters.create_index(
+            [("companyId", 1), ("period", 1), ("scope", 1), ("key", 1)], unique=True
+        )
+        
+        # Tareas programadas: próxima ejecución e historial de ejecuciones (se conserva 30 días)
+        await self.db.scheduled_jobs.create_index("nextRunAt")
+        await self.db.job_runs.create_index([("job", 1), ("startedAt", -1)])
+        await self.db.job_runs.create_index("startedAt", expireAfterSeconds=30 * 24 * 3600)
+        
+        # Boletas: una por empresa y contenido; se buscan por hash al servirlas
+        await self.db.receipts.create_index([("companyId", 1), ("hash", 1)], unique=True)
+        await self.db.receipts.create_index("hash")
+        
+        # Respuestas por clave de idempotencia, que vencen solas
+        await self.db.idempotency_keys.create_index("expiresAt", expireAfterSeconds=0)
+        
+        # Auditoría: historial por entidad, con vencimiento por fecha
+        await self.db.audit_log.create_index([("entity", 1), ("entityId", 1), ("at", -1), ("_id", -1)])
+        await self.db.audit_log.create_index("at", expireAfterSeconds=audit_retention_days() * 24 * 3600)
+        
+        # Versiones de las claves del bus de invalidación, sondeadas por fecha si no hay change streams
+        await self.db.cache_versions.create_index("updatedAt")
\ No newline at end of file
@@ -0,0 +1,175 @@
+import asyncio
+import os
+import time
+from typing import Dict, Any, Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError, BulkWriteError
+
+from app.infrastructure.monitoring.metrics import WRITE_BEHIND_ENTRIES, WRITE_BEHIND_FLUSH_DURATION, WRITE_BEHIND_DROPPED
+
+# Segundos máximos que una actualización espera en memoria antes de escribirse
+DEFAULT_FLUSH_SECONDS = 5
+# Documentos distintos con actualizaciones pendientes; al llegar aquí se escribe de inmediato
+DEFAULT_MAX_ENTRIES = 10000
+
+# Solo operadores idempotentes: reintentar un lote que falló a medias no altera el resultado
+COALESCING_OPERATORS = ("$set", "$max")
+
+
+class WriteBehindBuffer:
+    """Acumula actualizaciones de baja importancia por documento y las escribe en un solo `bulk_write`.
+
+    Varias actualizaciones del mismo documento se combinan: en `$set` gana la
+    última y en `$max` el mayor valor. Lo que se puede perder está acotado: si
+    el worker termina abruptamente, hasta `max_entries` documentos y a lo más
+    `flush_seconds` de actualizaciones. Si la escritura falla, lo pendiente se
+    reintenta en el siguiente ciclo. Mientras el buffer está lleno, las
+    actualizaciones de documentos nuevos se descartan y se cuentan en
+    `write_behind_dropped_total`.
+    """
+
+    def __init__(self, name: str, collection: AsyncIOMotorCollection,
+                 flush_seconds: float = DEFAULT_FLUSH_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.name = name
+        self.collection = collection
+        self.flush_seconds = flush_seconds
+        self.max_entries = max_entries
+        self._pending: Dict[ObjectId, Dict[str, Dict[str, Any]]] = {}
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def record(self, document_id: ObjectId, update: Dict[str, Dict[str, Any]]) -> bool:
+        """Deja pendiente una actualización (`{"$max": {...}}` o `{"$set": {...}}`). Devuelve `False` si se descartó."""
+        if any(operator not in COALESCING_OPERATORS for operator in update):
+            raise ValueError(f"Operadores admitidos: {', '.join(COALESCING_OPERATORS)}")
+
+        if document_id not in self._pending and len(self._pending) >= self.max_entries:
+            WRITE_BEHIND_DROPPED.labels(self.name).inc()
+            return False
+
+        _merge(self._pending.setdefault(document_id, {}), update)
+        WRITE_BEHIND_ENTRIES.labels(self.name).set(len(self._pending))
+        if len(self._pending) >= self.max_entries:
+            self._full.set()
+        self._ensure_started()
+        return True
+
+    def _ensure_started(self):
+        # Se vuelve a crear si el task terminó, p. ej. por un error no previsto
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                # Cualquier error se reporta y se sigue: si el task terminara, nada volvería a escribirse
+                print(f"Escrituras diferidas ({self.name}): error al escribir: {e!r}")
+
+    async def flush(self) -> int:
+        """Escribe lo pendiente. Devuelve cuántos documentos se actualizaron."""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            ids = list(batch)
+            operations = [UpdateOne({"_id": document_id}, batch[document_id]) for document_id in ids]
+
+            started = time.perf_counter()
+            try:
+                result = await self.collection.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                self._requeue({ids[error["index"]]: batch[ids[error["index"]]] for error in e.details.get("writeErrors", [])})
+                raise
+            except PyMongoError:
+                self._requeue(batch)
+                raise
+            except Exception:
+                # Un lote que no se puede codificar volvería a fallar: se descarta
+                WRITE_BEHIND_DROPPED.labels(self.name).inc(len(batch))
+                raise
+            finally:
+                WRITE_BEHIND_FLUSH_DURATION.labels(self.name).observe(time.perf_counter() - started)
+                WRITE_BEHIND_ENTRIES.labels(self.name).set(len(self._pending))
+            return result.matched_count
+
+    def _requeue(self, failed: Dict[ObjectId, Dict[str, Dict[str, Any]]]):
+        # Lo nuevo llegó después, así que se combina encima de lo que falló
+        for document_id, update in failed.items():
+            newer = self._pending.get(document_id)
+            if newer is None and len(self._pending) >= self.max_entries:
+                WRITE_BEHIND_DROPPED.labels(self.name).inc()
+                continue
+            merged = {operator: dict(fields) for operator, fields in update.items()}
+            if newer is not None:
+                _merge(merged, newer)
+            self._pending[document_id] = merged
+
+    async def stop(self):
+        """Detiene la escritura periódica y escribe lo pendiente."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except PyMongoError as e:
+            WRITE_BEHIND_DROPPED.labels(self.name).inc(len(self._pending))
+            print(f"Escrituras diferidas ({self.name}): se pierden {len(self._pending)} al cerrar: {e}")
+
+
+def _merge(target: Dict[str, Dict[str, Any]], update: Dict[str, Dict[str, Any]]):
+    for operator, fields in update.items():
+        current = target.setdefault(operator, {})
+        for field, value in fields.items():
+            if operator == "$max" and field in current:
+                value = max(current[field], value)
+            current[field] = value
+
+
+_buffers: Dict[str, WriteBehindBuffer] = {}
+
+
+def write_behind_enabled() -> bool:
+    """Indica si las escrituras de baja importancia se difieren (WRITE_BEHIND, activo por defecto)."""
+    return os.getenv("WRITE_BEHIND", "true").lower() != "false"
+
+
+def get_write_behind_buffer(name: str, collection: AsyncIOMotorCollection) -> Optional[WriteBehindBuffer]:
+    """Devuelve el buffer del worker para `name`, creándolo en el primer uso; `None` si está desactivado.
+
+    WRITE_BEHIND_FLUSH_SECONDS y WRITE_BEHIND_MAX_ENTRIES ajustan sus límites.
+    """
+    if not write_behind_enabled():
+        return None
+    if name not in _buffers:
+        _buffers[name] = WriteBehindBuffer(
+            name,
+            collection,
+            float(os.getenv("WRITE_BEHIND_FLUSH_SECONDS", DEFAULT_FLUSH_SECONDS)),
+            int(os.getenv("WRITE_BEHIND_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        )
+    return _buffers[name]
+
+
+async def stop_write_behind_buffers():
+    """Escribe lo pendiente de todos los buffers del worker y los detiene."""
+    for buffer in list(_buffers.values()):
+        await buffer.stop()
+    _buffers.clear()
@@ -0,0 +1,240 @@
+import asyncio
+import json
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, Optional, Set, Deque, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import PyMongoError, OperationFailure
+
+from app.domain.repositories.expense_repository import ARCHIVE_MARKER
+
+# Segundos entre comentarios de keep-alive enviados a los clientes SSE
+HEARTBEAT_SECONDS = 15
+# Eventos pendientes por suscriptor antes de considerarlo lento
+SUBSCRIBER_QUEUE_SIZE = 100
+# Eventos recientes que se guardan para reanudar conexiones con Last-Event-ID
+HISTORY_SIZE = 1000
+
+# Código de MongoDB cuando el resume token ya no está en el oplog
+CHANGE_STREAM_HISTORY_LOST = 286
+# Versión desde la que los change streams admiten pre-imágenes; las anteriores rechazan la opción
+PRE_IMAGES_MIN_VERSION = 6
+
+# Evento especial: el cliente perdió eventos y debe volver a cargar la lista
+RESET_EVENT = {"type": "reset"}
+
+
+class ExpenseSubscription:
+    """Suscripción de un cliente SSE a los cambios de gastos de su empresa."""
+
+    def __init__(self, company_id: str, user_id: str, role: str, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.company_id = company_id
+        self.user_id = user_id
+        self.role = role
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        """Indica si el evento es visible para este suscriptor."""
+        if event.get("companyId") != self.company_id:
+            return False
+        # Los empleados solo ven sus propios gastos
+        if self.role not in ("manager", "admin"):
+            return event.get("userId") == self.user_id
+        return True
+
+    def offer(self, event: Dict[str, Any]):
+        """Encola un evento sin bloquear.
+
+        Si el cliente no consume a tiempo, se descartan sus eventos pendientes y
+        se le envía un evento `reset`, de modo que la memoria por cliente nunca
+        supera el tamaño de la cola.
+        """
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait(RESET_EVENT)
+
+
+class ExpenseChangeBroker:
+    """Observa la colección de gastos con un único change stream por worker
+    y reparte los cambios entre los suscriptores SSE.
+
+    Mover un gasto al archivo no se anuncia: el gasto sigue existiendo. Si un
+    gasto archivado se modifica, vuelve a la colección activa y el cambio sí se anuncia.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection, history_size: int = HISTORY_SIZE):
+        self.collection = collection
+        self._subscribers: Set[ExpenseSubscription] = set()
+        self._history: Deque[Tuple[str, Dict[str, Any]]] = deque(maxlen=history_size)
+        self._resume_token: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pre_images: Optional[bool] = None
+
+    def subscribe(self, company_id: str, user_id: str, role: str,
+                  last_event_id: Optional[str] = None) -> ExpenseSubscription:
+        """Registra un suscriptor y, si envía Last-Event-ID, le reenvía lo que se perdió."""
+        subscription = ExpenseSubscription(company_id, user_id, role)
+
+        if last_event_id:
+            self._replay(subscription, last_event_id)
+
+        self._subscribers.add(subscription)
+        self._ensure_started()
+        return subscription
+
+    def unsubscribe(self, subscription: ExpenseSubscription):
+        """Elimina un suscriptor."""
+        self._subscribers.discard(subscription)
+
+    async def stop(self):
+        """Detiene el change stream."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _ensure_started(self):
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._watch())
+
+    def _replay(self, subscription: ExpenseSubscription, last_event_id: str):
+        """Reenvía los eventos posteriores a `last_event_id` desde el historial en memoria."""
+        position = next((i for i, (token, _) in enumerate(self._history) if token == last_event_id), None)
+
+        if position is None:
+            # El evento ya salió del historial: el cliente debe recargar
+            subscription.offer(RESET_EVENT)
+            return
+
+        for _, event in list(self._history)[position + 1:]:
+            if subscription.matches(event):
+                subscription.offer(event)
+
+    def _publish(self, token: str, event: Dict[str, Any]):
+        self._history.append((token, event))
+        for subscription in list(self._subscribers):
+            if subscription.matches(event):
+                subscription.offer(event)
+
+    async def _supports_pre_images(self) -> bool:
+        """Indica si el servidor admite pre-imágenes en change streams; se consulta una sola vez."""
+        if self._pre_images is None:
+            info = await self.collection.database.client.server_info()
+            self._pre_images = info.get("versionArray", [0])[0] >= PRE_IMAGES_MIN_VERSION
+            if not self._pre_images:
+                print(f"MongoDB {info.get('version')} no admite pre-imágenes: los borrados no se notificarán")
+        return self._pre_images
+
+    async def _watch(self):
+        """Lee el change stream y se reconecta con el último resume token ante errores."""
+        pipeline = [
+            {"$match": {
+                "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+                # Las marcas que pone y quita el archivo al mover gastos no son cambios para los clientes
+                f"updateDescription.updatedFields.{ARCHIVE_MARKER}": {"$exists": False},
+                "updateDescription.removedFields": {"$ne": ARCHIVE_MARKER}
+            }},
+            {"$project": {
+                "operationType": 1,
+                "documentKey": 1,
+                "fullDocument.companyId": 1,
+                "fullDocument.userId": 1,
+                "fullDocument.status": 1,
+                "fullDocument.amount": 1,
+                "fullDocument.updatedAt": 1,
+                "fullDocumentBeforeChange.companyId": 1,
+                "fullDocumentBeforeChange.userId": 1,
+                f"fullDocumentBeforeChange.{ARCHIVE_MARKER}": 1
+            }}
+        ]
+        backoff = 1
+
+        while True:
+            try:
+                options = {"full_document": "updateLookup", "resume_after": self._resume_token}
+                if await self._supports_pre_images():
+                    options["full_document_before_change"] = "whenAvailable"
+                async with self.collection.watch(pipeline, **options) as stream:
+                    backoff = 1
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        event = self._to_event(change)
+                        if event:
+                            self._publish(event["id"], event)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    # No se puede reanudar: avisamos a todos para que recarguen
+                    self._resume_token = None
+                    for subscription in list(self._subscribers):
+                        subscription.offer(RESET_EVENT)
+                print(f"Error en change stream de gastos: {e}")
+            except PyMongoError as e:
+                print(f"Error en change stream de gastos: {e}")
+            except Exception as e:
+                # Si el task terminara, los suscriptores solo recibirían heartbeats
+                print(f"Error inesperado en change stream de gastos: {e!r}")
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    @staticmethod
+    def _to_event(change: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Convierte un cambio de MongoDB en el evento compacto que se envía a los clientes."""
+        before = change.get("fullDocumentBeforeChange") or {}
+        if change["operationType"] == "delete" and ARCHIVE_MARKER in before:
+            # Traslado al archivo: el gasto sigue existiendo
+            return None
+
+        document = change.get("fullDocument") or before
+        if not document or "companyId" not in document:
+            # Borrados sin pre-imagen (ver `Database.enable_pre_images`): no se sabe a qué empresa pertenecen
+            return None
+
+        updated_at = document.get("updatedAt")
+        return {
+            "id": change["_id"]["_data"],
+            "type": change["operationType"],
+            "expenseId": str(change["documentKey"]["_id"]),
+            "companyId": str(document["companyId"]),
+            "userId": str(document.get("userId")),
+            "status": document.get("status"),
+            "amount": document.get("amount"),
+            "updatedAt": updated_at.isoformat() if isinstance(updated_at, datetime) else None
+        }
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Serializa un evento en formato text/event-stream."""
+    if event is RESET_EVENT:
+        return "event: reset\ndata: {}\n\n"
+    return f"id: {event['id']}\nevent: expense\ndata: {json.dumps(event)}\n\n"
+
+
+_broker: Optional[ExpenseChangeBroker] = None
+
+
+def get_expense_broker(collection: AsyncIOMotorCollection) -> ExpenseChangeBroker:
+    """Devuelve el broker del worker, creándolo en el primer uso."""
+    global _broker
+    if _broker is None:
+        _broker = ExpenseChangeBroker(collection)
+    return _broker
+
+
+async def stop_expense_broker():
+    """Detiene el broker del worker si fue iniciado."""
+    global _broker
+    if _broker is not None:
+        await _broker.stop()
+        _broker = None
@@ -0,0 +1,130 @@
+import json
+import os
+from bisect import bisect_right
+from datetime import datetime, date
+from typing import Dict, List, Any, Optional, Tuple
+
+# Moneda en la que se expresan las tasas de la tabla
+BASE_CURRENCY = "CLP"
+
+# Tasas de referencia (CLP por unidad) usadas cuando no se configura FX_RATES_FILE.
+# Nota: Para el MVP son valores aproximados; en producción la tabla se carga
+# desde el archivo que publica el proceso que descarga las tasas oficiales.
+# Los montos convertidos con ellas quedan marcados con `fxSource: "fallback"`.
+DEFAULT_RATES: Dict[str, Dict[str, float]] = {
+    "USD": {"2024-01-01": 880.0, "2024-07-01": 935.0, "2025-01-01": 990.0, "2025-07-01": 950.0},
+    "EUR": {"2024-01-01": 970.0, "2024-07-01": 1010.0, "2025-01-01": 1030.0, "2025-07-01": 1110.0},
+    "ARS": {"2024-01-01": 1.08, "2024-07-01": 1.01, "2025-01-01": 0.96, "2025-07-01": 0.78},
+    "PEN": {"2024-01-01": 237.0, "2024-07-01": 247.0, "2025-01-01": 263.0, "2025-07-01": 267.0},
+    "UF": {"2024-01-01": 36790.0, "2024-07-01": 37570.0, "2025-01-01": 38420.0, "2025-07-01": 39270.0},
+}
+
+
+# Origen de las tasas, guardado en `fxSource` junto a cada monto convertido
+FX_SOURCE_CONFIGURED = "configured"
+FX_SOURCE_FALLBACK = "fallback"
+
+
+class FXRateNotFound(ValueError):
+    """No hay tasa de cambio para la moneda indicada."""
+
+
+class FXService:
+    """Conversión de montos entre monedas con una tabla local de tasas por fecha.
+
+    La tabla se mantiene en memoria como listas ordenadas por fecha, de modo que
+    cada conversión es una búsqueda binaria sin acceso a red ni a la base de datos.
+    Para una fecha sin tasa publicada se usa la última tasa anterior. Sin
+    `rates` se usan las tasas de referencia y `source` es `FX_SOURCE_FALLBACK`.
+    """
+
+    def __init__(self, rates: Dict[str, Dict[str, float]] = None, base_currency: str = BASE_CURRENCY):
+        self.base_currency = base_currency
+        self.source = FX_SOURCE_FALLBACK if rates is None else FX_SOURCE_CONFIGURED
+        self._days: Dict[str, List[int]] = {}
+        self._rates: Dict[str, List[float]] = {}
+        self.load(rates if rates is not None else DEFAULT_RATES)
+
+    @classmethod
+    def from_file(cls, path: str) -> "FXService":
+        """Carga la tabla desde un JSON `{"base": "CLP", "rates": {"USD": {"2025-01-02": 990.5}}}`."""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["rates"], data.get("base", BASE_CURRENCY))
+
+    def load(self, rates: Dict[str, Dict[str, float]]) -> None:
+        """Reemplaza la tabla de tasas."""
+        days, values = {}, {}
+        for currency, by_date in rates.items():
+            points = sorted((date.fromisoformat(day).toordinal(), float(rate)) for day, rate in by_date.items())
+            if any(rate <= 0 for _, rate in points):
+                raise ValueError(f"Tasa no positiva para {currency}")
+            days[currency.upper()] = [day for day, _ in points]
+            values[currency.upper()] = [rate for _, rate in points]
+        self._days, self._rates = days, values
+
+    @property
+    def currencies(self) -> List[str]:
+        """Monedas soportadas, incluida la moneda base."""
+        return [self.base_currency] + sorted(self._rates)
+
+    def rate_to_base(self, currency: str, on: datetime) -> float:
+        """Unidades de la moneda base por una unidad de `currency` en la fecha indicada."""
+        currency = (currency or self.base_currency).upper()
+        if currency == self.base_currency:
+            return 1.0
+
+        days = self._days.get(currency)
+        if not days:
+            raise FXRateNotFound(f"Moneda no soportada: {currency}")
+
+        # Antes de la primera tasa publicada se usa la primera disponible
+        index = max(bisect_right(days, on.toordinal()) - 1, 0)
+        return self._rates[currency][index]
+
+    def rate(self, from_currency: str, to_currency: str, on: datetime) -> float:
+        """Tasa para convertir de `from_currency` a `to_currency` en la fecha indicada."""
+        if (from_currency or "").upper() == (to_currency or "").upper():
+            return 1.0
+        return self.rate_to_base(from_currency, on) / self.rate_to_base(to_currency, on)
+
+    def convert(self, amount: float, from_currency: str, to_currency: str, on: datetime) -> Tuple[float, float]:
+        """Convierte un monto y devuelve (monto convertido, tasa usada)."""
+        fx_rate = self.rate(from_currency, to_currency, on)
+        return round(amount * fx_rate, 2), fx_rate
+
+    def company_amount_fields(self, expense: Dict[str, Any], company_currency: str) -> Dict[str, Any]:
+        """Campos desnormalizados con el monto del gasto en la moneda de la empresa."""
+        company_currency = (company_currency or self.base_currency).upper()
+        on = expense.get("date") or datetime.now()
+        company_amount, fx_rate = self.convert(expense.get("amount") or 0, expense.get("currency"), company_currency, on)
+        return {"companyAmount": company_amount, "companyCurrency": company_currency, "fxRate": fx_rate,
+                "fxSource": self.source}
+
+
+_fx_service: Optional[FXService] = None
+
+
+def get_fx_service() -> FXService:
+    """Devuelve la tabla de tasas del worker, cargándola la primera vez.
+
+    Si la variable de entorno FX_RATES_FILE apunta a un archivo se usa ese
+    archivo; si no, las tasas de referencia de `DEFAULT_RATES`, con una advertencia.
+    """
+    global _fx_service
+    if _fx_service is None:
+        path = os.getenv("FX_RATES_FILE")
+        if path:
+            _fx_service = FXService.from_file(path)
+        else:
+            print("ADVERTENCIA: FX_RATES_FILE no está configurado; los montos en moneda de la empresa se "
+                  "calculan con tasas de referencia aproximadas y se guardan con fxSource=\"fallback\"")
+            _fx_service = FXService()
+    return _fx_service
+
+
+def reload_fx_service() -> FXService:
+    """Descarta la tabla en memoria y la vuelve a cargar."""
+    global _fx_service
+    _fx_service = None
+    return get_fx_service()
@@ -1,5 +1,4 @@
 import re
-import httpx
 from typing import Dict, Any, Optional
 
 class SIIService:
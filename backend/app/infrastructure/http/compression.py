@@ -0,0 +1,228 @@
+import os
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.infrastructure.http.negotiation import parse_qualities
+
+# Si falta la biblioteca, esa codificación simplemente no se ofrece
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Respuestas más chicas no se comprimen: el ahorro no compensa la CPU ni los encabezados
+DEFAULT_MIN_BYTES = 1024
+# Respuestas completas desde este tamaño se comprimen en un hilo para no bloquear el event loop
+OFFLOAD_BYTES = 256 * 1024
+
+# Preferencia del servidor cuando el cliente acepta varias con la misma calidad
+ENCODING_PREFERENCE = ("zstd", "br", "gzip")
+
+# Nivel por clase de ruta y algoritmo. "stream" se usa para toda respuesta enviada por partes
+DEFAULT_LEVELS: Dict[str, Dict[str, int]] = {
+    "interactive": {"zstd": 3, "br": 4, "gzip": 6},
+    "bulk": {"zstd": 6, "br": 5, "gzip": 6},
+    "stream": {"zstd": 1, "br": 1, "gzip": 1},
+}
+
+# Rutas con respuestas grandes que se leen poco y se cachean: vale la pena comprimir más
+DEFAULT_ROUTE_CLASSES: List[Tuple[str, str]] = [
+    ("/api/expenses/company/", "bulk"),
+    ("/api/admin/", "bulk"),
+]
+
+# Tipos que se comprimen; imágenes, PDF y eventos SSE (que deben llegar sin demora) quedan fuera
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/msgpack", "text/plain", "text/csv", "text/html", "application/x-ndjson"
+)
+
+
+def available_encodings() -> Tuple[str, ...]:
+    """Codificaciones que este worker puede producir, en orden de preferencia."""
+    libraries = {"zstd": zstandard, "br": brotli, "gzip": zlib}
+    return tuple(encoding for encoding in ENCODING_PREFERENCE if libraries[encoding] is not None)
+
+
+def negotiate_encoding(accept_encoding: Optional[str], offered: Tuple[str, ...]) -> Optional[str]:
+    """Elige la codificación según `Accept-Encoding` (con valores q). `None` si no se comprime."""
+    if not accept_encoding:
+        return None
+    qualities = parse_qualities(accept_encoding)
+    wildcard = qualities.get("*", 0.0)
+    candidates = [(qualities.get(encoding, wildcard), -rank, encoding) for rank, encoding in enumerate(offered)]
+    quality, _, encoding = max(candidates, default=(0.0, 0, None))
+    return encoding if quality > 0 else None
+
+
+class Compressor:
+    """Compresor incremental con la misma interfaz para gzip, brotli y zstd."""
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._gzip = zlib.compressobj(level, zlib.DEFLATED, 31)
+        elif encoding == "br":
+            self._brotli = brotli.Compressor(quality=level)
+        else:
+            self._zstd = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        """Comprime un bloque; con `flush` se entrega todo lo acumulado para que el cliente lo reciba ya."""
+        if self.encoding == "gzip":
+            return self._gzip.compress(data) + (self._gzip.flush(zlib.Z_SYNC_FLUSH) if flush else b"")
+        if self.encoding == "br":
+            return self._brotli.process(data) + (self._brotli.flush() if flush else b"")
+        return self._zstd.compress(data) + (self._zstd.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK) if flush else b"")
+
+    def finish(self) -> bytes:
+        if self.encoding == "gzip":
+            return self._gzip.flush()
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zstd.flush()
+
+
+def compress_once(data: bytes, encoding: str, level: int) -> bytes:
+    compressor = Compressor(encoding, level)
+    return compressor.compress(data) + compressor.finish()
+
+
+def parse_levels(spec: Optional[str], base: Dict[str, Dict[str, int]]) -> Dict[str, Dict[str, int]]:
+    """Aplica ajustes como "bulk.zstd=9,stream.gzip=3" sobre los niveles por defecto."""
+    levels = {route_class: dict(values) for route_class, values in base.items()}
+    for item in (spec or "").split(","):
+        key, _, value = item.strip().partition("=")
+        route_class, _, encoding = key.partition(".")
+        if route_class in levels and encoding in ENCODING_PREFERENCE and value.strip().lstrip("-").isdigit():
+            levels[route_class][encoding] = int(value)
+    return levels
+
+
+class CompressionMiddleware:
+    """Middleware ASGI que comprime respuestas con zstd, brotli o gzip según `Accept-Encoding`.
+
+    Una respuesta completa se comprime si supera `min_bytes`; una que se envía
+    por partes se comprime bloque a bloque, entregando cada uno al cliente sin
+    esperar el resto. El nivel depende de la clase de la ruta (por prefijo) y
+    del algoritmo. No se tocan respuestas ya codificadas, parciales (206), sin
+    cuerpo ni de tipos no comprimibles.
+    """
+
+    def __init__(self, app: ASGIApp, min_bytes: int = DEFAULT_MIN_BYTES, levels: Dict[str, Dict[str, int]] = None,
+                 route_classes: List[Tuple[str, str]] = None):
+        self.app = app
+        self.min_bytes = min_bytes
+        self.levels = levels or DEFAULT_LEVELS
+        self.route_classes = route_classes if route_classes is not None else DEFAULT_ROUTE_CLASSES
+        self.encodings = available_encodings()
+
+    def route_class(self, path: str) -> str:
+        for prefix, route_class in self.route_classes:
+            if path.startswith(prefix):
+                return route_class
+        return "interactive"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"), self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        route_class = self.route_class(scope["path"])
+        start: Optional[Message] = None
+        compressor: Optional[Compressor] = None
+        passthrough = False
+
+        async def send_compressed(message: Message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "").split(";")[0].strip()
+                passthrough = (
+                    message["status"] in (204, 206, 304)
+                    or "content-encoding" in headers
+                    or content_type not in COMPRESSIBLE_TYPES
+                    or scope["method"] == "HEAD"
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    # Se retiene hasta saber si el cuerpo llega completo y qué tamaño tiene
+                    start = message
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                headers = MutableHeaders(raw=start["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body:
+                    # Respuesta completa: se decide por tamaño y se comprime de una vez
+                    if len(body) < self.min_bytes:
+                        await send(start)
+                        await send(message)
+                        return
+                    level = self.levels[route_class][encoding]
+                    if len(body) >= OFFLOAD_BYTES:
+                        compressed = await anyio.to_thread.run_sync(compress_once, body, encoding, level)
+                    else:
+                        compressed = compress_once(body, encoding, level)
+                    _set_encoded_headers(headers, encoding)
+                    headers["content-length"] = str(len(compressed))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+
+                # Respuesta por partes: no se conoce el tamaño total, se comprime en flujo
+                compressor = Compressor(encoding, self.levels["stream"][encoding])
+                _set_encoded_headers(headers, encoding)
+                del headers["content-length"]
+                await send(start)
+
+            if more_body:
+                chunk = compressor.compress(body, flush=True)
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": compressor.compress(body) + compressor.finish()})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def _set_encoded_headers(headers: MutableHeaders, encoding: str):
+    headers["content-encoding"] = encoding
+    # La representación comprimida es otra: un ETag fuerte no puede compartirse con la original
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["etag"] = f"W/{etag}"
+
+
+def compression_enabled() -> bool:
+    """Indica si se comprimen las respuestas (COMPRESSION_ENABLED, activa por defecto)."""
+    return os.getenv("COMPRESSION_ENABLED", "true").lower() != "false"
+
+
+def compression_options() -> Dict:
+    """Umbral (COMPRESSION_MIN_BYTES) y niveles (COMPRESSION_LEVELS, p. ej. "bulk.zstd=9,stream.gzip=3")."""
+    return {
+        "min_bytes": int(os.getenv("COMPRESSION_MIN_BYTES", DEFAULT_MIN_BYTES)),
+        "levels": parse_levels(os.getenv("COMPRESSION_LEVELS"), DEFAULT_LEVELS),
+    }
@@ -0,0 +1,170 @@
+import asyncio
+import copy
+from datetime import date, datetime, timezone
+from enum import Enum
+from typing import Any, Callable, Coroutine, Optional
+
+import msgpack
+from bson import ObjectId
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import ResponseValidationError
+from fastapi.routing import APIRoute, get_request_handler
+from fastapi.utils import is_body_allowed_for_status_code
+from pydantic import BaseModel
+
+from app.infrastructure.http.negotiation import parse_qualities
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack")
+
+# Tipos de extensión: los ObjectId viajan como sus 12 bytes y las fechas como el
+# timestamp estándar de MessagePack (-1). Las fechas sin zona, como las guarda
+# MongoDB, se interpretan en UTC; las recibidas se entregan sin zona.
+EXT_OBJECT_ID = 1
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return msgpack.ExtType(EXT_OBJECT_ID, value.binary)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return msgpack.Timestamp.from_datetime(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    return jsonable_encoder(value)
+
+
+def packb(content: Any) -> bytes:
+    return msgpack.packb(content, default=_default, use_bin_type=True)
+
+
+def _ext_hook(code: int, data: bytes) -> Any:
+    # Los DTO de entrada esperan los identificadores como texto
+    if code == EXT_OBJECT_ID and len(data) == 12:
+        return str(ObjectId(data))
+    return msgpack.ExtType(code, data)
+
+
+def _naive(value: Any) -> Any:
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def unpackb(data: bytes) -> Any:
+    return msgpack.unpackb(
+        data, ext_hook=_ext_hook, timestamp=3, strict_map_key=False,
+        object_hook=lambda obj: {key: _naive(value) for key, value in obj.items()},
+        list_hook=lambda items: [_naive(value) for value in items]
+    )
+
+
+class MsgpackResponse(Response):
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return packb(content)
+
+
+def accepts_msgpack(accept: Optional[str]) -> bool:
+    """Indica si `Accept` pide MessagePack explícitamente con una calidad no menor que la de JSON."""
+    qualities = parse_qualities(accept)
+    msgpack_quality = max(qualities.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES)
+    json_quality = max(qualities.get(media_type, 0.0) for media_type in ("application/json", "application/*", "*/*"))
+    return msgpack_quality > 0 and msgpack_quality >= json_quality
+
+
+def is_msgpack(content_type: Optional[str]) -> bool:
+    return (content_type or "").split(";")[0].strip().lower() in MSGPACK_MEDIA_TYPES
+
+
+class MsgpackRequest(Request):
+    """Solicitud cuyo cuerpo en MessagePack se entrega a FastAPI como si fuera JSON ya decodificado."""
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = unpackb(await self.body())
+        return self._json
+
+
+def _as_json_request(request: Request) -> MsgpackRequest:
+    # FastAPI solo valida como modelo los cuerpos JSON: se presenta como tal y `json()` decodifica MessagePack
+    headers = [(name, value) for name, value in request.scope["headers"] if name != b"content-type"]
+    headers.append((b"content-type", b"application/json"))
+    return MsgpackRequest({**request.scope, "headers": headers}, request.receive, request._send)
+
+
+class MsgpackRoute(APIRoute):
+    """Ruta que responde en JSON o MessagePack según `Accept` y acepta cuerpos en ambos formatos.
+
+    Para MessagePack se usa una copia del manejador de FastAPI cuyo endpoint
+    devuelve directamente una `MsgpackResponse`: así los ObjectId y las fechas
+    no pasan por `jsonable_encoder` y se codifican como extensiones.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        json_handler = super().get_route_handler()
+        msgpack_handler = json_handler
+        if is_body_allowed_for_status_code(self.status_code):
+            dependant = copy.copy(self.dependant)
+            dependant.call = self._msgpack_endpoint(self.dependant.call)
+            msgpack_handler = get_request_handler(
+                dependant=dependant,
+                body_field=self.body_field,
+                status_code=self.status_code,
+                response_class=self.response_class,
+                dependency_overrides_provider=self.dependency_overrides_provider,
+            )
+
+        async def handler(request: Request) -> Response:
+            if is_msgpack(request.headers.get("content-type")):
+                request = _as_json_request(request)
+            if accepts_msgpack(request.headers.get("accept")):
+                response = await msgpack_handler(request)
+            else:
+                response = await json_handler(request)
+            response.headers.add_vary_header("Accept")
+            return response
+
+        return handler
+
+    def _msgpack_endpoint(self, call: Callable) -> Callable:
+        # Se conserva si el endpoint es síncrono: FastAPI lo ejecuta en el threadpool y la codificación también
+        if asyncio.iscoroutinefunction(call):
+            async def endpoint(**values):
+                return self._msgpack_response(await call(**values))
+        else:
+            def endpoint(**values):
+                return self._msgpack_response(call(**values))
+        return endpoint
+
+    def _msgpack_response(self, content: Any) -> Response:
+        # Las respuestas que el endpoint construye por su cuenta (SSE, las repetidas por
+        # idempotencia) y los errores se entregan tal cual, en su formato original
+        if isinstance(content, Response):
+            return content
+        field = self.secure_cloned_response_field
+        if field is not None:
+            value, errors = field.validate(content, {}, loc=("response",))
+            if errors:
+                raise ResponseValidationError(errors=errors if isinstance(errors, list) else [errors], body=content)
+            # Modo "python": filtra por el response_model sin convertir ObjectId ni fechas a texto
+            content = field.serialize(
+                value,
+                mode="python",
+                include=self.response_model_include,
+                exclude=self.response_model_exclude,
+                by_alias=self.response_model_by_alias,
+                exclude_unset=self.response_model_exclude_unset,
+                exclude_defaults=self.response_model_exclude_defaults,
+                exclude_none=self.response_model_exclude_none,
+            )
+        return MsgpackResponse(content, status_code=self.status_code or 200)
@@ -0,0 +1,21 @@
+from typing import Dict, Optional
+
+
+def parse_qualities(header: Optional[str]) -> Dict[str, float]:
+    """Interpreta encabezados como `Accept` o `Accept-Encoding` en {valor en minúsculas: calidad q}."""
+    qualities: Dict[str, float] = {}
+    for item in (header or "").split(","):
+        name, *params = item.split(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name] = quality
+    return qualities
@@ -0,0 +1,246 @@
+import asyncio
+import os
+import time
+from typing import Dict, Any, Optional, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import multiprocess
+from pymongo import monitoring
+from starlette.responses import Response
+from starlette.types import ASGIApp, Receive, Scope, Send, Message
+
+# Segundos entre mediciones del retraso del event loop
+LOOP_LAG_INTERVAL_SECONDS = 0.5
+
+# Comandos de control del driver que no aportan a la latencia de las consultas
+IGNORED_COMMANDS = frozenset(("hello", "ismaster", "isMaster", "ping", "saslStart", "saslContinue",
+                              "endSessions", "buildInfo", "getLastError"))
+
+# Comandos cuyo nombre de colección no viene como valor del propio comando
+COLLECTION_ARGUMENTS = {"getMore": "collection"}
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Duración de las solicitudes HTTP por ruta y código de estado",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Solicitudes HTTP en curso",
+    multiprocess_mode="livesum"
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "mongodb_command_duration_seconds",
+    "Duración de los comandos de MongoDB por colección y comando",
+    ["collection", "command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "mongodb_command_failures_total",
+    "Comandos de MongoDB fallidos por colección y comando",
+    ["collection", "command"]
+)
+MONGO_POOL_CONNECTIONS = Gauge(
+    "mongodb_pool_connections",
+    "Conexiones del pool de MongoDB por servidor y estado (open, in_use)",
+    ["address", "state"],
+    multiprocess_mode="livesum"
+)
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "mongodb_pool_checkout_failures_total",
+    "Intentos fallidos de obtener una conexión del pool de MongoDB",
+    ["address", "reason"]
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Retraso del event loop respecto de lo programado",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+SINGLE_FLIGHT_CALLS = Counter(
+    "single_flight_calls_total",
+    "Llamadas a lecturas compartidas por operación: ejecutadas o unidas a una en curso",
+    ["operation", "result"]
+)
+WRITE_BEHIND_ENTRIES = Gauge(
+    "write_behind_entries",
+    "Documentos con escrituras diferidas pendientes por buffer",
+    ["buffer"],
+    multiprocess_mode="livesum"
+)
+WRITE_BEHIND_FLUSH_DURATION = Histogram(
+    "write_behind_flush_seconds",
+    "Duración de cada escritura en lote de un buffer diferido",
+    ["buffer"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+WRITE_BEHIND_DROPPED = Counter(
+    "write_behind_dropped_total",
+    "Actualizaciones diferidas descartadas por buffer lleno o error de escritura",
+    ["buffer"]
+)
+
+class MetricsMiddleware:
+    """Middleware ASGI que mide la duración de cada solicitud.
+
+    La ruta se etiqueta con su plantilla (`/api/expenses/{expense_id}`), no con
+    la URL, para que la cantidad de series no crezca con los IDs. Es un
+    middleware ASGI puro para no pagar el costo de `BaseHTTPMiddleware`.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            # El router de FastAPI deja la ruta resuelta en el scope
+            route = scope.get("route")
+            REQUEST_DURATION.labels(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status_code)
+            ).observe(time.perf_counter() - started)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Mide la latencia de los comandos de MongoDB por colección y comando.
+
+    El driver informa la duración en el evento de término; del evento de inicio
+    solo se guarda la colección, que el evento de término no trae.
+    """
+
+    def __init__(self):
+        self._collections: Dict[Tuple[int, Any], str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        collection = event.command.get(COLLECTION_ARGUMENTS.get(event.command_name, event.command_name))
+        self._collections[(event.request_id, event.connection_id)] = collection if isinstance(collection, str) else "-"
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        collection = self._collections.pop((event.request_id, event.connection_id), None)
+        if collection is not None:
+            MONGO_COMMAND_DURATION.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        collection = self._collections.pop((event.request_id, event.connection_id), None)
+        if collection is not None:
+            MONGO_COMMAND_DURATION.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+            MONGO_COMMAND_FAILURES.labels(collection, event.command_name).inc()
+
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """Mantiene los indicadores de conexiones abiertas y en uso del pool."""
+
+    @staticmethod
+    def _address(event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.labels(self._address(event), "open").inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.labels(self._address(event), "open").dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_CHECKOUT_FAILURES.labels(self._address(event), str(event.reason)).inc()
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_CONNECTIONS.labels(self._address(event), "in_use").inc()
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CONNECTIONS.labels(self._address(event), "in_use").dec()
+
+
+def metrics_enabled() -> bool:
+    """Indica si la instrumentación está activa (METRICS_ENABLED, activa por defecto)."""
+    return os.getenv("METRICS_ENABLED", "true").lower() != "false"
+
+
+def get_mongo_listeners() -> list:
+    """Listeners para el cliente de MongoDB compartido, o ninguno si las métricas están desactivadas."""
+    if not metrics_enabled():
+        return []
+    return [MongoCommandListener(), MongoPoolListener()]
+
+
+def metrics_response() -> Response:
+    """Respuesta en formato de exposición de Prometheus.
+
+    Con varios workers de uvicorn debe definirse PROMETHEUS_MULTIPROC_DIR para
+    que cada scrape agregue las métricas de todos los procesos.
+    """
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    # Con `media_type` Starlette agregaría un segundo charset al que ya trae CONTENT_TYPE_LATEST
+    return Response(generate_latest(registry), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+
+_loop_lag_task: Optional[asyncio.Task] = None
+
+
+async def _measure_loop_lag(interval: float):
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(loop.time() - expected, 0))
+
+
+def start_loop_lag_monitor(interval: float = LOOP_LAG_INTERVAL_SECONDS):
+    """Inicia la medición periódica del retraso del event loop en este worker."""
+    global _loop_lag_task
+    if _loop_lag_task is None:
+        _loop_lag_task = asyncio.create_task(_measure_loop_lag(interval))
+
+
+async def stop_loop_lag_monitor():
+    """Detiene la medición del retraso del event loop."""
+    global _loop_lag_task
+    if _loop_lag_task is not None:
+        _loop_lag_task.cancel()
+        try:
+            await _loop_lag_task
+        except asyncio.CancelledError:
+            pass
+        _loop_lag_task = None
@@ -0,0 +1,41 @@
+from contextvars import ContextVar
+from typing import Optional, Dict, Any
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Scope ASGI de la solicitud en curso. Motor copia el contexto al hilo donde
+# ejecuta cada operación, por lo que también es visible desde los listeners de pymongo.
+current_request_scope: ContextVar[Optional[Scope]] = ContextVar("current_request_scope", default=None)
+# Usuario autenticado de la solicitud en curso (payload del JWT), para la auditoría
+current_actor: ContextVar[Optional[Dict[str, Any]]] = ContextVar("current_actor", default=None)
+
+
+class RequestContextMiddleware:
+    """Middleware ASGI que deja el scope de la solicitud disponible para el resto del código."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = current_request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_request_scope.reset(token)
+
+
+def current_route() -> Optional[str]:
+    """Ruta de la solicitud en curso como "MÉTODO /plantilla", o `None` fuera de una solicitud.
+
+    La plantilla (`/api/expenses/{expense_id}`) la resuelve el router de FastAPI
+    en el mismo scope; antes de eso se usa la ruta literal.
+    """
+    scope = current_request_scope.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
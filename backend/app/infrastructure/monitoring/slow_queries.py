@@ -0,0 +1,298 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple, Deque
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+from pymongo import monitoring
+from pymongo.errors import PyMongoError, CollectionInvalid
+
+from app.infrastructure.cache.ttl_cache import TTLCache
+from app.infrastructure.monitoring.request_context import current_route
+
+SLOW_QUERY_COLLECTION = "slow_queries"
+# Tamaño de la colección capped: los registros más antiguos se descartan solos
+SLOW_QUERY_COLLECTION_BYTES = 64 * 1024 * 1024
+
+# Registros pendientes de escribir; si la escritura no da abasto se pierden los más antiguos
+PENDING_LIMIT = 1000
+# Segundos entre escrituras de registros pendientes
+FLUSH_SECONDS = 2
+# Como máximo un explain por forma de consulta en este intervalo
+EXPLAIN_COOLDOWN_SECONDS = 60
+
+# Comandos que se pueden explicar sin efectos y qué argumentos se conservan para hacerlo
+EXPLAINABLE_COMMANDS = {
+    "find": ("filter", "sort", "projection", "hint", "skip", "limit", "collation"),
+    "aggregate": ("pipeline", "hint", "collation", "allowDiskUse"),
+    "count": ("query", "hint", "skip", "limit", "collation"),
+    "distinct": ("key", "query", "collation"),
+}
+
+# Comandos de escritura y lectura cuya forma se registra
+TRACKED_COMMANDS = frozenset(EXPLAINABLE_COMMANDS) | {"findAndModify", "update", "delete", "insert", "getMore"}
+
+# Argumentos que describen la forma de cada comando
+SHAPE_ARGUMENTS = {
+    "find": ("filter", "sort", "projection"),
+    "aggregate": ("pipeline",),
+    "count": ("query",),
+    "distinct": ("key", "query"),
+    "findAndModify": ("query", "sort"),
+    "update": ("updates",),
+    "delete": ("deletes",),
+}
+
+# Claves cuyos valores son parte de la forma aunque sean literales (orden y proyección)
+STRUCTURAL_KEYS = frozenset(("sort", "projection", "$sort", "$project", "key"))
+
+
+def normalize_shape(value: Any, structural: bool = False) -> Any:
+    """Reemplaza los literales de una consulta por "?" conservando campos y operadores.
+
+    Las rutas de campo y variables (`"$amount"`, `"$$NOW"`) se conservan, y una
+    lista solo de literales se colapsa en un solo "?" para que `$in` con
+    distinto número de valores tenga la misma forma.
+    """
+    if isinstance(value, dict):
+        return {key: normalize_shape(item, structural or key in STRUCTURAL_KEYS) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if any(isinstance(item, (dict, list, tuple)) or _is_path(item) for item in value):
+            return [normalize_shape(item, structural) for item in value]
+        return "?"
+    if structural or _is_path(value):
+        return value
+    return "?"
+
+
+def _is_path(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith("$")
+
+
+def shape_of(command_name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+    """Forma normalizada de un comando, sin literales."""
+    arguments = SHAPE_ARGUMENTS.get(command_name, ())
+    shape = {name: normalize_shape(command[name], name in STRUCTURAL_KEYS) for name in arguments if name in command}
+    # En update/delete la forma está en cada sentencia del lote
+    for name in ("updates", "deletes"):
+        if name in shape and isinstance(command[name], list) and command[name]:
+            statement = command[name][0]
+            shape[name] = {"q": normalize_shape(statement.get("q", {}))}
+    return shape
+
+
+def shape_hash(collection: str, command_name: str, shape: Dict[str, Any]) -> str:
+    """Identificador estable de una forma de consulta."""
+    payload = json.dumps([collection, command_name, shape], sort_keys=False, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def summarize_explain(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """Extrae del resultado de `explain` las etapas del plan ganador y los documentos e índices revisados."""
+    stages: List[str] = []
+    stats = {"docsExamined": 0, "keysExamined": 0, "nReturned": None}
+
+    def walk_plan(plan: Any):
+        if isinstance(plan, dict):
+            if "stage" in plan:
+                stage = plan["stage"]
+                if plan.get("indexName"):
+                    stage = f"{stage}({plan['indexName']})"
+                stages.append(stage)
+            for key in ("queryPlan", "inputStage", "inputStages", "winningPlan"):
+                if key in plan:
+                    walk_plan(plan[key])
+        elif isinstance(plan, list):
+            for item in plan:
+                walk_plan(item)
+
+    def walk(node: Any):
+        if isinstance(node, dict):
+            if "winningPlan" in node:
+                walk_plan(node["winningPlan"])
+            execution = node.get("executionStats")
+            if isinstance(execution, dict):
+                stats["docsExamined"] += execution.get("totalDocsExamined", 0)
+                stats["keysExamined"] += execution.get("totalKeysExamined", 0)
+                if stats["nReturned"] is None:
+                    stats["nReturned"] = execution.get("nReturned")
+            for key, item in node.items():
+                if key not in ("winningPlan", "executionStats"):
+                    walk(item)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    walk(explain)
+    return {"planSummary": " <- ".join(stages) or None, **stats}
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    """Registra las operaciones de MongoDB que superan un umbral de duración.
+
+    Los callbacks corren en el hilo del driver, así que solo encolan el
+    registro; un task del event loop lo escribe (y a veces lo explica) después.
+    """
+
+    def __init__(self, threshold_ms: float):
+        self.threshold_micros = threshold_ms * 1000
+        self._started: Dict[Tuple[int, Any], Tuple[str, Dict[str, Any], Optional[str]]] = {}
+        self.pending: Deque[Dict[str, Any]] = deque(maxlen=PENDING_LIMIT)
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if event.command_name not in TRACKED_COMMANDS:
+            return
+        collection = event.command.get("collection" if event.command_name == "getMore" else event.command_name)
+        # Las escrituras del propio registro no se registran
+        if collection == SLOW_QUERY_COLLECTION or not isinstance(collection, str):
+            return
+        self._started[(event.request_id, event.connection_id)] = (event.database_name, event.command, current_route())
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finish(event, None)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finish(event, str(event.failure.get("errmsg", "")) if isinstance(event.failure, dict) else "error")
+
+    def _finish(self, event, error: Optional[str]):
+        started = self._started.pop((event.request_id, event.connection_id), None)
+        if started is None or event.duration_micros < self.threshold_micros:
+            return
+
+        database, command, route = started
+        command_name = event.command_name
+        collection = command.get("collection" if command_name == "getMore" else command_name)
+        shape = shape_of(command_name, command)
+        self.pending.append({
+            "at": datetime.now(),
+            "database": database,
+            "collection": collection,
+            "command": command_name,
+            # Como texto: las formas tienen claves con "$" y "." que no conviene guardar como campos
+            "shape": json.dumps(shape, default=str),
+            "shapeHash": shape_hash(collection, command_name, shape),
+            "durationMs": round(event.duration_micros / 1000, 1),
+            "route": route,
+            "error": error,
+            # Se guarda solo para poder explicarla; no se persiste
+            "_command": command if command_name in EXPLAINABLE_COMMANDS else None
+        })
+
+
+class SlowQueryLog:
+    """Escribe los registros de consultas lentas en la colección capped y muestrea sus planes."""
+
+    def __init__(self, client: AsyncIOMotorClient, collection: AsyncIOMotorCollection, listener: SlowQueryListener,
+                 explain_rate: float):
+        self.client = client
+        self.collection = collection
+        self.listener = listener
+        self.explain_rate = explain_rate
+        self._explained = TTLCache(ttl_seconds=EXPLAIN_COOLDOWN_SECONDS, max_entries=4096)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(FLUSH_SECONDS)
+            try:
+                await self.flush()
+            except PyMongoError as e:
+                print(f"Registro de consultas lentas: error al escribir: {e}")
+
+    async def flush(self):
+        """Escribe los registros pendientes, explicando una muestra de ellos."""
+        records = []
+        while self.listener.pending:
+            record = self.listener.pending.popleft()
+            command = record.pop("_command")
+            if command is not None and self._should_explain(record["shapeHash"]):
+                record.update(await self._explain(record["database"], record["command"], command))
+            records.append(record)
+
+        if records:
+            await self.collection.insert_many(records, ordered=False)
+
+    def _should_explain(self, shape: str) -> bool:
+        if self._explained.get(shape) or random.random() >= self.explain_rate:
+            return False
+        self._explained.set(shape, True)
+        return True
+
+    async def _explain(self, database: str, command_name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+        arguments = {name: command[name] for name in EXPLAINABLE_COMMANDS[command_name] if name in command}
+        # Un pipeline que escribe no se explica con executionStats
+        if command_name == "aggregate" and any("$out" in stage or "$merge" in stage for stage in arguments.get("pipeline", [])):
+            return {}
+        explained = {command_name: command[command_name], **arguments}
+        if command_name == "aggregate":
+            explained["cursor"] = {}
+        try:
+            result = await self.client[database].command({"explain": explained, "verbosity": "executionStats"})
+        except PyMongoError as e:
+            return {"explainError": str(e)}
+        return {"explained": True, **summarize_explain(result)}
+
+
+_listener: Optional[SlowQueryListener] = None
+_log: Optional[SlowQueryLog] = None
+
+
+def slow_query_threshold_ms() -> float:
+    """Umbral en milisegundos (SLOW_QUERY_MS, 100 por defecto; 0 desactiva el registro)."""
+    return float(os.getenv("SLOW_QUERY_MS", "100"))
+
+
+def get_slow_query_listeners() -> list:
+    """Listener de consultas lentas para el cliente compartido, o ninguno si está desactivado."""
+    global _listener
+    if slow_query_threshold_ms() <= 0:
+        return []
+    if _listener is None:
+        _listener = SlowQueryListener(slow_query_threshold_ms())
+    return [_listener]
+
+
+async def ensure_slow_query_collection(db) -> AsyncIOMotorCollection:
+    """Crea la colección capped del registro si no existe."""
+    if SLOW_QUERY_COLLECTION not in await db.list_collection_names(filter={"name": SLOW_QUERY_COLLECTION}):
+        try:
+            await db.create_collection(SLOW_QUERY_COLLECTION, capped=True, size=SLOW_QUERY_COLLECTION_BYTES)
+        except CollectionInvalid:
+            # Otro worker la creó al mismo tiempo
+            pass
+    return db[SLOW_QUERY_COLLECTION]
+
+
+async def start_slow_query_log(client: AsyncIOMotorClient, db):
+    """Inicia la escritura periódica del registro en este worker."""
+    global _log
+    if _listener is None or _log is not None:
+        return
+    collection = await ensure_slow_query_collection(db)
+    _log = SlowQueryLog(client, collection, _listener, float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "0.1")))
+    _log.start()
+
+
+async def stop_slow_query_log():
+    """Detiene la escritura del registro, guardando lo pendiente."""
+    global _log
+    if _log is not None:
+        await _log.stop()
+        _log = None
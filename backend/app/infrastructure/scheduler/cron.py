@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+from typing import List, Set, Tuple
+
+# (mínimo, máximo) de cada campo: minuto, hora, día del mes, mes, día de la semana
+FIELD_RANGES: List[Tuple[int, int]] = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+}
+
+# Límite de búsqueda del próximo disparo (p. ej. "0 0 31 2 *" nunca ocurre)
+MAX_SEARCH_DAYS = 366 * 5
+
+
+class CronExpression:
+    """Expresión cron de cinco campos (minuto hora día-del-mes mes día-de-la-semana).
+
+    Admite `*`, listas (`1,15`), rangos (`1-5`), pasos (`*/10`, `8-18/2`) y los
+    alias `@hourly`, `@daily`, `@weekly` y `@monthly`. El domingo es 0 (también
+    se acepta 7). Como en cron, si se restringen el día del mes y el día de la
+    semana basta con que se cumpla uno de los dos.
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        fields = ALIASES.get(self.expression, self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"La expresión cron debe tener 5 campos: {expression!r}")
+
+        parsed = [_parse_field(field, low, high) for field, (low, high) in zip(fields, FIELD_RANGES)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        # 7 es otra forma de escribir el domingo
+        self.weekdays = {day % 7 for day in weekdays}
+        self.day_restricted = fields[2] != "*"
+        self.weekday_restricted = fields[4] != "*"
+
+    def __str__(self) -> str:
+        return self.expression
+
+    def _day_matches(self, moment: datetime) -> bool:
+        # datetime.weekday() cuenta desde el lunes; cron, desde el domingo
+        in_days = moment.day in self.days
+        in_weekdays = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.day_restricted and self.weekday_restricted:
+            return in_days or in_weekdays
+        return in_days and in_weekdays
+
+    def next_after(self, moment: datetime) -> datetime:
+        """Próximo instante (al minuto) estrictamente posterior a `moment` que cumple la expresión."""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=MAX_SEARCH_DAYS)
+
+        while candidate < limit:
+            if candidate.month not in self.months:
+                # Saltar al primer minuto del mes siguiente
+                year, month = (candidate.year + 1, 1) if candidate.month == 12 else (candidate.year, candidate.month + 1)
+                candidate = candidate.replace(year=year, month=month, day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+                continue
+            if candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+                continue
+            return candidate
+
+        raise ValueError(f"La expresión cron no tiene próximas ejecuciones: {self.expression!r}")
+
+
+def _parse_field(field: str, low: int, high: int) -> Set[int]:
+    values: Set[int] = set()
+    # El día de la semana admite 7 como domingo
+    upper = 7 if (low, high) == (0, 6) else high
+
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f"Paso inválido en el campo cron {field!r}")
+
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = int(part)
+            # "5/15" significa desde 5 hasta el final con paso 15
+            end = high if step > 1 else start
+
+        if start < low or end > upper or start > end:
+            raise ValueError(f"Valor fuera de rango en el campo cron {field!r}")
+        values.update(range(start, end + 1, step))
+
+    return values
@@ -0,0 +1,48 @@
+import os
+from datetime import datetime, time, timedelta
+
+from app.domain.services.expense_sync import sync_retention_days
+from app.infrastructure.database.mongodb import Database
+from app.infrastructure.external.fx_service import get_fx_service
+from app.infrastructure.scheduler.scheduler import JobScheduler
+
+
+def register_default_jobs(scheduler: JobScheduler, database: Database):
+    """Registra las tareas periódicas de mantenimiento de la API.
+
+    La reconstrucción de los contadores de presupuesto no se programa: pierde
+    las escrituras concurrentes, así que se ejecuta a mano con `scripts.rebuild_budgets`.
+    """
+
+    @scheduler.cron("backfill_search", "0 4 * * *", max_runtime_seconds=1800, jitter_seconds=300)
+    async def backfill_search():
+        # Gastos escritos fuera de la API (importaciones, scripts) sin términos de búsqueda
+        updated = await database.get_expense_repository().rebuild_search_fields(only_missing=True)
+        return {"updated": updated}
+
+    @scheduler.cron("backfill_updated_at", "5 4 * * *", max_runtime_seconds=1800, jitter_seconds=300)
+    async def backfill_updated_at():
+        # Gastos escritos fuera de la API sin `updatedAt`, que la sincronización y el archivo no verían
+        updated = await database.get_expense_repository().backfill_updated_at()
+        return {"updated": updated}
+
+    @scheduler.cron("backfill_company_amounts", "15 4 * * *", max_runtime_seconds=1800, jitter_seconds=300)
+    async def backfill_company_amounts():
+        # Gastos sin monto en moneda de la empresa
+        companies = database.get_collection("companies").find({}, {"settings.currency": 1})
+        currency_by_company = {c["_id"]: (c.get("settings") or {}).get("currency") async for c in companies}
+        return await database.get_expense_repository().backfill_company_amounts(currency_by_company, get_fx_service())
+
+    archive_after_days = int(os.getenv("EXPENSE_ARCHIVE_AFTER_DAYS", "400"))
+    if archive_after_days > 0:
+        @scheduler.cron("archive_expenses", "45 4 * * *", max_runtime_seconds=3600, jitter_seconds=300)
+        async def archive_expenses():
+            # Gastos cerrados más antiguos que el plazo pasan al archivo; el corte se redondea al día
+            cutoff = datetime.combine(datetime.now().date() - timedelta(days=archive_after_days), time.min)
+            return await database.get_expense_repository().archive_older_than(
+                cutoff,
+                batch_size=int(os.getenv("EXPENSE_ARCHIVE_BATCH_SIZE", "500")),
+                pause_seconds=float(os.getenv("EXPENSE_ARCHIVE_PAUSE_SECONDS", "0.5")),
+                # Lo modificado dentro de la retención de la sincronización se queda en la colección activa
+                updated_before=datetime.now() - timedelta(days=sync_retention_days())
+            )
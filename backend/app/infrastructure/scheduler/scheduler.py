@@ -0,0 +1,225 @@
+import asyncio
+import os
+import random
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Callable, Awaitable, Set
+
+from pymongo.errors import PyMongoError
+
+from app.domain.repositories.job_repository import JobRepository
+from app.infrastructure.scheduler.cron import CronExpression
+
+# Segundos máximos entre revisiones de tareas vencidas
+POLL_SECONDS = 30
+# Margen del lease sobre el tiempo máximo de ejecución, para que otro worker no la retome antes de cancelarla
+LEASE_GRACE_SECONDS = 30
+# Tareas que un mismo worker ejecuta en paralelo
+DEFAULT_MAX_CONCURRENCY = 2
+
+JobFunc = Callable[[], Awaitable[Any]]
+
+
+class IntervalTrigger:
+    """Dispara cada cierta cantidad de segundos."""
+
+    def __init__(self, seconds: float):
+        if seconds <= 0:
+            raise ValueError("El intervalo debe ser positivo")
+        self.seconds = seconds
+
+    def __str__(self) -> str:
+        return f"every {self.seconds:g}s"
+
+    def next_after(self, moment: datetime) -> datetime:
+        return moment + timedelta(seconds=self.seconds)
+
+
+class CronTrigger:
+    """Dispara según una expresión cron evaluada en la hora local del servidor."""
+
+    def __init__(self, expression: str):
+        self.cron = CronExpression(expression)
+
+    def __str__(self) -> str:
+        return f"cron {self.cron}"
+
+    def next_after(self, moment: datetime) -> datetime:
+        return self.cron.next_after(moment)
+
+
+class ScheduledJob:
+    """Tarea registrada en el scheduler."""
+
+    def __init__(self, name: str, func: JobFunc, trigger, max_runtime_seconds: float = 600,
+                 jitter_seconds: float = 0):
+        self.name = name
+        self.func = func
+        self.trigger = trigger
+        self.max_runtime_seconds = max_runtime_seconds
+        self.jitter_seconds = jitter_seconds
+
+    def next_run_after(self, moment: datetime) -> datetime:
+        """Próxima ejecución, desplazada al azar para que las tareas no partan todas juntas."""
+        next_run = self.trigger.next_after(moment)
+        if self.jitter_seconds:
+            next_run += timedelta(seconds=random.uniform(0, self.jitter_seconds))
+        return next_run
+
+
+class JobScheduler:
+    """Scheduler de tareas periódicas dentro del proceso de la API.
+
+    Cada worker revisa las tareas vencidas, pero solo la ejecuta quien toma su
+    lease en MongoDB (ver `JobRepository.acquire`), así que con N workers de
+    uvicorn cada ejecución ocurre una vez. El lease dura el tiempo máximo de la
+    tarea más un margen: si el worker muere, otro la retoma al vencer.
+    """
+
+    def __init__(self, repository: JobRepository, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 worker_id: str = None):
+        self.repository = repository
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+
+    def add_job(self, name: str, func: JobFunc, trigger, max_runtime_seconds: float = 600,
+                jitter_seconds: float = 0) -> ScheduledJob:
+        """Registra una tarea. Debe llamarse antes de `start`."""
+        job = ScheduledJob(name, func, trigger, max_runtime_seconds, jitter_seconds)
+        self.jobs[name] = job
+        return job
+
+    def interval(self, name: str, seconds: float, **options):
+        """Decorador para registrar una tarea que corre cada `seconds` segundos."""
+        def decorator(func: JobFunc) -> JobFunc:
+            self.add_job(name, func, IntervalTrigger(seconds), **options)
+            return func
+        return decorator
+
+    def cron(self, name: str, expression: str, **options):
+        """Decorador para registrar una tarea con una expresión cron."""
+        def decorator(func: JobFunc) -> JobFunc:
+            self.add_job(name, func, CronTrigger(expression), **options)
+            return func
+        return decorator
+
+    async def start(self):
+        """Registra las tareas en MongoDB e inicia el ciclo del scheduler."""
+        now = datetime.now()
+        for job in self.jobs.values():
+            await self.repository.ensure_job(job.name, str(job.trigger), job.next_run_after(now))
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Detiene el ciclo y cancela las tareas en curso; sus leases vencen solos."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._running):
+            task.cancel()
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    async def run_now(self, name: str) -> Dict[str, Any]:
+        """Ejecuta una tarea fuera de su programación, sin lease (p. ej. desde un script)."""
+        return await self._execute(self.jobs[name])
+
+    async def _loop(self):
+        while True:
+            try:
+                await self._dispatch_due()
+                next_due = await self.repository.next_due()
+            except PyMongoError as e:
+                print(f"Scheduler: error al revisar tareas: {e}")
+                next_due = None
+
+            delay = POLL_SECONDS
+            if next_due:
+                delay = min(max((next_due - datetime.now()).total_seconds(), 1), POLL_SECONDS)
+            # Los workers revisan en momentos distintos para no competir por el mismo lease
+            delay += random.uniform(0, 1)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _dispatch_due(self):
+        for job in self.jobs.values():
+            if self._semaphore.locked():
+                # Sin cupo en este worker: otro puede tomar la tarea
+                return
+            now = datetime.now()
+            lease_seconds = job.max_runtime_seconds + LEASE_GRACE_SECONDS
+            acquired = await self.repository.acquire(job.name, self.worker_id, now, lease_seconds,
+                                                     job.next_run_after(now))
+            if acquired:
+                await self._semaphore.acquire()
+                task = asyncio.create_task(self._run_leased(job))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+    async def _run_leased(self, job: ScheduledJob):
+        try:
+            run = await self._execute(job)
+            await self.repository.release(job.name, self.worker_id, run)
+        except PyMongoError as e:
+            print(f"Scheduler: no se pudo registrar la ejecución de {job.name}: {e}")
+        finally:
+            self._semaphore.release()
+            # Otra tarea puede haber quedado esperando cupo
+            self._wakeup.set()
+
+    async def _execute(self, job: ScheduledJob) -> Dict[str, Any]:
+        started_at = datetime.now()
+        started = time.perf_counter()
+        run = {"job": job.name, "worker": self.worker_id, "startedAt": started_at, "status": "success",
+               "error": None, "result": None}
+
+        try:
+            result = await asyncio.wait_for(job.func(), timeout=job.max_runtime_seconds)
+            run["result"] = result if isinstance(result, (dict, int, float, str)) else None
+        except asyncio.TimeoutError:
+            run["status"] = "timeout"
+            run["error"] = f"Superó el tiempo máximo de {job.max_runtime_seconds:g}s"
+        except asyncio.CancelledError:
+            run["status"] = "cancelled"
+            raise
+        except Exception as e:
+            run["status"] = "failed"
+            run["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            run["finishedAt"] = datetime.now()
+            run["durationMs"] = round((time.perf_counter() - started) * 1000, 1)
+            if run["status"] != "cancelled":
+                await self.repository.record_run(run)
+
+        return run
+
+
+_scheduler: Optional[JobScheduler] = None
+
+
+def get_scheduler(repository: JobRepository) -> JobScheduler:
+    """Devuelve el scheduler del worker, creándolo en el primer uso."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = JobScheduler(repository)
+    return _scheduler
+
+
+async def stop_scheduler():
+    """Detiene el scheduler del worker si fue iniciado."""
+    global _scheduler
+    if _scheduler is not None:
+        await _scheduler.stop()
+        _scheduler = None
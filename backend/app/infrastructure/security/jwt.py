@@ -6,6 +6,8 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import ValidationError
 
+from app.infrastructure.monitoring.request_context import current_actor
+
 # Configuración OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
@@ -43,7 +45,10 @@ def decode_access_token(token: str) -> Dict[str, Any]:
 
 
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any]:
-    """Obtiene el usuario actual a partir del token JWT."""
+    """Obtiene el usuario actual a partir del token JWT.
+    
+    También lo deja como autor de las modificaciones de la solicitud, para la auditoría.
+    """
     try:
         payload = decode_access_token(token)
         user_id: str = payload.get("sub")
@@ -53,6 +58,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any
                 detail="Token inválido",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        current_actor.set(payload)
         return payload
     except (jwt.JWTError, ValidationError):
         raise HTTPException(
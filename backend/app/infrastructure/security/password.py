@@ -1,14 +1,23 @@
-from passlib.context import CryptContext
+_pwd_context = None
 
-# Configuración del contexto de encriptación para contraseñas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+def get_pwd_context():
+    """Contexto de encriptación para contraseñas, creado con el primer uso.
+
+    passlib se importa recién aquí para no sumar su carga al arranque del worker.
+    """
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifica que una contraseña coincida con su hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
     """Genera un hash para una contraseña."""
-    return pwd_context.hash(password)
\ No newline at end of file
+    return get_pwd_context().hash(password)
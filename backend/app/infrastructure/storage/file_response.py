@@ -0,0 +1,118 @@
+import os
+from typing import Optional, Tuple, Mapping
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+CHUNK_SIZE = 256 * 1024
+
+# Extensión ASGI con la que el servidor envía un archivo sin copiarlo al proceso (sendfile)
+ZERO_COPY_EXTENSION = "http.response.zerocopysend"
+
+
+class RangeNotSatisfiable(Exception):
+    """El rango pedido está fuera del archivo."""
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Interpreta un encabezado `Range` de un solo rango. Devuelve (inicio, fin inclusivo) o `None`.
+
+    Varios rangos o una sintaxis desconocida se ignoran (se responde el archivo
+    completo, como permite el RFC 9110); un rango fuera del archivo lanza
+    `RangeNotSatisfiable`.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            # Sufijo: los últimos N bytes
+            start, end = max(size - int(end_text), 0), size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end or start < 0:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+class RangeFileResponse(Response):
+    """Respuesta de archivo con soporte de `Range`, `If-Range` y `If-None-Match`.
+
+    Si el servidor ASGI ofrece la extensión `http.response.zerocopysend`, el
+    archivo se envía con sendfile; si no, en bloques leídos sin bloquear el event loop.
+    """
+
+    def __init__(self, path: str, media_type: str, etag: str, request_headers: Mapping[str, str],
+                 headers: Mapping[str, str] = None, method: str = "GET"):
+        self.path = path
+        self.media_type = media_type
+        self.send_body = method != "HEAD"
+        self.background = None
+        self.body = b""
+        size = os.stat(path).st_size
+        self.offset, self.length = 0, size
+
+        response_headers = {"etag": etag, "accept-ranges": "bytes", **(headers or {})}
+        if_none_match = _etags(request_headers.get("if-none-match"))
+        if etag in if_none_match or "*" in if_none_match:
+            self.status_code = 304
+            self.send_body = False
+            self.init_headers(response_headers)
+            return
+
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        # Un rango condicionado a otra versión del archivo se ignora
+        if if_range and if_range != etag:
+            range_header = None
+
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            self.status_code = 416
+            self.send_body = False
+            self.length = 0
+            self.init_headers({**response_headers, "content-range": f"bytes */{size}", "content-length": "0"})
+            return
+
+        self.status_code = 200
+        if byte_range:
+            start, end = byte_range
+            self.status_code = 206
+            self.offset, self.length = start, end - start + 1
+            response_headers["content-range"] = f"bytes {start}-{end}/{size}"
+        response_headers["content-length"] = str(self.length)
+        self.init_headers(response_headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or self.length == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if ZERO_COPY_EXTENSION in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send({"type": ZERO_COPY_EXTENSION, "file": f, "offset": self.offset, "count": self.length})
+            return
+
+        remaining = self.length
+        async with await anyio.open_file(self.path, mode="rb") as f:
+            await f.seek(self.offset)
+            while remaining > 0:
+                chunk = await f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _etags(header: Optional[str]) -> set:
+    if not header:
+        return set()
+    return {tag.strip().removeprefix("W/") for tag in header.split(",")}
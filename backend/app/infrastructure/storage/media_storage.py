@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# Tipos de archivo aceptados como boleta y la extensión con la que se guardan
+RECEIPT_CONTENT_TYPES = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "application/pdf": "pdf",
+}
+MAX_RECEIPT_BYTES = 10 * 1024 * 1024
+
+# Anchos y formatos de las variantes: un conjunto acotado mantiene la caché acotada
+VARIANT_WIDTHS = (160, 320, 640, 1280)
+VARIANT_FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+VARIANT_QUALITY = 80
+
+DEFAULT_VARIANT_CACHE_BYTES = 512 * 1024 * 1024
+
+# Formato que Pillow debe reconocer en cada tipo de imagen declarado
+IMAGE_FORMATS = {"image/jpeg": "JPEG", "image/png": "PNG", "image/webp": "WEBP"}
+
+
+class InvalidImageError(ValueError):
+    """El archivo no es una imagen válida del tipo declarado."""
+
+
+class ImageTooLargeError(ValueError):
+    """La imagen supera el máximo de píxeles que se procesan (posible bomba de descompresión)."""
+
+
+class DiskLRUCache:
+    """Caché de archivos en disco con desalojo LRU por tamaño total.
+
+    El orden de uso se lleva en memoria y se inicializa con la fecha de acceso
+    de los archivos existentes. Varios workers pueden compartir el directorio:
+    cada uno desaloja según lo que conoce, y un archivo borrado por otro worker
+    se trata como ausente.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.startswith("."):
+                    stat = entry.stat()
+                    files.append((stat.st_atime, entry.name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self.total_bytes += size
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def get(self, name: str) -> Optional[str]:
+        """Ruta del archivo si está en la caché, marcándolo como usado."""
+        path = self.path(name)
+        with self._lock:
+            if name not in self._entries:
+                return None
+            if not os.path.exists(path):
+                self.total_bytes -= self._entries.pop(name)
+                return None
+            self._entries.move_to_end(name)
+        return path
+
+    def put(self, name: str, data: bytes) -> str:
+        """Guarda el archivo de forma atómica y desaloja los menos usados si se supera el máximo."""
+        path = self.path(name)
+        _write_atomic(path, data)
+        with self._lock:
+            self.total_bytes += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                oldest, size = self._entries.popitem(last=False)
+                self.total_bytes -= size
+                try:
+                    os.remove(self.path(oldest))
+                except FileNotFoundError:
+                    pass
+        return path
+
+
+def _write_atomic(path: str, data: bytes):
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def validate_receipt(data: bytes, content_type: str):
+    """Comprueba que el contenido corresponde al tipo declarado; lanza `InvalidImageError` o `ImageTooLargeError`.
+
+    Las imágenes se verifican con Pillow (que se importa aquí para no cargarlo
+    al iniciar el worker); de los PDF solo se revisa la firma.
+    """
+    if content_type == "application/pdf":
+        if not data.startswith(b"%PDF-"):
+            raise InvalidImageError("El archivo no es un PDF")
+        return
+
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if image.format != IMAGE_FORMATS[content_type]:
+                raise InvalidImageError(f"El archivo no es {content_type}")
+            image.verify()
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e)) from e
+    except (UnidentifiedImageError, OSError, SyntaxError) as e:
+        raise InvalidImageError(str(e)) from e
+
+
+def render_variant(original_path: str, width: int, image_format: str) -> bytes:
+    """Redimensiona una imagen al ancho indicado (sin agrandarla) y la codifica en el formato pedido.
+
+    Pillow se importa aquí para no cargarlo al iniciar el worker. Un original
+    que no se puede leer lanza `InvalidImageError`, y uno demasiado grande `ImageTooLargeError`.
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        return _render_variant(original_path, width, image_format)
+    except FileNotFoundError:
+        raise
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e)) from e
+    except (UnidentifiedImageError, OSError, SyntaxError) as e:
+        raise InvalidImageError(str(e)) from e
+
+
+def _render_variant(original_path: str, width: int, image_format: str) -> bytes:
+    from PIL import Image, ImageOps
+
+    with Image.open(original_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            image.thumbnail((width, round(image.height * width / image.width)), Image.LANCZOS)
+        if image_format == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        options = {"quality": VARIANT_QUALITY} if image_format in ("jpeg", "webp") else {"optimize": True}
+        image.save(buffer, format=image_format.upper(), **options)
+        return buffer.getvalue()
+
+
+class MediaStorage:
+    """Originales de boletas direccionados por contenido y caché de sus variantes.
+
+    Un original se guarda una sola vez bajo su hash SHA-256, por lo que su URL
+    nunca cambia de contenido y se puede cachear como inmutable.
+    """
+
+    def __init__(self, root: str, variant_cache_bytes: int = DEFAULT_VARIANT_CACHE_BYTES):
+        self.originals_dir = os.path.join(root, "receipts")
+        self.variants = DiskLRUCache(os.path.join(root, "variants"), variant_cache_bytes)
+        os.makedirs(self.originals_dir, exist_ok=True)
+        # Variantes que se están generando: solicitudes simultáneas esperan la misma
+        self._rendering: Dict[str, asyncio.Future] = {}
+
+    def original_path(self, digest: str, extension: str) -> str:
+        # Dos niveles de subdirectorios para no acumular todo en una sola carpeta
+        return os.path.join(self.originals_dir, digest[:2], digest[2:4], f"{digest}.{extension}")
+
+    def save_original(self, data: bytes, content_type: str) -> Tuple[str, str]:
+        """Guarda el original si no existe. Devuelve su hash y su ruta."""
+        digest = content_hash(data)
+        path = self.original_path(digest, RECEIPT_CONTENT_TYPES[content_type])
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _write_atomic(path, data)
+        return digest, path
+
+    @staticmethod
+    def variant_name(digest: str, width: int, image_format: str) -> str:
+        return f"{digest}_{width}.{image_format}"
+
+    async def get_variant(self, original_path: str, digest: str, width: int, image_format: str) -> str:
+        """Ruta de la variante, generándola en un hilo y guardándola en la caché si no estaba."""
+        name = self.variant_name(digest, width, image_format)
+        path = self.variants.get(name)
+        if path is not None:
+            return path
+
+        pending = self._rendering.get(name)
+        if pending is None:
+            pending = asyncio.ensure_future(asyncio.to_thread(self._render, original_path, name, width, image_format))
+            self._rendering[name] = pending
+            pending.add_done_callback(lambda _: self._rendering.pop(name, None))
+        return await asyncio.shield(pending)
+
+    def _render(self, original_path: str, name: str, width: int, image_format: str) -> str:
+        return self.variants.put(name, render_variant(original_path, width, image_format))
+
+
+_storage: Optional[MediaStorage] = None
+
+
+def get_media_storage() -> MediaStorage:
+    """Almacenamiento de boletas del worker (MEDIA_ROOT, "media" por defecto; MEDIA_CACHE_MB para las variantes)."""
+    global _storage
+    if _storage is None:
+        cache_bytes = int(os.getenv("MEDIA_CACHE_MB", DEFAULT_VARIANT_CACHE_BYTES // (1024 * 1024))) * 1024 * 1024
+        _storage = MediaStorage(os.getenv("MEDIA_ROOT", "media"), cache_bytes)
+    return _storage
@@ -1,10 +1,26 @@
+import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from motor.motor_asyncio import AsyncIOMotorClient
+from fastapi.encoders import ENCODERS_BY_TYPE
+from bson import ObjectId
 
 # Importar routers
-from app.presentation.routers import auth, users, companies, expenses
+from app.presentation.routers import auth, users, companies, expenses, admin, media
+from app.infrastructure.database.mongodb import Database
+from app.infrastructure.database.write_behind import stop_write_behind_buffers
+from app.infrastructure.audit.audit_log import start_audit_log, stop_audit_log, AUDIT_COLLECTION
+from app.infrastructure.events.expense_stream import stop_expense_broker
+from app.infrastructure.cache.invalidation import start_invalidation_bus, stop_invalidation_bus, INVALIDATION_COLLECTION
+from app.infrastructure.scheduler.scheduler import get_scheduler, stop_scheduler
+from app.infrastructure.scheduler.jobs import register_default_jobs
+from app.infrastructure.external.fx_service import get_fx_service
+from app.infrastructure.monitoring.request_context import RequestContextMiddleware
+from app.infrastructure.http.compression import CompressionMiddleware, compression_enabled, compression_options
+from app.infrastructure.monitoring.slow_queries import start_slow_query_log, stop_slow_query_log
+from app.infrastructure.monitoring.metrics import (
+    MetricsMiddleware, metrics_enabled, metrics_response, start_loop_lag_monitor, stop_loop_lag_monitor
+)
 
 # Crear la aplicación FastAPI
 app = FastAPI(
@@ -13,6 +29,9 @@ app = FastAPI(
     version="0.1.0"
 )
 
+# Serializar ObjectId como texto en las respuestas que devuelven documentos de MongoDB
+ENCODERS_BY_TYPE[ObjectId] = str
+
 # Configurar CORS
 origins = [
     "http://localhost",
@@ -28,26 +47,74 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compresión negociada (zstd, brotli, gzip) de respuestas JSON grandes
+if compression_enabled():
+    app.add_middleware(CompressionMiddleware, **compression_options())
+
+# Deja la solicitud en curso disponible para los listeners de MongoDB (ruta de las consultas lentas)
+app.add_middleware(RequestContextMiddleware)
+
+# Latencia por ruta y estado, expuesta en /metrics
+if metrics_enabled():
+    app.add_middleware(MetricsMiddleware)
+
 # Configurar MongoDB
 @app.on_event("startup")
 async def startup_db_client():
-    app.mongodb_client = AsyncIOMotorClient("mongodb://mongo:27017")
-    app.mongodb = app.mongodb_client.gastify
+    database = Database()
+    await database.connect()
+    await database.create_indexes()
+    app.mongodb_client = database.client
+    app.mongodb = database.db
     print("Conexión a MongoDB establecida")
+    # Carga las tasas de cambio al iniciar: si falta FX_RATES_FILE la advertencia queda en el log de arranque
+    get_fx_service()
+    
+    if metrics_enabled():
+        start_loop_lag_monitor()
+    await start_slow_query_log(database.client, database.db)
+    # Las modificaciones de gastos, empresas y usuarios se auditan en lotes
+    start_audit_log(database.get_collection(AUDIT_COLLECTION))
+    # Las cachés locales (p. ej. de empresas) se descartan cuando otro worker modifica la entidad
+    await start_invalidation_bus(database.get_collection(INVALIDATION_COLLECTION))
+    
+    # Tareas periódicas; con varios workers cada ejecución la toma uno solo
+    if os.getenv("SCHEDULER_ENABLED", "true").lower() != "false":
+        scheduler = get_scheduler(database.get_job_repository())
+        register_default_jobs(scheduler, database)
+        await scheduler.start()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    app.mongodb_client.close()
-    print("Conexión a MongoDB cerrada")
+    await stop_scheduler()
+    await stop_loop_lag_monitor()
+    await stop_slow_query_log()
+    await stop_expense_broker()
+    await stop_invalidation_bus()
+    # Escribe las actualizaciones diferidas (p. ej. último login) antes de cerrar la conexión
+    await stop_write_behind_buffers()
+    await stop_audit_log()
+    await Database().close()
 
 # Incluir routers
 app.include_router(auth.router, tags=["Autenticación"], prefix="/api/auth")
 app.include_router(users.router, tags=["Usuarios"], prefix="/api/users")
 app.include_router(companies.router, tags=["Empresas"], prefix="/api/companies")
 app.include_router(expenses.router, tags=["Gastos"], prefix="/api/expenses")
+app.include_router(admin.router, tags=["Administración"], prefix="/api/admin")
+app.include_router(media.router, tags=["Archivos"], prefix="/api/media")
+
+# Montar archivos estáticos; si el directorio no existe el worker arranca igual, sin /static
+STATIC_DIR = os.getenv("STATIC_DIR", "static")
+if os.path.isdir(STATIC_DIR):
+    app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+else:
+    print(f"Directorio de archivos estáticos no encontrado: {STATIC_DIR}; /static no se monta")
 
-# Montar archivos estáticos
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Métricas para Prometheus
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return metrics_response()
 
 # Ruta de inicio
 @app.get("/", tags=["Root"])
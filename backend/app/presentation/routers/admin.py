@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Path
+from typing import Dict, Any, Optional
+
+from app.domain.repositories.pagination import decode_cursor, next_cursor
+from app.infrastructure.database.mongodb import Database
+from app.infrastructure.security.jwt import get_current_user
+
+router = APIRouter()
+
+
+def require_admin(current_user: Dict[str, Any] = Depends(get_current_user)) -> Dict[str, Any]:
+    """Permite el acceso solo a administradores."""
+    if current_user.get("role") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tiene permisos de administrador"
+        )
+    return current_user
+
+@router.get("/jobs")
+async def get_jobs(
+    db: Database = Depends(lambda: Database()),
+    current_user: Dict[str, Any] = Depends(require_admin)
+):
+    """Lista las tareas programadas con su próxima ejecución, lease actual y duraciones."""
+    return await db.get_job_repository().find_jobs()
+
+@router.get("/jobs/runs")
+async def get_job_runs(
+    job: Optional[str] = None,
+    run_status: Optional[str] = Query(None, alias="status", pattern="^(success|failed|timeout)$"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    db: Database = Depends(lambda: Database()),
+    current_user: Dict[str, Any] = Depends(require_admin)
+):
+    """Lista las ejecuciones más recientes de las tareas programadas."""
+    runs = await db.get_job_repository().find_runs(job, run_status, skip, limit)
+    for run in runs:
+        run["_id"] = str(run["_id"])
+    return runs
+
+@router.get("/slow-queries/top")
+async def get_slow_query_top_offenders(
+    since_minutes: int = Query(60, ge=1, le=7 * 24 * 60),
+    collection: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: Database = Depends(lambda: Database()),
+    current_user: Dict[str, Any] = Depends(require_admin)
+):
+    """Formas de consulta que más tiempo consumieron en la ventana indicada.
+    
+    Cada una incluye cuántas veces fue lenta, duración total, promedio y máxima,
+    las rutas que la originaron y el último plan muestreado con `explain`.
+    """
+    since = datetime.now() - timedelta(minutes=since_minutes)
+    return await db.get_slow_query_repository().find_top_offenders(since, collection, limit)
+
+@router.get("/slow-queries")
+async def get_slow_queries(
+    shape: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Database = Depends(lambda: Database()),
+    current_user: Dict[str, Any] = Depends(require_admin)
+):
+    """Registros de consultas lentas más recientes, opcionalmente de una forma de consulta."""
+    return await db.get_slow_query_repository().find_recent(shape, limit)
+
+@router.get("/audit/{entity}/{entity_id}")
+async def get_audit_trail(
+    entity: str = Path(..., pattern="^(expense|company|user)$"),
+    entity_id: str = Path(...),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Database = Depends(lambda: Database()),
+    current_user: Dict[str, Any] = Depends(require_admin)
+):
+    """Historial de modificaciones de un gasto, empresa o usuario: quién, cuándo, acción y campos.
+    
+    La paginación es por cursor: cada respuesta incluye `nextCursor` para
+    pedir la página siguiente.
+    """
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        if not after:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor inválido"
+            )
+    
+    items = await db.get_audit_repository().find_by_entity(entity, entity_id, after, limit)
+    return {
+        "items": items,
+        "nextCursor": next_cursor(items, "at", limit)
+    }
@@ -1,12 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Dict, Any, Optional
+from typing import Dict, Any, Optional
 
 from app.domain.services.company_service import CompanyService
+from app.domain.services.expense_service import ExpenseService
+from app.domain.services.policy_engine import compile_policy, PolicyError
 from app.infrastructure.database.mongodb import Database
 from app.infrastructure.security.jwt import get_current_user
+from app.infrastructure.http.msgpack_format import MsgpackRoute
 from app.infrastructure.external.sii_service import SIIService
 
-router = APIRouter()
+router = APIRouter(route_class=MsgpackRoute)
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_company(
@@ -55,7 +58,7 @@ async def create_company(
     
     return new_company
 
-@router.get("/", response_model=List[Dict[str, Any]])
+@router.get("/")
 async def get_companies(
     skip: int = 0,
     limit: int = 100,
@@ -80,7 +83,7 @@ async def get_companies(
     # Obtener empresas activas
     return await company_service.get_active_companies(skip, limit)
 
-@router.get("/my-company", response_model=Dict[str, Any])
+@router.get("/my-company")
 async def get_my_company(
     db: Database = Depends(lambda: Database()),
     current_user: Dict[str, Any] = Depends(get_current_user)
@@ -108,7 +111,7 @@ async def get_my_company(
     
     return company
 
-@router.get("/{company_id}", response_model=Dict[str, Any])
+@router.get("/{company_id}")
 async def get_company(
     company_id: str,
     db: Database = Depends(lambda: Database()),
@@ -137,7 +140,7 @@ async def get_company(
     
     return company
 
-@router.put("/{company_id}", response_model=Dict[str, Any])
+@router.put("/{company_id}")
 async def update_company(
     company_id: str,
     company_data: Dict[str, Any],
@@ -188,7 +191,7 @@ async def update_company(
     
     return updated_company
 
-@router.put("/{company_id}/settings", response_model=Dict[str, Any])
+@router.put("/{company_id}/settings")
 async def update_company_settings(
     company_id: str,
     settings: Dict[str, Any],
@@ -206,6 +209,15 @@ async def update_company_settings(
             detail="No tiene permisos para actualizar la configuración de esta empresa"
         )
     
+    # Validar la política antes de guardarla
+    try:
+        compile_policy(settings)
+    except PolicyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
     # Inicializar servicios
     company_repository = db.get_company_repository()
     company_service = CompanyService(company_repository)
@@ -221,6 +233,66 @@ async def update_company_settings(
     
     return updated_company
 
+@router.post("/{company_id}/policy/evaluate")
+async def evaluate_company_policy(
+    company_id: str,
+    payload: Dict[str, Any],
+    db: Database = Depends(lambda: Database()),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Evalúa un lote de gastos contra la política de la empresa sin guardarlos.
+    
+    Recibe `{"expenses": [...], "role": "employee"}` y devuelve los errores de
+    cada gasto en el mismo orden, útil para validar importaciones masivas.
+    """
+    if current_user["role"] != "admin" and current_user.get("company_id") != company_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tiene permisos para evaluar la política de esta empresa"
+        )
+    
+    expenses = payload.get("expenses")
+    if not isinstance(expenses, list) or len(expenses) > 10000 or not all(isinstance(e, dict) for e in expenses):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Se requiere una lista 'expenses' de hasta 10000 gastos"
+        )
+    
+    # Las fechas llegan como texto en el JSON
+    from datetime import datetime
+    for expense in expenses:
+        if isinstance(expense.get("date"), str):
+            try:
+                expense["date"] = datetime.fromisoformat(expense["date"])
+            except ValueError:
+                pass
+    
+    # Inicializar servicios
+    company_service = CompanyService(db.get_company_repository())
+    expense_service = ExpenseService(db.get_expense_repository())
+    
+    company = await company_service.get_by_id(company_id)
+    
+    if not company:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Empresa no encontrada"
+        )
+    
+    try:
+        results = await expense_service.evaluate_policy_batch(company, expenses, payload.get("role"))
+    except PolicyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    return {
+        "evaluated": len(results),
+        "invalid": sum(1 for r in results if not r["is_valid"]),
+        "results": results
+    }
+
 @router.delete("/{company_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def deactivate_company(
     company_id: str,
@@ -248,7 +320,7 @@ async def deactivate_company(
             detail="Empresa no encontrada o no se pudo desactivar"
         )
 
-@router.post("/verify-sii", response_model=Dict[str, Any])
+@router.post("/verify-sii")
 async def verify_company_in_sii(
     rut: str,
     current_user: Dict[str, Any] = Depends(get_current_user)
@@ -1,54 +1,237 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Dict, Any, Optional
+import asyncio
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Header, UploadFile, File
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, Optional
 
 from app.domain.services.expense_service import ExpenseService
-from app.domain.repositories.expense_repository import ExpenseRepository
+from app.domain.services.company_service import CompanyService
+from app.domain.services.user_loader import UserLoader, expand_user_references, parse_expand
+from app.domain.services.expense_sync import (
+    sync_expenses, InvalidSyncToken, SyncTokenExpired, DEFAULT_SYNC_PAGE_SIZE, MAX_SYNC_PAGE_SIZE
+)
 from app.domain.entities.expense import ExpenseCreate, ExpenseUpdate, Expense
+from app.domain.repositories.pagination import decode_cursor, encode_cursor, next_cursor
+from app.application.use_cases.expense_use_case import ExpenseUseCase
+from app.application.dto.expense_dto import ApprovalBatchRequestDTO, ApprovalBatchResponseDTO
 from app.infrastructure.database.mongodb import Database
+from app.infrastructure.external.fx_service import FXRateNotFound
 from app.infrastructure.security.jwt import get_current_user
+from app.infrastructure.http.msgpack_format import MsgpackRoute
+from app.infrastructure.cache.idempotency import idempotent_response, request_fingerprint
+from app.infrastructure.events.expense_stream import get_expense_broker, format_sse, HEARTBEAT_SECONDS
 
-router = APIRouter()
+router = APIRouter(route_class=MsgpackRoute)
+
+# `expand=user,approvers`: incluye el dueño y los aprobadores de cada gasto resueltos en una consulta
+EXPAND_PATTERN = "^(user|approvers)(,(user|approvers))*$"
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_expense(
     expense_data: ExpenseCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
     db: Database = Depends(lambda: Database()),
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
-    """Crea un nuevo gasto asociado al usuario actual."""
-    repository = ExpenseRepository(db)
-    service = ExpenseService(repository)
+    """Crea un nuevo gasto asociado al usuario actual.
     
-    # Asegurar que el gasto está asociado al usuario actual
-    expense_data_dict = expense_data.dict()
-    expense_data_dict["userId"] = current_user["_id"]
+    El gasto se valida contra la política y los presupuestos mensuales de la empresa.
+    Con `Idempotency-Key`, un reintento recibe la respuesta original sin crear otro gasto.
+    """
+    expense_use_case = ExpenseUseCase(
+        ExpenseService(db.get_expense_repository()),
+        CompanyService(db.get_company_repository())
+    )
+    data = expense_data.dict()
     
-    result = await service.create(expense_data_dict)
-    return result
+    async def create():
+        # Asegurar que el gasto está asociado al usuario actual
+        result = await expense_use_case.create_expense(data, current_user["sub"], current_user.get("role"))
+        
+        if not result["success"]:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=result["errors"]
+            )
+        
+        return result["data"]
+    
+    # Solo lo que envió el cliente: los valores por defecto (p. ej. `createdAt`) cambian en cada solicitud
+    return await idempotent_response(
+        db.get_idempotency_store(), idempotency_key, f"{current_user['sub']}:POST /api/expenses/",
+        request_fingerprint(expense_data.dict(exclude_unset=True)), status.HTTP_201_CREATED, create
+    )
+
+@router.post("/receipts/ocr")
+async def process_receipt(
+    file: UploadFile = File(...),
+    db: Database = Depends(lambda: Database()),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Extrae los datos de una boleta o factura para prellenar un gasto."""
+    if not (file.content_type or "").startswith("image/"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El archivo debe ser una imagen"
+        )
+    
+    expense_use_case = ExpenseUseCase(
+        ExpenseService(db.get_expense_repository()),
+        CompanyService(db.get_company_repository())
+    )
+    return await expense_use_case.process_receipt_image(await file.read())
 
-@router.get("/", response_model=List[Dict[str, Any]])
+@router.get("/")
 async def get_expenses(
     skip: int = 0,
     limit: int = 100,
+    expand: Optional[str] = Query(None, pattern=EXPAND_PATTERN),
     db: Database = Depends(lambda: Database()),
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
-    """Obtiene los gastos del usuario actual."""
-    repository = ExpenseRepository(db)
-    service = ExpenseService(repository)
+    """Obtiene los gastos del usuario actual; con `expand` incluye el dueño y los aprobadores."""
+    service = ExpenseService(db.get_expense_repository())
     
-    user_id = current_user["_id"]
+    user_id = current_user["sub"]
     expenses = await service.get_by_user(user_id, skip, limit)
+    await expand_user_references(expenses, parse_expand(expand), UserLoader(db.get_user_repository()))
     return expenses
 
-@router.get("/{expense_id}", response_model=Dict[str, Any])
+@router.get("/search")
+async def search_expenses(
+    q: str = Query(..., min_length=1, max_length=200),
+    scope: str = Query("user", pattern="^(user|company)$"),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: Database = Depends(lambda: Database()),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Busca gastos por proveedor, descripción, etiquetas o número de documento.
+    
+    La búsqueda ignora tildes y mayúsculas y admite prefijos ("hot" encuentra
+    "Hotel"). Con `scope=company`, managers y administradores buscan en toda la
+    empresa; en otro caso solo en los gastos propios.
+    """
+    user_id = current_user["sub"]
+    company_id = None
+    
+    if scope == "company":
+        if current_user.get("role") not in ("manager", "admin") or "company_id" not in current_user:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="No tiene permisos para buscar en los gastos de la empresa"
+            )
+        user_id = None
+        company_id = current_user["company_id"]
+    
+    after = None
+    if cursor:
+        decoded = decode_cursor(cursor)
+        try:
+            (score, date), last_id = decoded
+            after = (int(score), datetime.fromisoformat(date), last_id)
+        except (TypeError, ValueError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor inválido"
+            )
+    
+    service = ExpenseService(db.get_expense_repository())
+    items = await service.search_expenses(q, company_id, user_id, after, limit)
+    
+    next_page = None
+    if len(items) == limit:
+        last = items[-1]
+        next_page = encode_cursor([last["score"], last["date"].isoformat()], last["_id"])
+    
+    return {
+        "items": items,
+        "nextCursor": next_page
+    }
+
+@router.get("/stream")
+async def stream_expense_changes(
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+    db: Database = Depends(lambda: Database()),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Emite los cambios de gastos de la empresa del usuario como Server-Sent Events.
+    
+    Reemplaza el sondeo periódico de `/company/{company_id}`. Los empleados solo
+    reciben sus propios gastos; managers y administradores, los de toda la empresa.
+    Al reconectar, el navegador envía `Last-Event-ID` y se reenvían los eventos
+    perdidos, o un evento `reset` si ya no están disponibles.
+    """
+    if "company_id" not in current_user:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tiene una empresa asignada"
+        )
+    
+    broker = get_expense_broker(db.get_collection("expenses"))
+    subscription = broker.subscribe(
+        current_user["company_id"],
+        current_user["sub"],
+        current_user.get("role"),
+        last_event_id
+    )
+    
+    async def event_stream():
+        try:
+            yield f"retry: {HEARTBEAT_SECONDS * 1000}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            broker.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/sync")
+async def sync_expense_changes(
+    since: Optional[str] = Query(None, description="`nextToken` de la sincronización anterior; sin él se entregan todos"),
+    limit: int = Query(DEFAULT_SYNC_PAGE_SIZE, ge=1, le=MAX_SYNC_PAGE_SIZE),
+    db: Database = Depends(lambda: Database()),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Sincronización incremental de los gastos del usuario para clientes con modo sin conexión.
+    
+    Devuelve los gastos creados o modificados (`changed`) y los IDs de los
+    eliminados (`deleted`) desde `since`. Mientras `hasMore` sea verdadero se
+    pide la página siguiente con `nextToken`. Un token demasiado antiguo
+    responde 410 y el cliente debe sincronizar desde cero, sin `since`.
+    """
+    try:
+        return await sync_expenses(db.get_expense_repository(), current_user["sub"], since, limit)
+    except InvalidSyncToken:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Token de sincronización inválido"
+        )
+    except SyncTokenExpired:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="El token de sincronización expiró; sincronice desde cero"
+        )
+
+@router.get("/{expense_id}")
 async def get_expense(
     expense_id: str,
+    expand: Optional[str] = Query(None, pattern=EXPAND_PATTERN),
     db: Database = Depends(lambda: Database()),
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
-    """Obtiene un gasto específico por ID."""
-    repository = ExpenseRepository(db)
+    """Obtiene un gasto específico por ID; con `expand` incluye el dueño y los aprobadores."""
+    repository = db.get_expense_repository()
     service = ExpenseService(repository)
     
     expense = await service.get_by_id(expense_id)
@@ -60,15 +243,16 @@ async def get_expense(
         )
     
     # Verificar que el gasto pertenece al usuario actual o que es administrador
-    if str(expense["userId"]) != str(current_user["_id"]) and current_user.get("role") != "admin":
+    if str(expense["userId"]) != str(current_user["sub"]) and current_user.get("role") != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="No tiene permiso para acceder a este gasto"
         )
     
+    await expand_user_references([expense], parse_expand(expand), UserLoader(db.get_user_repository()))
     return expense
 
-@router.put("/{expense_id}", response_model=Dict[str, Any])
+@router.put("/{expense_id}")
 async def update_expense(
     expense_id: str,
     expense_update: ExpenseUpdate,
@@ -76,11 +260,13 @@ async def update_expense(
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """Actualiza un gasto existente."""
-    repository = ExpenseRepository(db)
-    service = ExpenseService(repository)
+    expense_use_case = ExpenseUseCase(
+        ExpenseService(db.get_expense_repository()),
+        CompanyService(db.get_company_repository())
+    )
     
     # Verificar que el gasto existe
-    existing_expense = await service.get_by_id(expense_id)
+    existing_expense = await expense_use_case.get_expense(expense_id)
     
     if not existing_expense:
         raise HTTPException(
@@ -89,14 +275,21 @@ async def update_expense(
         )
     
     # Verificar que el usuario tiene permisos para actualizar este gasto
-    if str(existing_expense["userId"]) != str(current_user["_id"]) and current_user.get("role") != "admin":
+    if str(existing_expense["userId"]) != str(current_user["sub"]) and current_user.get("role") != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="No tiene permiso para modificar este gasto"
         )
     
     update_data = {k: v for k, v in expense_update.dict().items() if v is not None}
-    result = await service.update(expense_id, update_data)
+    
+    try:
+        result = await expense_use_case.update_expense(expense_id, update_data)
+    except FXRateNotFound as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     return result
 
 @router.delete("/{expense_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -106,7 +299,7 @@ async def delete_expense(
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """Elimina un gasto."""
-    repository = ExpenseRepository(db)
+    repository = db.get_expense_repository()
     service = ExpenseService(repository)
     
     # Verificar que el gasto existe
@@ -119,7 +312,7 @@ async def delete_expense(
         )
     
     # Verificar que el usuario tiene permisos para eliminar este gasto
-    if str(existing_expense["userId"]) != str(current_user["_id"]) and current_user.get("role") != "admin":
+    if str(existing_expense["userId"]) != str(current_user["sub"]) and current_user.get("role") != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="No tiene permiso para eliminar este gasto"
@@ -128,20 +321,139 @@ async def delete_expense(
     await service.delete(expense_id)
     return None
 
-@router.get("/company/{company_id}", response_model=List[Dict[str, Any]])
+@router.get("/company/{company_id}")
 async def get_company_expenses(
     company_id: str,
     skip: int = 0,
     limit: int = 100,
+    expand: Optional[str] = Query(None, pattern=EXPAND_PATTERN),
     db: Database = Depends(lambda: Database()),
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
-    """Obtiene los gastos de una empresa específica."""
-    repository = ExpenseRepository(db)
+    """Obtiene los gastos de una empresa específica; con `expand` incluye el dueño y los aprobadores."""
+    repository = db.get_expense_repository()
     service = ExpenseService(repository)
     
     # Solo administradores o miembros de la empresa pueden ver estos gastos
     # (Esta validación debería ser más compleja en un caso real)
     
     expenses = await service.get_by_company(company_id, skip, limit)
+    await expand_user_references(expenses, parse_expand(expand), UserLoader(db.get_user_repository()))
     return expenses
+
+@router.get("/company/{company_id}/dashboard")
+async def get_company_dashboard(
+    company_id: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    db: Database = Depends(lambda: Database()),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Obtiene en una sola consulta los indicadores del dashboard de una empresa.
+    
+    Incluye totales, reparto por categoría, por estado, por usuario y la
+    tendencia mensual dentro de la ventana de fechas indicada.
+    """
+    is_admin = current_user.get("role") == "admin"
+    is_company_manager = current_user.get("role") == "manager" and current_user.get("company_id") == company_id
+    
+    if not (is_admin or is_company_manager):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tiene permisos para ver el dashboard de esta empresa"
+        )
+    
+    service = ExpenseService(db.get_expense_repository())
+    return await service.get_dashboard(company_id, start_date, end_date)
+
+@router.get("/company/{company_id}/anomalies")
+async def get_company_anomalies(
+    company_id: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    threshold: Optional[float] = Query(None, gt=0, description="z-score robusto mínimo (3.5 por defecto)"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Database = Depends(lambda: Database()),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Obtiene los gastos sospechosos de una empresa.
+    
+    Señala montos muy por sobre la norma del usuario o de la categoría
+    (z-score robusto sobre `threshold`), montos duplicados del mismo usuario
+    en el mismo día y gastos de fin de semana.
+    """
+    is_admin = current_user.get("role") == "admin"
+    is_company_manager = current_user.get("role") == "manager" and current_user.get("company_id") == company_id
+    
+    if not (is_admin or is_company_manager):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tiene permisos para ver las anomalías de esta empresa"
+        )
+    
+    # numpy se carga con el primer análisis y no al iniciar el worker
+    from app.domain.services.anomaly_service import AnomalyService, DEFAULT_Z_THRESHOLD
+    
+    service = AnomalyService(db.get_expense_repository())
+    return await service.detect_company_anomalies(company_id, start_date, end_date, threshold or DEFAULT_Z_THRESHOLD, limit)
+
+@router.get("/approvals/inbox")
+async def get_approval_inbox(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    status_filter: str = Query("pending", alias="status"),
+    expand: Optional[str] = Query(None, pattern=EXPAND_PATTERN),
+    db: Database = Depends(lambda: Database()),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Obtiene la bandeja de aprobación de la empresa del usuario actual.
+    
+    La paginación es por cursor: cada respuesta incluye `nextCursor` para
+    pedir la página siguiente. Con `expand` incluye el dueño y los aprobadores.
+    """
+    if current_user.get("role") not in ("manager", "admin") or "company_id" not in current_user:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tiene permisos para aprobar gastos"
+        )
+    
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        if not after:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor inválido"
+            )
+    
+    service = ExpenseService(db.get_expense_repository())
+    items = await service.get_approval_inbox(current_user["company_id"], status_filter, after, limit)
+    await expand_user_references(items, parse_expand(expand), UserLoader(db.get_user_repository()))
+    
+    return {
+        "items": items,
+        "nextCursor": next_cursor(items, "date", limit)
+    }
+
+@router.post("/approvals/batch", response_model=ApprovalBatchResponseDTO)
+async def process_approval_batch(
+    batch: ApprovalBatchRequestDTO,
+    db: Database = Depends(lambda: Database()),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Aprueba o rechaza varios gastos de la empresa del usuario actual en una sola operación."""
+    if current_user.get("role") not in ("manager", "admin") or "company_id" not in current_user:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tiene permisos para aprobar gastos"
+        )
+    
+    service = ExpenseService(db.get_expense_repository())
+    decisions = [decision.dict() for decision in batch.decisions]
+    results = await service.process_approval_batch(decisions, current_user["sub"], current_user["company_id"])
+    
+    return {
+        "processed": len(results),
+        "updated": sum(1 for r in results if r["result"] == "updated"),
+        "results": results
+    }
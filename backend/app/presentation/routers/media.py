@@ -0,0 +1,143 @@
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Path, UploadFile, File, Request, Header
+from typing import Dict, Any, Optional
+
+from app.infrastructure.database.mongodb import Database
+from app.infrastructure.security.jwt import get_current_user
+from app.infrastructure.cache.idempotency import idempotent_response, request_fingerprint
+from app.infrastructure.storage.file_response import RangeFileResponse
+from app.infrastructure.storage.media_storage import (
+    get_media_storage, validate_receipt, InvalidImageError, ImageTooLargeError,
+    RECEIPT_CONTENT_TYPES, MAX_RECEIPT_BYTES, VARIANT_WIDTHS, VARIANT_FORMATS
+)
+
+router = APIRouter()
+
+# Las URLs incluyen el hash del contenido, así que nunca cambian; `private` porque requieren autorización
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+@router.post("/receipts", status_code=status.HTTP_201_CREATED)
+async def upload_receipt(
+    file: UploadFile = File(...),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    db: Database = Depends(lambda: Database()),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Sube la imagen o PDF de una boleta y devuelve su URL inmutable para asociarla a un gasto.
+    
+    Con `Idempotency-Key`, un reintento recibe la respuesta original sin volver a procesar el archivo.
+    """
+    if "company_id" not in current_user:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="El usuario no pertenece a una empresa"
+        )
+    if file.content_type not in RECEIPT_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Tipo de archivo no admitido; se aceptan: {', '.join(RECEIPT_CONTENT_TYPES)}"
+        )
+
+    data = await file.read(MAX_RECEIPT_BYTES + 1)
+    if len(data) > MAX_RECEIPT_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"La boleta supera el máximo de {MAX_RECEIPT_BYTES // (1024 * 1024)} MB"
+        )
+    
+    # El Content-Type lo declara el cliente: se comprueba que el contenido corresponda
+    try:
+        await asyncio.to_thread(validate_receipt, data, file.content_type)
+    except InvalidImageError:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"El archivo no es un {file.content_type} válido"
+        )
+    except ImageTooLargeError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="La imagen tiene demasiados píxeles"
+        )
+
+    async def store():
+        digest, _ = await asyncio.to_thread(get_media_storage().save_original, data, file.content_type)
+        await db.get_receipt_repository().record(digest, current_user["company_id"], current_user["sub"],
+                                                 file.content_type, len(data), file.filename)
+
+        return {
+            "filename": file.filename,
+            "url": f"/api/media/receipts/{digest}",
+            "contentType": file.content_type,
+            "size": len(data)
+        }
+
+    return await idempotent_response(
+        db.get_idempotency_store(), idempotency_key, f"{current_user['sub']}:POST /api/media/receipts",
+        request_fingerprint(file.filename, file.content_type, data), status.HTTP_201_CREATED, store
+    )
+
+@router.api_route("/receipts/{digest}", methods=["GET", "HEAD"])
+async def get_receipt(
+    request: Request,
+    digest: str = Path(..., pattern="^[0-9a-f]{64}$"),
+    w: Optional[int] = Query(None, description=f"Ancho de la variante: {', '.join(map(str, VARIANT_WIDTHS))}"),
+    image_format: str = Query("webp", alias="format", pattern=f"^({'|'.join(VARIANT_FORMATS)})$"),
+    db: Database = Depends(lambda: Database()),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Sirve una boleta o, con `w`, una variante redimensionada en el formato pedido.
+
+    Admite solicitudes de rango y `If-None-Match`. Las variantes se generan la
+    primera vez que se piden y quedan en una caché en disco.
+    """
+    receipt = await db.get_receipt_repository().find_accessible(
+        digest, current_user.get("company_id"), current_user["sub"], current_user.get("role")
+    )
+    if not receipt:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Boleta no encontrada"
+        )
+
+    storage = get_media_storage()
+    path = storage.original_path(digest, RECEIPT_CONTENT_TYPES[receipt["contentType"]])
+    media_type = receipt["contentType"]
+    etag = f'"{digest}"'
+
+    if w is not None:
+        if w not in VARIANT_WIDTHS or not media_type.startswith("image/"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Variante no disponible; anchos admitidos: {', '.join(map(str, VARIANT_WIDTHS))}"
+            )
+        try:
+            path = await storage.get_variant(path, digest, w, image_format)
+        except FileNotFoundError:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Boleta no encontrada"
+            )
+        except InvalidImageError:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="La boleta no es una imagen legible"
+            )
+        except ImageTooLargeError:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="La imagen tiene demasiados píxeles para generar la variante"
+            )
+        media_type = VARIANT_FORMATS[image_format]
+        etag = f'"{digest}-{w}.{image_format}"'
+
+    try:
+        return RangeFileResponse(
+            path, media_type, etag, request.headers,
+            headers={"cache-control": IMMUTABLE_CACHE_CONTROL, "x-content-type-options": "nosniff"},
+            method=request.method
+        )
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Boleta no encontrada"
+        )
@@ -6,8 +6,9 @@ from app.application.use_cases.user_use_case import UserUseCase
 from app.domain.services.user_service import UserService
 from app.infrastructure.database.mongodb import Database
 from app.infrastructure.security.jwt import get_current_user
+from app.infrastructure.http.msgpack_format import MsgpackRoute
 
-router = APIRouter()
+router = APIRouter(route_class=MsgpackRoute)
 
 @router.post("/", response_model=UserResponseDTO)
 async def create_user(
@@ -0,0 +1,95 @@
+"""Memoria y tiempo de la detección de anomalías sobre 1M de gastos.
+
+Uso:
+    python -m benchmarks.anomaly_benchmark --rows 1000000
+    python -m benchmarks.anomaly_benchmark --from-db --output anomalies.json
+
+Sin `--from-db` los documentos se generan en memoria, de modo que se mide la
+conversión a columnas y el cálculo vectorizado sin la latencia de red.
+"""
+import argparse
+import asyncio
+import random
+import time
+import tracemalloc
+from typing import Dict, Any
+
+from bson import ObjectId
+
+from app.domain.services.anomaly_service import load_expense_columns, detect_anomalies
+from benchmarks.common import DEFAULT_MONGO_URL, DEFAULT_DB_NAME, write_results
+from benchmarks.seed import generate_companies, generate_users, generate_expenses
+
+
+def _documents(rows: int, users: int):
+    """Genera de antemano los documentos que devolvería el cursor proyectado."""
+    rng = random.Random(42)
+    companies = generate_companies(1, rng)
+    user_docs = generate_users(companies, users, rng, "x")
+    return [
+        {"_id": ObjectId(), "amount": expense["amount"], "date": expense["date"],
+         "category": expense["category"], "userId": expense["userId"]}
+        for expense in generate_expenses(user_docs, rows, rng, with_search=False)
+    ]
+
+
+async def _iterate(documents):
+    for document in documents:
+        yield document
+
+
+async def _company_cursor(args):
+    from app.infrastructure.database.mongodb import Database
+
+    database = Database(args.mongo_url, args.db)
+    await database.connect()
+    pipeline = [{"$group": {"_id": "$companyId", "n": {"$sum": 1}}}, {"$sort": {"n": -1}}, {"$limit": 1}]
+    top = await database.get_collection("expenses").aggregate(pipeline).to_list(1)
+    return await database.get_expense_repository().stream_analytics_columns(str(top[0]["_id"]))
+
+
+def _measure(label: str, results: Dict[str, Any], started: float):
+    current, peak = tracemalloc.get_traced_memory()
+    results[label] = {"seconds": round(time.perf_counter() - started, 3), "peak_mb": round(peak / 2 ** 20, 1)}
+    tracemalloc.reset_peak()
+    print(f"{label:10} {results[label]['seconds']}s, pico {results[label]['peak_mb']} MB")
+
+
+async def run(args) -> Dict[str, Any]:
+    source = await _company_cursor(args) if args.from_db else _iterate(_documents(args.rows, args.users))
+    results: Dict[str, Any] = {}
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    columns = await load_expense_columns(source)
+    _measure("load", results, started)
+
+    started = time.perf_counter()
+    report = detect_anomalies(columns, limit=100)
+    _measure("detect", results, started)
+    tracemalloc.stop()
+
+    results.update({
+        "rows": len(columns),
+        "users": len(columns.users),
+        "categories": len(columns.categories),
+        "columns_mb": round(columns.nbytes / 2 ** 20, 1),
+        "flagged": report["flagged"],
+        "counts": report["counts"]
+    })
+    print(f"{results['rows']} filas en {results['columns_mb']} MB de columnas, {results['flagged']} señaladas")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de detección de anomalías")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--from-db", action="store_true", help="Leer la empresa más grande de MongoDB")
+    parser.add_argument("--mongo-url", default=DEFAULT_MONGO_URL)
+    parser.add_argument("--db", default=DEFAULT_DB_NAME)
+    parser.add_argument("--output", default=None)
+    arguments = parser.parse_args()
+    output = asyncio.run(run(arguments))
+    if arguments.output:
+        write_results(arguments.output, "anomalies", output)
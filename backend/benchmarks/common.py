@@ -0,0 +1,43 @@
+"""Utilidades compartidas por los benchmarks."""
+import json
+import os
+import platform
+from datetime import datetime
+from typing import Dict, Any, List
+
+DEFAULT_MONGO_URL = os.getenv("BENCH_MONGO_URL", "mongodb://localhost:27017")
+DEFAULT_DB_NAME = os.getenv("BENCH_DB_NAME", "gastify_bench")
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Resume una lista de latencias (en segundos) en milisegundos."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(p: float) -> float:
+        index = min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))
+        return round(ordered[index] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3)
+    }
+
+
+def write_results(path: str, name: str, results: Dict[str, Any]):
+    """Guarda los resultados en JSON junto con metadatos de la ejecución."""
+    payload = {
+        "benchmark": name,
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results
+    }
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2, default=str)
+    print(f"Resultados guardados en {path}")
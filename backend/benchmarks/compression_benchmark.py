@@ -0,0 +1,118 @@
+"""Compara gzip, brotli y zstd sobre respuestas reales de la API.
+
+Uso:
+    python -m benchmarks.compression_benchmark --expenses 200000 --output compression.json
+
+Obtiene de MongoDB una página del listado de gastos, el listado completo de la
+empresa más grande (como una exportación) y el dashboard; los serializa como
+lo haría `JSONResponse` y, para cada codificación y nivel, mide el tamaño, la
+razón de compresión y el tiempo de CPU de comprimir y descomprimir.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, Callable
+
+from fastapi.encoders import ENCODERS_BY_TYPE, jsonable_encoder
+from bson import ObjectId
+
+from app.infrastructure.database.mongodb import Database
+from app.infrastructure.http.compression import available_encodings, compress_once
+from benchmarks.common import DEFAULT_MONGO_URL, DEFAULT_DB_NAME, write_results
+from benchmarks.seed import seed
+
+LEVELS = {"gzip": (1, 6, 9), "br": (1, 4, 5, 9), "zstd": (1, 3, 6, 12)}
+
+
+def _decompressor(encoding: str) -> Callable[[bytes], bytes]:
+    if encoding == "gzip":
+        return gzip.decompress
+    if encoding == "br":
+        import brotli
+        return brotli.decompress
+    import zstandard
+    decompressor = zstandard.ZstdDecompressor()
+    # Los frames en streaming no declaran su tamaño, así que se usa un objeto incremental
+    return lambda data: decompressor.decompressobj().decompress(data)
+
+
+def _serialize(content: Any) -> bytes:
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def _cpu_ms(func: Callable[[], Any], iterations: int) -> float:
+    started = time.process_time()
+    for _ in range(iterations):
+        func()
+    return round((time.process_time() - started) / iterations * 1000, 3)
+
+
+async def _largest_company(database: Database) -> str:
+    pipeline = [{"$group": {"_id": "$companyId", "n": {"$sum": 1}}}, {"$sort": {"n": -1}}, {"$limit": 1}]
+    result = await database.get_collection("expenses").aggregate(pipeline).to_list(1)
+    return str(result[0]["_id"])
+
+
+async def run(args) -> Dict[str, Any]:
+    ENCODERS_BY_TYPE[ObjectId] = str
+    database = Database(args.mongo_url, args.db)
+    await database.connect()
+
+    if await database.get_collection("expenses").estimated_document_count() < args.expenses:
+        summary = await seed(database.db, args.companies, args.users, args.expenses)
+        print(f"Sembrados {summary['expenses']} gastos en {summary['seconds']}s")
+    await database.create_indexes()
+
+    repository = database.get_expense_repository()
+    company_id = await _largest_company(database)
+    end = datetime.now()
+    payloads = {
+        "expenses_page": _serialize(await repository.find_by_company(company_id, 0, 100)),
+        "expenses_export": _serialize(await repository.find_by_company(company_id, 0, args.export_limit)),
+        "dashboard": _serialize(await repository.get_dashboard_stats(company_id, end - timedelta(days=365), end))
+    }
+    await database.close()
+
+    results = {}
+    for name, payload in payloads.items():
+        # Las respuestas grandes se repiten menos veces para que el benchmark no se eternice
+        iterations = max(3, min(args.iterations, (4 * 1024 * 1024) // max(len(payload), 1)))
+        print(f"\n{name}: {len(payload)} bytes ({iterations} iteraciones)")
+        results[name] = {"bytes": len(payload), "encodings": {}}
+        for encoding in available_encodings():
+            decompress = _decompressor(encoding)
+            for level in LEVELS[encoding]:
+                compressed = compress_once(payload, encoding, level)
+                assert decompress(compressed) == payload
+                row = {
+                    "bytes": len(compressed),
+                    "ratio": round(len(payload) / len(compressed), 2),
+                    "saved_bytes": len(payload) - len(compressed),
+                    "compress_cpu_ms": _cpu_ms(lambda: compress_once(payload, encoding, level), iterations),
+                    "decompress_cpu_ms": _cpu_ms(lambda: decompress(compressed), iterations)
+                }
+                results[name]["encodings"][f"{encoding}-{level}"] = row
+                print(f"  {encoding:5} nivel {level:2} {row['bytes']:>10} bytes  x{row['ratio']:<6} "
+                      f"comprimir={row['compress_cpu_ms']}ms descomprimir={row['decompress_cpu_ms']}ms")
+
+    return {"company_id": company_id, "payloads": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de compresión de respuestas")
+    parser.add_argument("--mongo-url", default=DEFAULT_MONGO_URL)
+    parser.add_argument("--db", default=DEFAULT_DB_NAME)
+    parser.add_argument("--companies", type=int, default=20)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--expenses", type=int, default=200000)
+    parser.add_argument("--export-limit", type=int, default=5000)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--output", default=None)
+    arguments = parser.parse_args()
+    output = asyncio.run(run(arguments))
+    if arguments.output:
+        write_results(arguments.output, "compression", output)
@@ -0,0 +1,93 @@
+"""Compara el dashboard en un solo `$facet` contra las agregaciones equivalentes por separado.
+
+Uso:
+    python -m benchmarks.dashboard_benchmark --expenses 1000000 --output dashboard.json
+
+Mide tres variantes sin caché (un `$facet`, cinco agregaciones secuenciales y
+cinco agregaciones concurrentes) y la lectura desde la caché del servicio.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any
+
+from app.domain.services.expense_service import ExpenseService
+from app.infrastructure.database.mongodb import Database
+from benchmarks.common import DEFAULT_MONGO_URL, DEFAULT_DB_NAME, percentiles, write_results
+from benchmarks.seed import seed
+
+
+async def _largest_company(database: Database) -> str:
+    pipeline = [{"$group": {"_id": "$companyId", "n": {"$sum": 1}}}, {"$sort": {"n": -1}}, {"$limit": 1}]
+    result = await database.get_collection("expenses").aggregate(pipeline).to_list(1)
+    return str(result[0]["_id"])
+
+
+async def run(args) -> Dict[str, Any]:
+    database = Database(args.mongo_url, args.db)
+    await database.connect()
+
+    if await database.get_collection("expenses").estimated_document_count() < args.expenses:
+        summary = await seed(database.db, args.companies, args.users, args.expenses)
+        print(f"Sembrados {summary['expenses']} gastos en {summary['seconds']}s")
+    await database.create_indexes()
+
+    repository = database.get_expense_repository()
+    service = ExpenseService(repository)
+    company_id = await _largest_company(database)
+    end = datetime.now()
+    start = end - timedelta(days=args.window_days)
+
+    match = repository.build_company_match(company_id, start, end)
+    facets = repository.build_dashboard_facets()
+    projection = {"$project": repository.build_dashboard_projection()}
+    separate = [[{"$match": match}, projection] + stages for stages in facets.values()]
+
+    async def facet():
+        await repository.get_dashboard_stats(company_id, start, end)
+
+    async def sequential():
+        for pipeline in separate:
+            await repository.collection.aggregate(pipeline).to_list(None)
+
+    async def concurrent():
+        await asyncio.gather(*(repository.collection.aggregate(p).to_list(None) for p in separate))
+
+    async def cached():
+        await service.get_dashboard(company_id, start, end)
+
+    variants = {"facet": facet, "separate_sequential": sequential,
+                "separate_concurrent": concurrent, "service_cached": cached}
+    results = {}
+
+    for name, variant in variants.items():
+        await variant()  # calentamiento
+        samples = []
+        for _ in range(args.iterations):
+            started = time.perf_counter()
+            await variant()
+            samples.append(time.perf_counter() - started)
+        results[name] = percentiles(samples)
+        print(f"{name:22} p50={results[name]['p50_ms']}ms p95={results[name]['p95_ms']}ms")
+
+    matched = await repository.count(match)
+    await database.close()
+    return {"company_id": company_id, "window_days": args.window_days, "matched_expenses": matched,
+            "variants": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del dashboard de gastos")
+    parser.add_argument("--mongo-url", default=DEFAULT_MONGO_URL)
+    parser.add_argument("--db", default=DEFAULT_DB_NAME)
+    parser.add_argument("--companies", type=int, default=50)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--expenses", type=int, default=1000000)
+    parser.add_argument("--window-days", type=int, default=365)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--output", default=None)
+    arguments = parser.parse_args()
+    output = asyncio.run(run(arguments))
+    if arguments.output:
+        write_results(arguments.output, "dashboard", output)
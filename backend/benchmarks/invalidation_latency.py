@@ -0,0 +1,115 @@
+"""Latencia del bus de invalidación de cachés entre procesos.
+
+Uso:
+    python -m benchmarks.invalidation_latency --workers 4 --messages 200 --output invalidation.json
+    python -m benchmarks.invalidation_latency --mode poll   # forzar sondeo en vez de change streams
+
+Levanta `--workers` procesos, cada uno con su propio cliente de MongoDB y su
+`InvalidationBus` (como los workers de uvicorn), y publica claves desde el
+proceso principal. Cada worker informa cuándo su manejador descartó la clave;
+la latencia es el tiempo entre la publicación y ese aviso. También se informa
+cuántos avisos no llegaron antes del plazo.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import queue
+import time
+import uuid
+from typing import Dict, Any
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.infrastructure.cache.invalidation import InvalidationBus, on_invalidate, INVALIDATION_COLLECTION
+from benchmarks.common import DEFAULT_MONGO_URL, DEFAULT_DB_NAME, percentiles, write_results
+
+
+async def _worker(mongo_url: str, db_name: str, use_change_stream: bool, received, ready, stop):
+    client = AsyncIOMotorClient(mongo_url)
+    bus = InvalidationBus(client[db_name][INVALIDATION_COLLECTION], use_change_stream)
+
+    @on_invalidate("bench:")
+    def report(key: str):
+        received.put((key, time.time()))
+
+    bus.start()
+    # El resync inicial aplica las versiones existentes; los avisos medidos son los posteriores
+    await asyncio.sleep(1)
+    ready.set()
+    while not stop.is_set():
+        await asyncio.sleep(0.1)
+    await bus.stop()
+    client.close()
+
+
+def _run_worker(*args):
+    asyncio.run(_worker(*args))
+
+
+async def run(args) -> Dict[str, Any]:
+    context = multiprocessing.get_context("spawn")
+    received, stop = context.Queue(), context.Event()
+    readies = [context.Event() for _ in range(args.workers)]
+    use_change_stream = args.mode == "auto"
+    processes = [context.Process(target=_run_worker,
+                                 args=(args.mongo_url, args.db, use_change_stream, received, ready, stop))
+                 for ready in readies]
+    for process in processes:
+        process.start()
+    for ready in readies:
+        if not ready.wait(60):
+            raise RuntimeError("Un worker no quedó listo a tiempo")
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    publisher = InvalidationBus(client[args.db][INVALIDATION_COLLECTION])
+    run_id = uuid.uuid4().hex[:8]
+    published = {}
+    for i in range(args.messages):
+        key = f"bench:{run_id}:{i}"
+        published[key] = time.time()
+        await publisher.publish(key)
+        await asyncio.sleep(args.interval)
+
+    expected = args.messages * args.workers
+    latencies = []
+    deadline = time.monotonic() + args.timeout
+    while len(latencies) < expected and time.monotonic() < deadline:
+        try:
+            key, at = received.get(timeout=max(deadline - time.monotonic(), 0.01))
+        except queue.Empty:
+            break
+        if key in published:
+            latencies.append(at - published[key])
+
+    stop.set()
+    for process in processes:
+        process.join(10)
+    client.close()
+
+    results = {
+        "mode": args.mode,
+        "workers": args.workers,
+        "messages": args.messages,
+        "delivered": len(latencies),
+        "missing": expected - len(latencies),
+        "latency": percentiles(latencies)
+    }
+    print(f"{args.mode}: {len(latencies)}/{expected} avisos, p50={results['latency'].get('p50_ms')}ms "
+          f"p99={results['latency'].get('p99_ms')}ms máx={results['latency'].get('max_ms')}ms")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latencia del bus de invalidación entre procesos")
+    parser.add_argument("--mongo-url", default=DEFAULT_MONGO_URL)
+    parser.add_argument("--db", default=DEFAULT_DB_NAME)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.02, help="Segundos entre publicaciones")
+    parser.add_argument("--mode", choices=["auto", "poll"], default="auto")
+    parser.add_argument("--timeout", type=float, default=10, help="Segundos de espera por los avisos pendientes")
+    parser.add_argument("--output", default=None)
+    arguments = parser.parse_args()
+    output = asyncio.run(run(arguments))
+    if arguments.output:
+        write_results(arguments.output, "invalidation_latency", output)
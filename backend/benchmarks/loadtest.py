@@ -0,0 +1,310 @@
+"""Prueba de carga con escenarios mixtos sobre la API de Gastify.
+
+Uso:
+    # En proceso (ASGI), sembrando la base de benchmarks si hace falta
+    python -m benchmarks.loadtest --expenses 200000 --duration 60 --concurrency 50 --output run.json
+
+    # Contra un uvicorn en ejecución, comparando con una corrida anterior
+    python -m benchmarks.loadtest --base-url http://localhost:8000 --compare run.json --output run2.json
+
+Cada usuario virtual elige un escenario al azar según `--mix` (login, list,
+create, approve, stats, ocr) y registra la latencia de cada solicitud. El
+informe incluye throughput y p50/p95/p99 por endpoint.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.common import DEFAULT_MONGO_URL, DEFAULT_DB_NAME, percentiles, write_results
+from benchmarks.seed import seed, BENCH_PASSWORD, CATEGORIES, VENDORS, DESCRIPTIONS
+
+DEFAULT_MIX = "list=40,create=20,stats=10,approve=10,login=5,ocr=5"
+
+# Usuarios con sesión iniciada por rol antes de empezar la carga
+SESSION_POOL = {"employee": 40, "manager": 10}
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    """Convierte "list=40,create=20" en {"list": 40, "create": 20}."""
+    weights = {}
+    for part in mix.split(","):
+        name, weight = part.split("=")
+        if name not in SCENARIOS:
+            raise ValueError(f"Escenario desconocido: {name}")
+        weights[name] = int(weight)
+    return weights
+
+
+def _receipt_image() -> bytes:
+    """Imagen PNG pequeña que simula la foto de una boleta."""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("L", (600, 900), 255)
+    draw = ImageDraw.Draw(image)
+    for line in range(0, 900, 30):
+        draw.text((20, line), "BOLETA ELECTRONICA  TOTAL $11.900", fill=0)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class Session:
+    """Usuario autenticado usado por los escenarios."""
+
+    def __init__(self, user: Dict[str, Any], token: str):
+        self.user = user
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+
+class LoadTest:
+    """Estado compartido por los usuarios virtuales y registro de latencias."""
+
+    def __init__(self, http: httpx.AsyncClient, users: List[Dict[str, Any]], rng: random.Random):
+        self.http = http
+        self.users = users
+        self.rng = rng
+        self.sessions: Dict[str, List[Session]] = {}
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.receipt = _receipt_image()
+
+    async def request(self, endpoint: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        """Hace una solicitud y registra su latencia bajo el nombre del endpoint."""
+        started = time.perf_counter()
+        try:
+            response = await self.http.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.errors[endpoint][type(e).__name__] += 1
+            return None
+        self.samples[endpoint].append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors[endpoint][str(response.status_code)] += 1
+        return response
+
+    async def login(self, user: Dict[str, Any]) -> Optional[str]:
+        response = await self.request("POST /api/auth/login", "POST", "/api/auth/login",
+                                      json={"email": user["email"], "password": BENCH_PASSWORD})
+        if response is None or response.status_code != 200:
+            return None
+        return response.json()["access_token"]
+
+    async def open_sessions(self):
+        """Inicia sesión con una muestra de usuarios de cada rol."""
+        for role, size in SESSION_POOL.items():
+            candidates = [u for u in self.users if u["role"] == role]
+            sample = self.rng.sample(candidates, min(size, len(candidates)))
+            tokens = await asyncio.gather(*(self.login(user) for user in sample))
+            self.sessions[role] = [Session(u, t) for u, t in zip(sample, tokens) if t]
+        # Las latencias del calentamiento no se informan
+        self.samples.clear()
+        self.errors.clear()
+        if not self.sessions.get("employee"):
+            raise RuntimeError("No se pudo iniciar sesión con ningún usuario de prueba")
+
+    def session(self, role: str = "employee") -> Session:
+        return self.rng.choice(self.sessions.get(role) or self.sessions["employee"])
+
+
+async def scenario_login(test: LoadTest):
+    await test.login(test.rng.choice(test.users))
+
+
+async def scenario_list(test: LoadTest):
+    session = test.session()
+    await test.request("GET /api/expenses/", "GET", "/api/expenses/", params={"limit": 50}, headers=session.headers)
+
+
+async def scenario_create(test: LoadTest):
+    session = test.session()
+    category = test.rng.choice(list(CATEGORIES))
+    expense = {
+        "userId": str(session.user["_id"]),
+        "companyId": str(session.user["companyId"]),
+        "amount": float(test.rng.randint(1000, 60000)),
+        "currency": "CLP",
+        "description": test.rng.choice(DESCRIPTIONS[category]),
+        "category": category,
+        "date": (datetime.now() - timedelta(days=test.rng.randint(0, 20))).isoformat(),
+        "documentType": "Boleta",
+        "vendor": test.rng.choice(VENDORS[category]),
+    }
+    await test.request("POST /api/expenses/", "POST", "/api/expenses/", json=expense, headers=session.headers)
+
+
+async def scenario_approve(test: LoadTest):
+    session = test.session("manager")
+    inbox = await test.request("GET /api/expenses/approvals/inbox", "GET", "/api/expenses/approvals/inbox",
+                               params={"limit": 20}, headers=session.headers)
+    if inbox is None or inbox.status_code != 200:
+        return
+    items = inbox.json()["items"]
+    if not items:
+        return
+    decisions = [{"expenseId": item["_id"], "action": test.rng.choice(["approve", "approve", "reject"])}
+                 for item in test.rng.sample(items, min(len(items), test.rng.randint(1, 5)))]
+    await test.request("POST /api/expenses/approvals/batch", "POST", "/api/expenses/approvals/batch",
+                       json={"decisions": decisions}, headers=session.headers)
+
+
+async def scenario_stats(test: LoadTest):
+    session = test.session("manager")
+    # Ventanas distintas para no medir solo la caché del dashboard
+    days = test.rng.choice([7, 30, 90, 365])
+    start = (datetime.now() - timedelta(days=days)).replace(microsecond=0).isoformat()
+    url = f"/api/expenses/company/{session.user['companyId']}/dashboard"
+    await test.request("GET /api/expenses/company/{company_id}/dashboard", "GET", url,
+                       params={"start_date": start}, headers=session.headers)
+
+
+async def scenario_ocr(test: LoadTest):
+    session = test.session()
+    files = {"file": ("boleta.png", test.receipt, "image/png")}
+    await test.request("POST /api/expenses/receipts/ocr", "POST", "/api/expenses/receipts/ocr",
+                       files=files, headers=session.headers)
+
+
+SCENARIOS = {
+    "login": scenario_login,
+    "list": scenario_list,
+    "create": scenario_create,
+    "approve": scenario_approve,
+    "stats": scenario_stats,
+    "ocr": scenario_ocr,
+}
+
+
+async def _virtual_user(test: LoadTest, weights: Dict[str, int], deadline: float):
+    names, cumulative = list(weights), []
+    total = 0
+    for name in names:
+        total += weights[name]
+        cumulative.append(total)
+    while time.perf_counter() < deadline:
+        scenario = test.rng.choices(names, cum_weights=cumulative)[0]
+        await SCENARIOS[scenario](test)
+
+
+async def _load_users(db, companies: int, users: int, expenses: int, reseed: bool) -> List[Dict[str, Any]]:
+    """Siembra la base si hace falta y devuelve los usuarios de prueba."""
+    if reseed or await db.expenses.estimated_document_count() < expenses:
+        summary = await seed(db, companies, users, expenses)
+        print(f"Sembrados {summary['expenses']} gastos y {len(summary['users'])} usuarios en {summary['seconds']}s")
+    cursor = db.users.find({"email": {"$regex": "@bench\\.gastify\\.cl$"}}, {"email": 1, "companyId": 1, "role": 1})
+    return await cursor.to_list(None)
+
+
+async def _in_process_client(args) -> Tuple[httpx.AsyncClient, Any]:
+    """Cliente contra la aplicación en el mismo proceso, conectada a la base de benchmarks."""
+    # El scheduler no debe competir con la carga medida
+    os.environ.setdefault("SCHEDULER_ENABLED", "false")
+    from app.main import app
+    from app.infrastructure.database.mongodb import Database
+
+    database = Database(args.mongo_url, args.db)
+    await database.connect()
+    await database.create_indexes()
+    # Los errores de la aplicación se cuentan como 500 en vez de abortar la prueba
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    return httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60), database
+
+
+def build_report(test: LoadTest, elapsed: float) -> Dict[str, Any]:
+    endpoints = {}
+    for endpoint in sorted(set(test.samples) | set(test.errors)):
+        samples = test.samples.get(endpoint, [])
+        endpoints[endpoint] = {
+            **percentiles(samples),
+            "rps": round(len(samples) / elapsed, 1),
+            "errors": dict(test.errors.get(endpoint, {}))
+        }
+    all_samples = [sample for samples in test.samples.values() for sample in samples]
+    return {
+        "elapsed_seconds": round(elapsed, 1),
+        "total": {**percentiles(all_samples), "rps": round(len(all_samples) / elapsed, 1),
+                  "errors": sum(sum(e.values()) for e in test.errors.values())},
+        "endpoints": endpoints
+    }
+
+
+def print_report(report: Dict[str, Any], baseline: Dict[str, Any] = None):
+    print(f"\n{'endpoint':52} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'err':>6}")
+    rows = list(report["endpoints"].items()) + [("TOTAL", report["total"])]
+    for endpoint, stats in rows:
+        errors = stats["errors"] if isinstance(stats["errors"], int) else sum(stats["errors"].values())
+        line = (f"{endpoint:52} {stats['rps']:>8} {stats.get('p50_ms', '-'):>8} "
+                f"{stats.get('p95_ms', '-'):>8} {stats.get('p99_ms', '-'):>8} {errors:>6}")
+        previous = (baseline or {}).get("endpoints", {}).get(endpoint) if endpoint != "TOTAL" else (baseline or {}).get("total")
+        if previous and previous.get("p95_ms") and stats.get("p95_ms"):
+            change = (stats["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100
+            line += f"   p95 {change:+.1f}% vs base"
+        print(line)
+
+
+async def run(args) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    weights = parse_mix(args.mix)
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+    mongo = AsyncIOMotorClient(args.mongo_url)
+    users = await _load_users(mongo[args.db], args.companies, args.users, args.expenses, args.reseed)
+    mongo.close()
+
+    database = None
+    if args.base_url:
+        http = httpx.AsyncClient(base_url=args.base_url, timeout=60,
+                                 limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        http, database = await _in_process_client(args)
+
+    async with http:
+        test = LoadTest(http, users, rng)
+        await test.open_sessions()
+
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(_virtual_user(test, weights, deadline) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    if database:
+        await database.close()
+
+    report = build_report(test, elapsed)
+    report["config"] = {"target": args.base_url or "asgi", "concurrency": args.concurrency,
+                        "duration": args.duration, "mix": weights, "expenses": args.expenses, "seed": args.seed}
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    print_report(report, baseline)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API de Gastify")
+    parser.add_argument("--base-url", default=None, help="URL de un uvicorn en ejecución; por defecto, en proceso")
+    parser.add_argument("--mongo-url", default=DEFAULT_MONGO_URL)
+    parser.add_argument("--db", default=DEFAULT_DB_NAME)
+    parser.add_argument("--companies", type=int, default=20)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--expenses", type=int, default=100000)
+    parser.add_argument("--reseed", action="store_true", help="Volver a sembrar aunque ya haya datos")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30, help="Segundos de carga")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--compare", default=None, help="JSON de una corrida anterior para comparar p95")
+    parser.add_argument("--output", default=None)
+    arguments = parser.parse_args()
+    output = asyncio.run(run(arguments))
+    if arguments.output:
+        write_results(arguments.output, "loadtest", output)
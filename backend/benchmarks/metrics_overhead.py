@@ -0,0 +1,120 @@
+"""Costo de la instrumentación de métricas sobre el listado de gastos.
+
+Uso:
+    python -m benchmarks.metrics_overhead --requests 2000 --rounds 6 --output metrics.json
+
+Sirve `GET /api/expenses/` en proceso (httpx + ASGITransport) con y sin el
+middleware y los listeners de MongoDB, alternando las variantes por rondas para
+que el ruido de la máquina afecte a ambas por igual. El objetivo es un costo
+menor al 2% del throughput.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, Any
+
+import httpx
+from fastapi import FastAPI
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.infrastructure.database.mongodb import Database
+from app.infrastructure.monitoring.metrics import MetricsMiddleware, MongoCommandListener, MongoPoolListener
+from app.infrastructure.security.jwt import create_access_token
+from app.presentation.routers import expenses
+from benchmarks.common import DEFAULT_MONGO_URL, DEFAULT_DB_NAME, write_results
+from benchmarks.seed import seed
+
+
+def build_app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+    app.include_router(expenses.router, prefix="/api/expenses")
+    return app
+
+
+async def _round(app: FastAPI, client: AsyncIOMotorClient, db_name: str, token: str,
+                 requests: int, concurrency: int) -> float:
+    # Las dependencias de los routers usan el cliente guardado a nivel de clase
+    Database.client = client
+    Database.db = client[db_name]
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {token}"}
+    remaining = iter(range(requests))
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        async def worker():
+            for _ in remaining:
+                response = await http.get("/api/expenses/?limit=50", headers=headers)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return requests / (time.perf_counter() - started)
+
+
+async def run(args) -> Dict[str, Any]:
+    plain_client = AsyncIOMotorClient(args.mongo_url)
+    instrumented_client = AsyncIOMotorClient(args.mongo_url,
+                                             event_listeners=[MongoCommandListener(), MongoPoolListener()])
+    db = plain_client[args.db]
+
+    if await db.expenses.estimated_document_count() < args.expenses:
+        summary = await seed(db, expenses=args.expenses)
+        print(f"Sembrados {summary['expenses']} gastos en {summary['seconds']}s")
+    await db.expenses.create_index([("userId", 1), ("date", -1)])
+
+    # El usuario con más gastos: cada solicitud devuelve una página completa
+    top = await db.expenses.aggregate([
+        {"$group": {"_id": "$userId", "n": {"$sum": 1}}}, {"$sort": {"n": -1}}, {"$limit": 1}
+    ]).to_list(1)
+    token = create_access_token({"sub": str(top[0]["_id"]), "role": "employee"})
+
+    variants = {
+        "plain": (build_app(False), plain_client),
+        "instrumented": (build_app(True), instrumented_client)
+    }
+    samples = {name: [] for name in variants}
+
+    for name, (app, client) in variants.items():
+        await _round(app, client, args.db, token, args.requests // 10, args.concurrency)  # calentamiento
+
+    for round_number in range(args.rounds):
+        # Se alterna el orden para no favorecer a la variante que corre segunda
+        order = list(variants) if round_number % 2 == 0 else list(reversed(list(variants)))
+        for name in order:
+            app, client = variants[name]
+            samples[name].append(await _round(app, client, args.db, token, args.requests, args.concurrency))
+
+    plain = statistics.median(samples["plain"])
+    instrumented = statistics.median(samples["instrumented"])
+    results = {
+        "requests_per_round": args.requests,
+        "concurrency": args.concurrency,
+        "plain_rps": round(plain, 1),
+        "instrumented_rps": round(instrumented, 1),
+        "overhead_pct": round((plain - instrumented) / plain * 100, 2),
+        "samples": {name: [round(value, 1) for value in values] for name, values in samples.items()}
+    }
+    print(f"sin métricas {results['plain_rps']} req/s, con métricas {results['instrumented_rps']} req/s, "
+          f"costo {results['overhead_pct']}%")
+
+    plain_client.close()
+    instrumented_client.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Costo de la instrumentación de métricas")
+    parser.add_argument("--mongo-url", default=DEFAULT_MONGO_URL)
+    parser.add_argument("--db", default=DEFAULT_DB_NAME)
+    parser.add_argument("--expenses", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=6)
+    parser.add_argument("--output", default=None)
+    arguments = parser.parse_args()
+    output = asyncio.run(run(arguments))
+    if arguments.output:
+        write_results(arguments.output, "metrics_overhead", output)
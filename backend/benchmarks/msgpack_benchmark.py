@@ -0,0 +1,113 @@
+"""Compara JSON y MessagePack en los listados de gastos, usuarios y empresas.
+
+Uso:
+    python -m benchmarks.msgpack_benchmark --expenses 200000 --output msgpack.json
+
+Para cada listado mide el tamaño (sin comprimir y con gzip) y el tiempo de CPU
+de codificar, como lo hace cada respuesta (`jsonable_encoder` + `json.dumps`
+contra `packb`), y de decodificar, como lo haría un cliente.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import time
+from typing import Dict, Any, Callable, List
+
+import msgpack
+from bson import ObjectId
+from fastapi.encoders import ENCODERS_BY_TYPE, jsonable_encoder
+
+from app.infrastructure.database.mongodb import Database
+from app.infrastructure.http.msgpack_format import packb
+from benchmarks.common import DEFAULT_MONGO_URL, DEFAULT_DB_NAME, write_results
+from benchmarks.seed import seed
+
+
+def _encode_json(content: Any) -> bytes:
+    # Lo mismo que hace `JSONResponse` con el resultado de un endpoint
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def _cpu_ms(func: Callable[[], Any], iterations: int) -> float:
+    started = time.process_time()
+    for _ in range(iterations):
+        func()
+    return round((time.process_time() - started) / iterations * 1000, 3)
+
+
+def _measure(content: List[Dict[str, Any]], iterations: int) -> Dict[str, Any]:
+    encoded_json = _encode_json(content)
+    encoded_msgpack = packb(content)
+    results = {}
+    for name, encoded, encode, decode in (
+        ("json", encoded_json, _encode_json, json.loads),
+        # Un cliente decodifica sin los ajustes que la API aplica a los cuerpos que recibe
+        ("msgpack", encoded_msgpack, packb, lambda data: msgpack.unpackb(data, timestamp=3)),
+    ):
+        results[name] = {
+            "bytes": len(encoded),
+            "gzip_bytes": len(gzip.compress(encoded, 6)),
+            "encode_cpu_ms": _cpu_ms(lambda: encode(content), iterations),
+            "decode_cpu_ms": _cpu_ms(lambda: decode(encoded), iterations)
+        }
+    results["size_ratio"] = round(len(encoded_msgpack) / len(encoded_json), 3)
+    results["encode_speedup"] = round(
+        results["json"]["encode_cpu_ms"] / max(results["msgpack"]["encode_cpu_ms"], 0.001), 2
+    )
+    return results
+
+
+async def _largest_company(database: Database) -> str:
+    pipeline = [{"$group": {"_id": "$companyId", "n": {"$sum": 1}}}, {"$sort": {"n": -1}}, {"$limit": 1}]
+    result = await database.get_collection("expenses").aggregate(pipeline).to_list(1)
+    return str(result[0]["_id"])
+
+
+async def run(args) -> Dict[str, Any]:
+    ENCODERS_BY_TYPE[ObjectId] = str
+    database = Database(args.mongo_url, args.db)
+    await database.connect()
+
+    if await database.get_collection("expenses").estimated_document_count() < args.expenses:
+        summary = await seed(database.db, args.companies, args.users, args.expenses)
+        print(f"Sembrados {summary['expenses']} gastos en {summary['seconds']}s")
+    await database.create_indexes()
+
+    company_id = await _largest_company(database)
+    expenses = database.get_expense_repository()
+    listings = {
+        "expenses_page": await expenses.find_by_company(company_id, 0, 100),
+        "expenses_large": await expenses.find_by_company(company_id, 0, args.large_limit),
+        "users_page": await database.get_user_repository().find_by_company(company_id, 0, 100),
+        "companies_page": await database.get_company_repository().find_active(0, 100)
+    }
+    await database.close()
+
+    results = {}
+    for name, content in listings.items():
+        iterations = args.iterations if len(content) <= 100 else max(3, args.iterations // 10)
+        results[name] = {"documents": len(content), **_measure(content, iterations)}
+        row = results[name]
+        print(f"{name:15} {len(content):>6} docs  json={row['json']['bytes']}B/{row['json']['encode_cpu_ms']}ms  "
+              f"msgpack={row['msgpack']['bytes']}B/{row['msgpack']['encode_cpu_ms']}ms  "
+              f"tamaño x{row['size_ratio']}  codificación x{row['encode_speedup']} más rápida")
+
+    return {"company_id": company_id, "listings": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de JSON contra MessagePack")
+    parser.add_argument("--mongo-url", default=DEFAULT_MONGO_URL)
+    parser.add_argument("--db", default=DEFAULT_DB_NAME)
+    parser.add_argument("--companies", type=int, default=20)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--expenses", type=int, default=200000)
+    parser.add_argument("--large-limit", type=int, default=5000)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--output", default=None)
+    arguments = parser.parse_args()
+    output = asyncio.run(run(arguments))
+    if arguments.output:
+        write_results(arguments.output, "msgpack", output)
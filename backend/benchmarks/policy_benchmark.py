@@ -0,0 +1,101 @@
+"""Rendimiento de la política compilada frente a la validación original.
+
+Uso:
+    python -m benchmarks.policy_benchmark --expenses 200000 --output policy.json
+
+No requiere MongoDB: evalúa gastos generados por el seeder contra una
+configuración con reglas por categoría, rol y comprobante.
+"""
+import argparse
+import gc
+import random
+import time
+from datetime import datetime
+from typing import Dict, Any
+
+from app.domain.services.policy_engine import compile_policy
+from benchmarks.common import write_results
+from benchmarks.seed import generate_companies, generate_users, generate_expenses
+
+SETTINGS = {
+    "currency": "CLP",
+    "categories": ["Alimentación", "Transporte", "Alojamiento", "Material Oficina", "Otros"],
+    "allowedExpenseTypes": ["Boleta", "Factura", "Recibo"],
+    "maxExpenseAmount": 500000,
+    "policyRules": [
+        {"type": "categoryCap", "category": "Alimentación", "amount": 30000},
+        {"type": "categoryCap", "category": "Transporte", "amount": 40000},
+        {"type": "categoryCap", "category": "Alojamiento", "amount": 120000},
+        {"type": "roleLimit", "role": "employee", "amount": 150000},
+        {"type": "receiptRequired", "amount": 20000},
+        {"type": "receiptRequired", "category": "Alojamiento", "amount": 0},
+    ]
+}
+
+
+def legacy_validate(expense_data: Dict[str, Any], company_settings: Dict[str, Any]) -> Dict[str, Any]:
+    """Copia de la validación anterior (cuatro reglas fijas con búsquedas lineales)."""
+    validation_results = {"is_valid": True, "errors": []}
+    if company_settings and "maxExpenseAmount" in company_settings and company_settings["maxExpenseAmount"]:
+        if expense_data["amount"] > company_settings["maxExpenseAmount"]:
+            validation_results["is_valid"] = False
+            validation_results["errors"].append(f"El monto excede el máximo permitido de {company_settings['maxExpenseAmount']}")
+    if company_settings and "categories" in company_settings and company_settings["categories"]:
+        if expense_data["category"] not in company_settings["categories"]:
+            validation_results["is_valid"] = False
+            validation_results["errors"].append("Categoría no permitida")
+    if company_settings and "allowedExpenseTypes" in company_settings and company_settings["allowedExpenseTypes"]:
+        if expense_data["documentType"] not in company_settings["allowedExpenseTypes"]:
+            validation_results["is_valid"] = False
+            validation_results["errors"].append("Tipo de documento no permitido")
+    if "date" in expense_data and expense_data["date"] > datetime.now():
+        validation_results["is_valid"] = False
+        validation_results["errors"].append("La fecha no puede ser futura")
+    return validation_results
+
+
+def run(args) -> Dict[str, Any]:
+    rng = random.Random(1)
+    users = generate_users(generate_companies(1, rng), 500, rng, "x")
+    expenses = list(generate_expenses(users, args.expenses, rng, with_search=False))
+    results = {"expenses": len(expenses), "rules": len(SETTINGS["policyRules"]) + 4}
+    # Los gastos generados no deben recorrerse en cada pasada del recolector
+    gc.freeze()
+
+    started = time.perf_counter()
+    for _ in range(1000):
+        compile_policy(SETTINGS)
+    results["compile_us"] = round((time.perf_counter() - started) / 1000 * 1e6, 1)
+
+    started = time.perf_counter()
+    [legacy_validate(expense, SETTINGS) for expense in expenses]
+    elapsed = time.perf_counter() - started
+    results["legacy_4_rules_per_sec"] = round(len(expenses) / elapsed)
+
+    legacy_settings = {k: v for k, v in SETTINGS.items() if k != "policyRules"}
+    policy = compile_policy(legacy_settings)
+    started = time.perf_counter()
+    policy.evaluate_batch(expenses)
+    elapsed = time.perf_counter() - started
+    results["compiled_4_rules_per_sec"] = round(len(expenses) / elapsed)
+
+    policy = compile_policy(SETTINGS)
+    started = time.perf_counter()
+    batch = policy.evaluate_batch(expenses, "employee")
+    elapsed = time.perf_counter() - started
+    results["compiled_all_rules_per_sec"] = round(len(expenses) / elapsed)
+    results["invalid"] = sum(1 for r in batch if not r["is_valid"])
+
+    for key, value in results.items():
+        print(f"{key:28} {value}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del motor de políticas")
+    parser.add_argument("--expenses", type=int, default=200000)
+    parser.add_argument("--output", default=None)
+    arguments = parser.parse_args()
+    output = run(arguments)
+    if arguments.output:
+        write_results(arguments.output, "policy", output)
@@ -0,0 +1,230 @@
+"""Micro-benchmarks de los métodos de los repositorios por tamaño de colección.
+
+Uso:
+    # Medir y guardar una línea base
+    python -m benchmarks.repository_benchmark --sizes 10000,100000,1000000 --output repo_base.json
+
+    # Medir otra vez y marcar regresiones respecto de la línea base
+    python -m benchmarks.repository_benchmark --sizes 10000,100000 --baseline repo_base.json --output repo.json
+
+Para cada tamaño se vuelve a sembrar la base y se llama cada método de forma
+secuencial con argumentos variados (usuarios y empresas con el sesgo del
+seeder). Además de ops/s y percentiles, se registran los documentos y claves
+que MongoDB revisó: los comandos que emite una llamada se capturan con un
+listener del driver y se explican con `executionStats`. Un método que de
+pronto revisa muchos más documentos perdió su índice aunque el tiempo aún no
+lo muestre.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Callable, Awaitable
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+from app.infrastructure.database.mongodb import Database
+from app.infrastructure.monitoring.slow_queries import summarize_explain
+from benchmarks.common import DEFAULT_MONGO_URL, DEFAULT_DB_NAME, percentiles, write_results
+from benchmarks.seed import seed, generate_expenses
+
+# Comandos que se pueden explicar y campos del driver que `explain` no acepta
+EXPLAINABLE_COMMANDS = frozenset(("find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"))
+DRIVER_FIELDS = frozenset(("lsid", "txnNumber", "$clusterTime", "$db", "$readPreference", "writeConcern",
+                           "readConcern", "apiVersion", "apiStrict", "apiDeprecationErrors"))
+
+
+class CommandCapture(monitoring.CommandListener):
+    """Guarda los comandos emitidos mientras `capturing` está activo."""
+
+    def __init__(self):
+        self.capturing = False
+        self.commands: List[Dict[str, Any]] = []
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if self.capturing and event.command_name in EXPLAINABLE_COMMANDS:
+            self.commands.append({k: v for k, v in event.command.items() if k not in DRIVER_FIELDS})
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def examined(db, capture: CommandCapture, call: Callable[[], Awaitable[Any]]) -> Dict[str, Any]:
+    """Documentos y claves revisados por una llamada, sumando todos sus comandos."""
+    capture.commands = []
+    capture.capturing = True
+    try:
+        await call()
+    finally:
+        capture.capturing = False
+
+    totals = {"commands": len(capture.commands), "docsExamined": 0, "keysExamined": 0, "plans": []}
+    for command in capture.commands:
+        if next(iter(command)) == "aggregate":
+            command["cursor"] = {}
+        explain = await db.command({"explain": command, "verbosity": "executionStats"})
+        summary = summarize_explain(explain)
+        totals["docsExamined"] += summary["docsExamined"]
+        totals["keysExamined"] += summary["keysExamined"]
+        totals["plans"].append(summary["planSummary"])
+    return totals
+
+
+def build_cases(database: Database, summary: Dict[str, Any], expense_ids: List[str],
+                rng: random.Random) -> Dict[str, Callable[[], Awaitable[Any]]]:
+    """Una función sin argumentos por método medido; cada llamada elige argumentos distintos."""
+    expenses = database.get_expense_repository()
+    users = database.get_user_repository()
+    user_docs = summary["users"]
+    companies = [str(c) for c in summary["companies"]]
+    approvers = [u for u in user_docs if u["role"] in ("manager", "admin")] or user_docs
+    now = datetime.now()
+
+    def window():
+        start = now - timedelta(days=rng.randint(7, 365))
+        return start, start + timedelta(days=rng.choice([7, 30, 90]))
+
+    async def find_by_id():
+        await expenses.find_by_id(rng.choice(expense_ids))
+
+    async def find_by_user():
+        await expenses.find_by_user(str(rng.choice(user_docs)["_id"]), 0, 50)
+
+    async def find_by_company():
+        await expenses.find_by_company(rng.choice(companies), 0, 50)
+
+    async def find_by_date_range():
+        start, end = window()
+        await expenses.find_by_date_range(start, end, rng.choice(companies), 0, 50)
+
+    async def get_stats_by_category():
+        start, end = window()
+        await expenses.get_stats_by_category(rng.choice(companies), start, end)
+
+    async def update_status():
+        await expenses.update_status(rng.choice(expense_ids), rng.choice(["approved", "rejected", "pending"]),
+                                     str(rng.choice(approvers)["_id"]))
+
+    async def create():
+        document = next(generate_expenses(user_docs, 1, rng))
+        await expenses.create(document)
+
+    async def user_find_by_email():
+        await users.find_by_email(rng.choice(user_docs)["email"])
+
+    async def user_find_by_company():
+        await users.find_by_company(rng.choice(companies), 0, 50)
+
+    return {
+        "ExpenseRepository.find_by_id": find_by_id,
+        "ExpenseRepository.find_by_user": find_by_user,
+        "ExpenseRepository.find_by_company": find_by_company,
+        "ExpenseRepository.find_by_date_range": find_by_date_range,
+        "ExpenseRepository.get_stats_by_category": get_stats_by_category,
+        "ExpenseRepository.update_status": update_status,
+        "ExpenseRepository.create": create,
+        "UserRepository.find_by_email": user_find_by_email,
+        "UserRepository.find_by_company": user_find_by_company,
+    }
+
+
+async def measure(call: Callable[[], Awaitable[Any]], iterations: int, warmup: int) -> Dict[str, Any]:
+    for _ in range(warmup):
+        await call()
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        begin = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - begin)
+    elapsed = time.perf_counter() - started
+    return {"ops_per_sec": round(iterations / elapsed, 1), **percentiles(samples)}
+
+
+async def run_size(database: Database, capture: CommandCapture, size: int, args) -> Dict[str, Any]:
+    summary = await seed(database.db, args.companies, args.users, size)
+    print(f"\n{size} gastos sembrados en {summary['seconds']}s")
+    await database.create_indexes()
+
+    sample = await database.db.expenses.aggregate([{"$sample": {"size": 1000}}, {"$project": {"_id": 1}}]).to_list(None)
+    expense_ids = [str(doc["_id"]) for doc in sample]
+    rng = random.Random(args.seed)
+    cases = build_cases(database, summary, expense_ids, rng)
+    selected = [name for name in cases if not args.only or any(part in name for part in args.only.split(","))]
+
+    results = {}
+    for name in selected:
+        stats = await measure(cases[name], args.iterations, args.warmup)
+        # Misma semilla en cada medición de documentos revisados, para comparar entre corridas
+        rng.seed(args.seed)
+        stats.update(await examined(database.db, capture, cases[name]))
+        results[name] = stats
+        print(f"{name:42} {stats['ops_per_sec']:>9} ops/s  p95={stats['p95_ms']}ms  "
+              f"docs={stats['docsExamined']} keys={stats['keysExamined']}")
+    return results
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Regresiones respecto de la línea base: menos ops/s que el umbral o más documentos revisados."""
+    regressions = []
+    for size, methods in current.items():
+        for name, stats in methods.items():
+            previous = baseline.get(size, {}).get(name)
+            if not previous:
+                continue
+            drop = (previous["ops_per_sec"] - stats["ops_per_sec"]) / previous["ops_per_sec"] * 100
+            if drop > threshold:
+                regressions.append(f"{size} {name}: {previous['ops_per_sec']} -> {stats['ops_per_sec']} ops/s (-{drop:.1f}%)")
+            # Los documentos revisados no dependen del ruido de la máquina: cualquier aumento claro cuenta
+            if stats["docsExamined"] > previous["docsExamined"] * 1.1 + 10:
+                regressions.append(f"{size} {name}: docsExamined {previous['docsExamined']} -> {stats['docsExamined']}")
+    return regressions
+
+
+async def run(args) -> Dict[str, Any]:
+    capture = CommandCapture()
+    # Cliente propio, sin los listeners de métricas, compartido por los repositorios vía Database
+    Database.client = AsyncIOMotorClient(args.mongo_url, event_listeners=[capture])
+    Database.db = Database.client[args.db]
+    database = Database(args.mongo_url, args.db)
+
+    results = {}
+    for size in (int(s) for s in args.sizes.split(",")):
+        results[str(size)] = await run_size(database, capture, size, args)
+
+    await database.close()
+    return {"iterations": args.iterations, "sizes": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks de los repositorios")
+    parser.add_argument("--mongo-url", default=DEFAULT_MONGO_URL)
+    parser.add_argument("--db", default=DEFAULT_DB_NAME)
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Cantidades de gastos separadas por coma")
+    parser.add_argument("--companies", type=int, default=20)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--only", default=None, help="Medir solo los métodos cuyo nombre contiene alguno de estos textos")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--baseline", default=None, help="JSON de una corrida anterior con la cual comparar")
+    parser.add_argument("--threshold", type=float, default=10, help="Caída de ops/s (%%) considerada regresión")
+    parser.add_argument("--output", default=None)
+    arguments = parser.parse_args()
+    output = asyncio.run(run(arguments))
+    if arguments.output:
+        write_results(arguments.output, "repository_benchmark", output)
+
+    if arguments.baseline:
+        with open(arguments.baseline) as f:
+            base = json.load(f)["results"]["sizes"]
+        found = compare(output["sizes"], base, arguments.threshold)
+        print("\nSin regresiones respecto de la línea base" if not found else "\nRegresiones:\n  " + "\n  ".join(found))
+        sys.exit(1 if found else 0)
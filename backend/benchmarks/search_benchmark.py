@@ -0,0 +1,105 @@
+"""Latencia de la búsqueda de gastos sobre un dataset sembrado.
+
+Uso:
+    python -m benchmarks.search_benchmark --expenses 1000000 --output search.json
+
+Si la base ya tiene al menos `--expenses` gastos no se vuelve a sembrar.
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import Dict, Any, List
+
+from bson import ObjectId
+
+from app.domain.services.expense_service import ExpenseService
+from app.infrastructure.database.mongodb import Database
+from benchmarks.common import DEFAULT_MONGO_URL, DEFAULT_DB_NAME, percentiles, write_results
+from benchmarks.seed import seed
+
+QUERIES = [
+    "hotel",              # palabra completa frecuente
+    "hot",                # prefijo
+    "cafe",               # sin tilde contra "Café"
+    "ÑUÑOA",              # mayúsculas y eñe
+    "taxi aeropuerto",    # varios términos
+    "almuerzo cliente",
+    "copec",
+    "F-12",               # número de documento
+    "capacitacion",       # etiqueta
+    "inexistente",        # sin resultados
+]
+
+
+async def _sample_scopes(database: Database, count: int, rng: random.Random) -> Dict[str, List[str]]:
+    """Elige empresas y usuarios reales, ponderados por su volumen de gastos."""
+    pipeline = [{"$sample": {"size": count}}, {"$project": {"companyId": 1, "userId": 1}}]
+    sample = await database.get_collection("expenses").aggregate(pipeline).to_list(None)
+    return {
+        "company": [str(doc["companyId"]) for doc in sample],
+        "user": [str(doc["userId"]) for doc in sample]
+    }
+
+
+async def run(args) -> Dict[str, Any]:
+    database = Database(args.mongo_url, args.db)
+    await database.connect()
+
+    total = await database.get_collection("expenses").estimated_document_count()
+    if total < args.expenses:
+        summary = await seed(database.db, args.companies, args.users, args.expenses)
+        print(f"Sembrados {summary['expenses']} gastos en {summary['seconds']}s")
+    await database.create_indexes()
+
+    service = ExpenseService(database.get_expense_repository())
+    rng = random.Random(7)
+    scopes = await _sample_scopes(database, args.iterations, rng)
+    results = {}
+
+    for scope in ("user", "company"):
+        for query in QUERIES:
+            first_page, second_page = [], []
+            hits = 0
+            for i in range(args.iterations):
+                owner = scopes[scope][i % len(scopes[scope])]
+                kwargs = {"user_id": owner} if scope == "user" else {"company_id": owner}
+
+                started = time.perf_counter()
+                items = await service.search_expenses(query, limit=args.limit, **kwargs)
+                first_page.append(time.perf_counter() - started)
+                hits += len(items)
+
+                if len(items) == args.limit:
+                    last = items[-1]
+                    after = (last["score"], last["date"], ObjectId(last["_id"]))
+                    started = time.perf_counter()
+                    await service.search_expenses(query, after=after, limit=args.limit, **kwargs)
+                    second_page.append(time.perf_counter() - started)
+
+            results[f"{scope}:{query}"] = {
+                "avg_hits": round(hits / args.iterations, 1),
+                "first_page": percentiles(first_page),
+                "second_page": percentiles(second_page)
+            }
+            print(f"{scope:8} {query!r:22} p50={results[f'{scope}:{query}']['first_page']['p50_ms']}ms "
+                  f"p99={results[f'{scope}:{query}']['first_page']['p99_ms']}ms")
+
+    await database.close()
+    return {"expenses": max(total, args.expenses), "limit": args.limit, "queries": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de búsqueda de gastos")
+    parser.add_argument("--mongo-url", default=DEFAULT_MONGO_URL)
+    parser.add_argument("--db", default=DEFAULT_DB_NAME)
+    parser.add_argument("--companies", type=int, default=50)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--expenses", type=int, default=1000000)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--output", default=None)
+    arguments = parser.parse_args()
+    output = asyncio.run(run(arguments))
+    if arguments.output:
+        write_results(arguments.output, "search", output)
@@ -0,0 +1,213 @@
+"""Generador de datos sintéticos realistas para benchmarks y pruebas de carga.
+
+La distribución imita a un cliente real: pocas empresas concentran la mayoría
+de los usuarios, pocos usuarios concentran la mayoría de los gastos, los montos
+siguen una distribución log-normal por categoría y hay menos gastos en fin de semana.
+
+Uso:
+    python -m benchmarks.seed --expenses 1000000
+"""
+import argparse
+import asyncio
+import math
+import random
+import time
+from itertools import accumulate
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Iterator
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+from app.domain.services.text_search import build_search_fields
+from benchmarks.common import DEFAULT_MONGO_URL, DEFAULT_DB_NAME
+
+BENCH_PASSWORD = "bench-password"
+
+CATEGORIES = {
+    # categoría: (peso, mediana del monto en CLP, dispersión log-normal)
+    "Alimentación": (40, 12000, 0.6),
+    "Transporte": (30, 8000, 0.8),
+    "Alojamiento": (8, 65000, 0.5),
+    "Material Oficina": (12, 15000, 0.9),
+    "Otros": (10, 20000, 1.1),
+}
+
+VENDORS = {
+    "Alimentación": ["Restaurant El Chileno", "Café Altura", "Juan Maestro", "Doggis", "Sushi Ñuñoa",
+                     "Panadería La Espiga", "Starbucks", "Líder Express"],
+    "Transporte": ["Uber", "Cabify", "DiDi", "Copec", "Shell", "Metro de Santiago", "Turbus", "Autopista Central"],
+    "Alojamiento": ["Hotel Plaza San Francisco", "Hostal Valparaíso", "Airbnb", "Hotel Diego de Almagro"],
+    "Material Oficina": ["Librería Nacional", "Lápiz López", "OfficeMax", "Dimeiggs"],
+    "Otros": ["Falabella", "Ripley", "Paris", "MercadoLibre", "Farmacias Ahumada"],
+}
+
+DESCRIPTIONS = {
+    "Alimentación": ["Almuerzo con cliente", "Cena de equipo", "Desayuno reunión", "Café reunión proveedores"],
+    "Transporte": ["Taxi al aeropuerto", "Combustible visita a terreno", "Peaje ruta 68", "Estacionamiento oficina cliente"],
+    "Alojamiento": ["Hotel viaje a Concepción", "Alojamiento feria Antofagasta", "Hospedaje capacitación"],
+    "Material Oficina": ["Papel y tóner impresora", "Impresión de contratos", "Artículos de papelería"],
+    "Otros": ["Regalo corporativo", "Medicamentos botiquín", "Cable HDMI sala de reuniones"],
+}
+
+TAGS = ["viaje", "cliente", "proyecto-norte", "urgente", "reembolsable", "capacitación", "terreno"]
+DOCUMENT_TYPES = [("Boleta", 60), ("Factura", 30), ("Recibo", 7), ("Otro", 3)]
+STATUSES = [("approved", 70), ("pending", 20), ("rejected", 10)]
+ROLES = [("employee", 85), ("manager", 12), ("admin", 3)]
+
+
+def zipf_weights(n: int, s: float = 1.1) -> List[float]:
+    """Pesos con cola larga: el elemento i recibe 1/(i+1)^s."""
+    return [1 / (i + 1) ** s for i in range(n)]
+
+
+def _weighted(rng: random.Random, pairs):
+    values, weights = zip(*pairs)
+    return rng.choices(values, weights=weights)[0]
+
+
+def _rut(rng: random.Random, base: int) -> str:
+    """Genera un RUT con dígito verificador válido."""
+    number = base + rng.randint(0, 999)
+    s = sum(int(d) * [2, 3, 4, 5, 6, 7][i % 6] for i, d in enumerate(reversed(str(number))))
+    dv = 11 - s % 11
+    dv = "0" if dv == 11 else "K" if dv == 10 else str(dv)
+    return f"{number}-{dv}"
+
+
+def generate_companies(n: int, rng: random.Random) -> List[Dict[str, Any]]:
+    """Genera empresas con configuración por defecto."""
+    return [
+        {
+            "_id": ObjectId(),
+            "name": f"Empresa Benchmark {i}",
+            "rut": _rut(rng, 76000000 + i * 1000),
+            "settings": {
+                "currency": "CLP",
+                "approvalWorkflow": True,
+                "categories": list(CATEGORIES),
+                "allowedExpenseTypes": [t for t, _ in DOCUMENT_TYPES],
+                "maxExpenseAmount": None
+            },
+            "createdAt": datetime.now(),
+            "isActive": True
+        }
+        for i in range(n)
+    ]
+
+
+def generate_users(companies: List[Dict[str, Any]], n: int, rng: random.Random,
+                   hashed_password: str) -> List[Dict[str, Any]]:
+    """Genera usuarios repartidos entre empresas con sesgo Zipf (pocas empresas grandes)."""
+    cum_weights = list(accumulate(zipf_weights(len(companies))))
+    users = []
+    for i in range(n):
+        company = rng.choices(companies, cum_weights=cum_weights)[0]
+        users.append({
+            "_id": ObjectId(),
+            "email": f"user{i}@bench.gastify.cl",
+            "hashed_password": hashed_password,
+            "profile": {"firstName": f"Nombre{i}", "lastName": f"Apellido{i}", "rut": _rut(rng, 10000000 + i * 1000)},
+            "companyId": company["_id"],
+            "role": _weighted(rng, ROLES),
+            "createdAt": datetime.now(),
+            "isActive": True
+        })
+    return users
+
+
+def generate_expenses(users: List[Dict[str, Any]], n: int, rng: random.Random,
+                      days: int = 365, with_search: bool = True) -> Iterator[Dict[str, Any]]:
+    """Genera gastos con montos log-normales por categoría y usuarios con sesgo Zipf."""
+    cum_weights = list(accumulate(zipf_weights(len(users), 0.9)))
+    categories = [(c, w) for c, (w, _, _) in CATEGORIES.items()]
+    now = datetime.now()
+
+    for _ in range(n):
+        user = rng.choices(users, cum_weights=cum_weights)[0]
+        category = _weighted(rng, categories)
+        _, median, sigma = CATEGORIES[category]
+        date = now - timedelta(days=rng.random() * days)
+        # Menos gastos en fin de semana: se corre la mitad de ellos al viernes
+        if date.weekday() >= 5 and rng.random() < 0.5:
+            date -= timedelta(days=date.weekday() - 4)
+        status = _weighted(rng, STATUSES)
+        document_type = _weighted(rng, DOCUMENT_TYPES)
+
+        expense = {
+            "userId": user["_id"],
+            "companyId": user["companyId"],
+            "amount": float(round(math.exp(rng.gauss(math.log(median), sigma)))),
+            "currency": "CLP",
+            "description": rng.choice(DESCRIPTIONS[category]),
+            "category": category,
+            "date": date,
+            "status": status,
+            "approvalFlow": [],
+            "documentType": document_type,
+            "documentNumber": f"{document_type[0]}-{rng.randint(1000, 999999)}",
+            "vendor": rng.choice(VENDORS[category]),
+            "tags": rng.sample(TAGS, k=rng.choice([0, 0, 1, 1, 2])),
+            "createdAt": date,
+            "updatedAt": date
+        }
+        if with_search:
+            expense["search"] = build_search_fields(expense)
+        yield expense
+
+
+async def seed(db: AsyncIOMotorDatabase, companies: int = 20, users: int = 2000, expenses: int = 100000,
+               batch_size: int = 10000, random_seed: int = 42, reset: bool = True) -> Dict[str, Any]:
+    """Puebla la base de datos indicada y devuelve un resumen con los IDs generados."""
+    from app.infrastructure.security.password import get_password_hash
+
+    rng = random.Random(random_seed)
+    started = time.perf_counter()
+
+    if reset:
+        for name in ("companies", "users", "expenses"):
+            await db[name].drop()
+
+    company_docs = generate_companies(companies, rng)
+    # Un único hash para todos: bcrypt es deliberadamente lento
+    user_docs = generate_users(company_docs, users, rng, get_password_hash(BENCH_PASSWORD))
+    await db.companies.insert_many(company_docs)
+    await db.users.insert_many(user_docs)
+
+    batch = []
+    inserted = 0
+    for expense in generate_expenses(user_docs, expenses, rng):
+        batch.append(expense)
+        if len(batch) >= batch_size:
+            await db.expenses.insert_many(batch, ordered=False)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        await db.expenses.insert_many(batch, ordered=False)
+        inserted += len(batch)
+
+    return {
+        "companies": [c["_id"] for c in company_docs],
+        "users": [{"_id": u["_id"], "email": u["email"], "companyId": u["companyId"], "role": u["role"]}
+                  for u in user_docs],
+        "expenses": inserted,
+        "seconds": round(time.perf_counter() - started, 2)
+    }
+
+
+async def _main(args):
+    client = AsyncIOMotorClient(args.mongo_url)
+    summary = await seed(client[args.db], args.companies, args.users, args.expenses)
+    print(f"{len(summary['companies'])} empresas, {len(summary['users'])} usuarios y "
+          f"{summary['expenses']} gastos en {summary['seconds']}s")
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pobla MongoDB con datos sintéticos de Gastify")
+    parser.add_argument("--mongo-url", default=DEFAULT_MONGO_URL)
+    parser.add_argument("--db", default=DEFAULT_DB_NAME)
+    parser.add_argument("--companies", type=int, default=20)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--expenses", type=int, default=100000)
+    asyncio.run(_main(parser.parse_args()))
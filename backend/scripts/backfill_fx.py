@@ -0,0 +1,45 @@
+"""Calcula el monto en moneda de la empresa de los gastos creados antes de la conversión al escribir.
+
+Uso:
+    python -m scripts.backfill_fx [--all | --fallback]
+
+Las tasas se leen de FX_RATES_FILE (o de las tasas de referencia). Con
+`--fallback` se recalculan además los gastos convertidos con las tasas de
+referencia, p. ej. al configurar FX_RATES_FILE por primera vez. Después de
+migrar conviene ejecutar `scripts.rebuild_budgets`, ya que los contadores de
+presupuesto se acumulan en la moneda de la empresa.
+"""
+import argparse
+import asyncio
+import os
+
+from app.infrastructure.database.mongodb import Database
+from app.infrastructure.external.fx_service import get_fx_service, FX_SOURCE_FALLBACK
+
+
+async def main(rebuild_all: bool, include_fallback: bool):
+    fx_service = get_fx_service()
+    if include_fallback and fx_service.source == FX_SOURCE_FALLBACK:
+        raise SystemExit("--fallback requiere configurar FX_RATES_FILE")
+
+    database = Database(os.getenv("MONGO_URL", "mongodb://mongo:27017"))
+    await database.connect()
+
+    companies = database.get_collection("companies").find({}, {"settings.currency": 1})
+    currency_by_company = {c["_id"]: (c.get("settings") or {}).get("currency") async for c in companies}
+
+    counts = await database.get_expense_repository().backfill_company_amounts(
+        currency_by_company, fx_service, only_missing=not rebuild_all, include_fallback=include_fallback
+    )
+    print(f"Gastos actualizados: {counts['updated']}, sin tasa para su moneda: {counts['skipped']}")
+
+    await database.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convierte los gastos existentes a la moneda de su empresa")
+    parser.add_argument("--all", action="store_true", help="Recalcular también los gastos ya convertidos")
+    parser.add_argument("--fallback", action="store_true",
+                        help="Recalcular también los gastos convertidos con las tasas de referencia")
+    arguments = parser.parse_args()
+    asyncio.run(main(arguments.all, arguments.fallback))
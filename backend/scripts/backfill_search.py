@@ -0,0 +1,27 @@
+"""Calcula los términos de búsqueda de los gastos creados antes de que existiera la búsqueda.
+
+Uso:
+    python -m scripts.backfill_search [--all]
+"""
+import argparse
+import asyncio
+import os
+
+from app.infrastructure.database.mongodb import Database
+
+
+async def main(rebuild_all: bool):
+    database = Database(os.getenv("MONGO_URL", "mongodb://mongo:27017"))
+    await database.connect()
+    await database.create_indexes()
+
+    updated = await database.get_expense_repository().rebuild_search_fields(only_missing=not rebuild_all)
+    print(f"Gastos actualizados: {updated}")
+
+    await database.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recalcula los términos de búsqueda de los gastos")
+    parser.add_argument("--all", action="store_true", help="Recalcular también los gastos que ya tienen términos")
+    asyncio.run(main(parser.parse_args().all))
@@ -0,0 +1,27 @@
+"""Asigna `updatedAt` a los gastos creados antes de que se guardara al crearlos.
+
+Debe ejecutarse antes de habilitar `/api/expenses/sync`: la sincronización y el
+archivo recorren los gastos por `updatedAt` y omitirían los que no lo tienen.
+
+Uso:
+    python -m scripts.backfill_updated_at
+"""
+import asyncio
+import os
+
+from app.infrastructure.database.mongodb import Database
+
+
+async def main():
+    database = Database(os.getenv("MONGO_URL", "mongodb://mongo:27017"))
+    await database.connect()
+    await database.create_indexes()
+
+    updated = await database.get_expense_repository().backfill_updated_at()
+    print(f"Gastos actualizados: {updated}")
+
+    await database.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+"""Mide el tiempo de importación de la aplicación y falla si supera el presupuesto.
+
+Uso:
+    python -m scripts.check_import_time [--budget-ms 1500] [--runs 5] [--top 15]
+
+Cada medición importa `app.main` en un intérprete nuevo (como un worker recién
+escalado) con `-X importtime`. Se informa la mediana del tiempo total y los
+módulos más costosos de la última corrida. Además se verifica que los
+componentes que se cargan con el primer uso (numpy, passlib, httpx, OCR) no se
+importen al arrancar. Sale con código 1 si se excede el presupuesto o se
+importa alguno de ellos, para poder usarlo en CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, Any, List, Tuple
+
+# Módulos que no deben cargarse al importar la aplicación
+LAZY_MODULES = ("numpy", "passlib", "httpx", "PIL", "app.infrastructure.external.ocr_service",
+                "app.domain.services.anomaly_service")
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+print(json.dumps({"ms": elapsed * 1000, "loaded": [m for m in %r if m in sys.modules]}))
+"""
+
+
+def measure_once() -> Tuple[Dict[str, Any], str]:
+    """Importa la aplicación en un proceso nuevo; devuelve la medición y el informe de `-X importtime`."""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, "PYTHONPATH": backend_dir}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE % (LAZY_MODULES,)],
+                            capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(f"No se pudo importar app.main:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_modules(importtime: str, top: int) -> List[Tuple[int, str]]:
+    """Módulos de primer nivel bajo `app` y dependencias directas, por tiempo acumulado (µs)."""
+    rows = []
+    for line in importtime.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Solo los módulos importados directamente (dos espacios de sangría como máximo)
+        if len(name) - len(name.lstrip()) <= 3:
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main(budget_ms: float, runs: int, top: int) -> int:
+    samples = []
+    for _ in range(runs):
+        measurement, importtime = measure_once()
+        samples.append(measurement["ms"])
+
+    median = statistics.median(samples)
+    print(f"Importación de app.main: mediana {median:.0f} ms en {runs} corridas "
+          f"(mín {min(samples):.0f}, máx {max(samples):.0f}); presupuesto {budget_ms:.0f} ms")
+    print("\nMódulos más costosos (acumulado):")
+    for micros, name in slowest_modules(importtime, top):
+        print(f"  {micros / 1000:8.1f} ms  {name}")
+
+    failed = False
+    if measurement["loaded"]:
+        print(f"\nMódulos que deberían cargarse con el primer uso: {', '.join(measurement['loaded'])}")
+        failed = True
+    if median > budget_ms:
+        print(f"\nSe excede el presupuesto de arranque por {median - budget_ms:.0f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Presupuesto de tiempo de importación de la aplicación")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "1500")))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    arguments = parser.parse_args()
+    sys.exit(main(arguments.budget_ms, arguments.runs, arguments.top))
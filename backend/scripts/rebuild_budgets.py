@@ -0,0 +1,35 @@
+"""Reconstruye los contadores de presupuesto a partir de los gastos.
+
+Uso:
+    python -m scripts.rebuild_budgets [--company <id>]
+
+Corrige desvíos de los contadores (p. ej. escrituras hechas fuera de la API o
+fallas entre la escritura del gasto y la del contador). Los gastos que se
+escriban mientras corre pueden quedar fuera de los contadores, así que se
+ejecuta en una ventana de mantenimiento y no como tarea programada.
+"""
+import argparse
+import asyncio
+import os
+
+from app.domain.repositories.expense_repository import ARCHIVE_COLLECTION
+from app.infrastructure.database.mongodb import Database
+
+
+async def main(company_id: str = None):
+    database = Database(os.getenv("MONGO_URL", "mongodb://mongo:27017"))
+    await database.connect()
+    await database.create_indexes()
+
+    counters = await database.get_budget_repository().rebuild(
+        database.get_collection("expenses"), company_id, archive=database.get_collection(ARCHIVE_COLLECTION)
+    )
+    print(f"Contadores vigentes: {counters}")
+
+    await database.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstruye los contadores de presupuesto")
+    parser.add_argument("--company", default=None, help="Reconstruir solo los contadores de esta empresa")
+    asyncio.run(main(parser.parse_args().company))
@@ -0,0 +1,32 @@
+import mongomock_motor
+import pytest
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.infrastructure.cache import idempotency
+from app.infrastructure.database.mongodb import Database
+from app.infrastructure.security.jwt import get_current_user
+
+
+@pytest.fixture
+def database(monkeypatch):
+    """Base de datos en memoria (mongomock) compartida por todas las instancias de `Database`."""
+    client = mongomock_motor.AsyncMongoMockClient()
+    monkeypatch.setattr(Database, "client", client)
+    monkeypatch.setattr(Database, "db", client["gastify_test"])
+    monkeypatch.setattr(idempotency, "_store", None)
+    return Database()
+
+
+@pytest.fixture
+def current_user():
+    return {"sub": str(ObjectId()), "role": "employee", "company_id": str(ObjectId()), "email": "test@gastify.cl"}
+
+
+@pytest.fixture
+def client(database, current_user):
+    """Cliente de la API autenticado como `current_user`; no ejecuta los eventos de inicio."""
+    app.dependency_overrides[get_current_user] = lambda: current_user
+    yield TestClient(app)
+    app.dependency_overrides.clear()
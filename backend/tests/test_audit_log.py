@@ -0,0 +1,111 @@
+import asyncio
+from collections import deque
+
+import mongomock_motor
+import pytest
+from bson import ObjectId
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from app.infrastructure.audit.audit_log import AuditLog
+
+
+class FlakyCollection:
+    """Inserta en mongomock y luego simula el error indicado, como si la respuesta se hubiera perdido."""
+
+    def __init__(self, collection, error=None):
+        self.collection = collection
+        self.error = error
+
+    async def insert_many(self, documents, ordered=True):
+        if self.error is None:
+            return await self.collection.insert_many(documents, ordered=ordered)
+        error, self.error = self.error, None
+        if isinstance(error, BulkWriteError):
+            failed = {item["index"] for item in error.details["writeErrors"]}
+            written = [document for index, document in enumerate(documents) if index not in failed]
+        else:
+            written = documents
+        for document in documents:
+            document.setdefault("_id", ObjectId())
+        await self.collection.insert_many([dict(document) for document in written], ordered=False)
+        raise error
+
+
+@pytest.fixture
+def collection():
+    return mongomock_motor.AsyncMongoMockClient()["gastify_test"]["audit_log"]
+
+
+def _audit_log(collection, error=None) -> AuditLog:
+    audit_log = AuditLog(FlakyCollection(collection, error))
+    for number in range(3):
+        audit_log.record("expense", f"e{number}", "update")
+    return audit_log
+
+
+def test_retry_after_lost_response_does_not_duplicate(collection):
+    audit_log = _audit_log(collection, AutoReconnect("conexión perdida"))
+    with pytest.raises(AutoReconnect):
+        asyncio.run(audit_log.flush())
+    assert len(audit_log.pending) == 3
+
+    # Los registros ya escritos fallan por clave duplicada y no vuelven a la cola
+    asyncio.run(audit_log.flush())
+    assert not audit_log.pending
+    assert asyncio.run(collection.count_documents({})) == 3
+
+
+def test_partial_failure_requeues_only_unwritten(collection):
+    error = BulkWriteError({"writeErrors": [{"index": 1, "code": 121, "errmsg": "validación"}]})
+    audit_log = _audit_log(collection, error)
+    with pytest.raises(BulkWriteError):
+        asyncio.run(audit_log.flush())
+    assert [record["entityId"] for record in audit_log.pending] == ["e1"]
+
+    asyncio.run(audit_log.flush())
+    assert not audit_log.pending
+    documents = asyncio.run(collection.find().to_list(None))
+    assert sorted(document["entityId"] for document in documents) == ["e0", "e1", "e2"]
+
+
+class FillingCollection:
+    """Simula que llegan registros nuevos mientras la escritura está en curso y luego falla."""
+
+    def __init__(self, audit_log, incoming):
+        self.audit_log = audit_log
+        self.incoming = incoming
+
+    async def insert_many(self, documents, ordered=True):
+        for number in range(self.incoming):
+            self.audit_log.record("expense", f"n{number}", "update")
+        raise AutoReconnect("conexión perdida")
+
+
+def test_requeue_on_full_queue_counts_what_does_not_fit():
+    audit_log = AuditLog(None)
+    audit_log.pending = deque(maxlen=4)
+    for number in range(3):
+        audit_log.record("expense", f"e{number}", "update")
+    audit_log.collection = FillingCollection(audit_log, incoming=3)
+
+    with pytest.raises(AutoReconnect):
+        asyncio.run(audit_log.flush())
+
+    # Solo cabe uno de los reencolados; los registros nuevos no se pierden en silencio
+    assert [record["entityId"] for record in audit_log.pending] == ["e0", "n0", "n1", "n2"]
+    assert audit_log.dropped == 2
+
+
+def test_unencodable_batch_does_not_stop_the_writer(collection):
+    async def scenario():
+        audit_log = AuditLog(collection, flush_seconds=0.01)
+        audit_log.start()
+        audit_log.record("expense", "e0", "update", {"amount": object()})
+        await asyncio.sleep(0.05)
+        audit_log.record("expense", "e1", "update", {"amount": 10})
+        await asyncio.sleep(0.05)
+        assert not audit_log._task.done()
+        await audit_log.stop()
+        return await collection.find().to_list(None)
+
+    assert [document["entityId"] for document in asyncio.run(scenario())] == ["e1"]
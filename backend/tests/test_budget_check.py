@@ -0,0 +1,27 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.domain.services.expense_service import ExpenseService
+
+
+class StubBudgets:
+    async def find_for_expense(self, expense):
+        return {"user": {"amount": 1000000}}
+
+
+def test_budget_message_shows_available_amount_without_exponent():
+    service = ExpenseService(SimpleNamespace(budget_repository=StubBudgets()), fx_service=object())
+
+    errors = asyncio.run(service.check_budget({"amount": 2000000}, {"monthlyUserBudget": 2500000}))
+
+    assert errors == ["El gasto excede el presupuesto mensual del usuario (disponible: 1.500.000)"]
+
+
+def test_budget_message_keeps_decimals_for_currencies_that_use_them():
+    service = ExpenseService(SimpleNamespace(budget_repository=StubBudgets()), fx_service=object())
+
+    errors = asyncio.run(service.check_budget(
+        {"amount": 2000000}, {"currency": "USD", "monthlyUserBudget": 1000099.5}
+    ))
+
+    assert errors == ["El gasto excede el presupuesto mensual del usuario (disponible: 99,50)"]
@@ -0,0 +1,110 @@
+import asyncio
+from datetime import datetime
+
+import mongomock_motor
+import pytest
+from bson import ObjectId
+
+from app.domain.repositories.expense_repository import ExpenseRepository
+from app.domain.services.expense_service import ExpenseService
+from app.infrastructure.cache import invalidation
+from app.infrastructure.cache.invalidation import InvalidationBus, dashboard_key, INVALIDATION_COLLECTION
+
+
+class CountingStats:
+    """Estadísticas de dashboard que cuentan los cálculos; con `release` esperan hasta que se les indique."""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = None
+
+    async def __call__(self, company_id, start, end):
+        self.calls += 1
+        if self.release is not None:
+            await self.release.wait()
+        return {"calls": self.calls}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(invalidation, "_bus", None)
+    return mongomock_motor.AsyncMongoMockClient()["dashboard_test"]
+
+
+@pytest.fixture
+def service(db):
+    repository = ExpenseRepository(db.expenses, None, db.expenses_archive, db.archive_watermarks, db.expense_tombstones)
+    repository.get_dashboard_stats = CountingStats()
+    return ExpenseService(repository, fx_service=object())
+
+
+async def _pending_expense(service, company_id) -> str:
+    created = await service.repository.collection.insert_one(
+        {"companyId": company_id, "userId": ObjectId(), "amount": 1000, "date": datetime(2025, 3, 1),
+         "status": "pending"}
+    )
+    return str(created.inserted_id)
+
+
+@pytest.mark.parametrize("change", [
+    lambda service, expense_id: service.approve_expense(expense_id, str(ObjectId())),
+    lambda service, expense_id: service.reject_expense(expense_id, str(ObjectId())),
+    lambda service, expense_id: service.update(expense_id, {"description": "Taxi"}),
+    lambda service, expense_id: service.delete(expense_id),
+], ids=["approve", "reject", "update", "delete"])
+def test_expense_changes_invalidate_company_dashboards(service, change):
+    company_id = ObjectId()
+
+    async def scenario():
+        expense_id = await _pending_expense(service, company_id)
+        await service.get_dashboard(str(company_id))
+        await change(service, expense_id)
+        return await service.get_dashboard(str(company_id))
+
+    assert asyncio.run(scenario())["calls"] == 2
+
+
+def test_changes_are_published_to_other_workers(db, service, monkeypatch):
+    monkeypatch.setattr(invalidation, "_bus", InvalidationBus(db[INVALIDATION_COLLECTION]))
+    company_id = ObjectId()
+
+    async def scenario():
+        await service.approve_expense(await _pending_expense(service, company_id), str(ObjectId()))
+        return await db[INVALIDATION_COLLECTION].find_one({"_id": dashboard_key(str(company_id))})
+
+    assert asyncio.run(scenario())["version"] == 1
+
+
+def test_notice_from_another_worker_invalidates_dashboards(db, service):
+    company_id = str(ObjectId())
+    subscriber = InvalidationBus(db[INVALIDATION_COLLECTION])
+
+    async def scenario():
+        await service.get_dashboard(company_id)
+        # Lo que escribe `publish` en otro worker; este lo recibe al sondear
+        await db[INVALIDATION_COLLECTION].insert_one(
+            {"_id": dashboard_key(company_id), "version": 1, "updatedAt": datetime.now()}
+        )
+        await subscriber.resync()
+        return await service.get_dashboard(company_id)
+
+    assert asyncio.run(scenario())["calls"] == 2
+
+
+def test_dashboard_computed_across_an_invalidation_is_not_reused(service):
+    company_id = str(ObjectId())
+    stats = service.repository.get_dashboard_stats
+
+    async def scenario():
+        stats.release = asyncio.Event()
+        computing = asyncio.create_task(service.get_dashboard(company_id))
+        while stats.calls == 0:
+            await asyncio.sleep(0)
+        # El gasto cambia mientras el cálculo sigue en curso
+        await service.invalidate_dashboards(company_id)
+        stats.release.set()
+        stale = await computing
+        return stale, await service.get_dashboard(company_id)
+
+    stale, fresh = asyncio.run(scenario())
+    assert (stale["calls"], fresh["calls"]) == (1, 2)
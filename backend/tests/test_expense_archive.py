@@ -0,0 +1,63 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import mongomock_motor
+import pytest
+from bson import ObjectId
+
+from app.domain.repositories import expense_repository
+from app.domain.repositories.budget_repository import BudgetRepository
+from app.domain.repositories.expense_repository import ExpenseRepository
+from app.infrastructure.cache.ttl_cache import TTLCache
+
+
+@pytest.fixture
+def repository(monkeypatch):
+    # La marca de agua se cachea por nombre de colección: cada prueba parte sin archivo
+    monkeypatch.setattr(expense_repository, "_watermark_cache", TTLCache(30, max_entries=16))
+    db = mongomock_motor.AsyncMongoMockClient()["archive_test"]
+    return ExpenseRepository(db.expenses, BudgetRepository(db.budget_counters), db.expenses_archive,
+                             db.archive_watermarks, db.expense_tombstones)
+
+
+async def _archived_expense(repository) -> str:
+    old = datetime.now() - timedelta(days=500)
+    created = await repository.create({
+        "userId": ObjectId(), "companyId": ObjectId(), "amount": 5000, "currency": "CLP",
+        "category": "Transporte", "description": "Taxi", "date": old, "status": "approved", "updatedAt": old
+    })
+    counts = await repository.archive_older_than(datetime.now() - timedelta(days=400),
+                                                 pause_seconds=0, watermark_wait_seconds=0)
+    assert counts["moved"] == 1
+    return str(created["_id"])
+
+
+def test_update_of_archived_expense_moves_it_back(repository):
+    async def scenario():
+        expense_id = await _archived_expense(repository)
+
+        updated = await repository.update(expense_id, {"description": "Taxi al aeropuerto"})
+        status = await repository.update_status(expense_id, "rejected", str(ObjectId()))
+
+        assert updated["description"] == "Taxi al aeropuerto"
+        assert status["status"] == "rejected"
+        assert await repository.collection.count_documents({"_id": ObjectId(expense_id)}) == 1
+        assert await repository.archive.count_documents({}) == 0
+
+    asyncio.run(scenario())
+
+
+def test_delete_of_archived_expense_leaves_tombstone_and_adjusts_budget(repository):
+    async def scenario():
+        expense_id = await _archived_expense(repository)
+        counted = await repository.budget_repository.collection.find_one({"scope": "user"})
+        assert counted["amount"] == 5000
+
+        assert await repository.delete(expense_id)
+
+        assert await repository.find_by_id(expense_id) is None
+        assert await repository.tombstones.count_documents({"_id": ObjectId(expense_id)}) == 1
+        counted = await repository.budget_repository.collection.find_one({"scope": "user"})
+        assert counted is None or counted["amount"] == 0
+
+    asyncio.run(scenario())
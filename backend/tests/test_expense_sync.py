@@ -0,0 +1,133 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import mongomock_motor
+import pytest
+from bson import ObjectId
+
+from app.domain.repositories.expense_repository import ExpenseRepository
+from app.domain.services import expense_sync
+from app.domain.services.expense_sync import sync_expenses, SyncTokenExpired, encode_sync_token
+
+
+class StubFX:
+    def company_amount_fields(self, expense, company_currency):
+        return {"companyAmount": expense["amount"], "companyCurrency": company_currency, "fxRate": 1.0}
+
+
+@pytest.fixture
+def repository(monkeypatch):
+    monkeypatch.setattr(expense_sync, "SYNC_SETTLE_SECONDS", 0)
+    db = mongomock_motor.AsyncMongoMockClient()["sync_test"]
+    return ExpenseRepository(db.expenses, None, db.expenses_archive, db.archive_watermarks, db.expense_tombstones)
+
+
+async def _sync_all(repository, user_id, token=None, limit=5):
+    changed, deleted = [], []
+    while True:
+        page = await sync_expenses(repository, user_id, token, limit)
+        changed += page["changed"]
+        deleted += page["deleted"]
+        token = page["nextToken"]
+        if not page["hasMore"]:
+            return changed, deleted, token
+
+
+def _expense(user, amount, updated_at):
+    return {"userId": user, "companyId": ObjectId(), "amount": amount, "currency": "CLP",
+            "category": "Transporte", "description": "Taxi", "date": updated_at, "updatedAt": updated_at}
+
+
+def test_full_then_incremental_sync(repository):
+    async def scenario():
+        user = ObjectId()
+        base = datetime.now() - timedelta(hours=1)
+        ids = [str((await repository.create(_expense(user, i, base + timedelta(seconds=i // 3))))["_id"])
+               for i in range(12)]
+        await repository.create(_expense(ObjectId(), 99, base))
+
+        changed, deleted, token = await _sync_all(repository, str(user))
+        assert sorted(d["amount"] for d in changed) == list(range(12))
+        assert deleted == []
+
+        changed, deleted, token = await _sync_all(repository, str(user), token)
+        assert (changed, deleted) == ([], [])
+
+        # MongoDB guarda milisegundos: los cambios deben quedar después de la posición del token
+        await asyncio.sleep(0.01)
+        await repository.update(ids[2], {"amount": 200})
+        await repository.delete(ids[5])
+        changed, deleted, _ = await _sync_all(repository, str(user), token)
+        assert [d["amount"] for d in changed] == [200]
+        assert deleted == [ids[5]]
+
+    asyncio.run(scenario())
+
+
+def test_expired_token_requires_full_sync(repository):
+    stale = encode_sync_token((datetime.now(), ObjectId()), datetime.now() - timedelta(days=365))
+    with pytest.raises(SyncTokenExpired):
+        asyncio.run(sync_expenses(repository, str(ObjectId()), stale))
+
+
+def test_legacy_expenses_without_updated_at_are_backfilled(repository):
+    async def scenario():
+        user = ObjectId()
+        created = datetime.now() - timedelta(days=30)
+        legacy = {**_expense(user, 1, created), "createdAt": created}
+        del legacy["updatedAt"]
+        await repository.collection.insert_one(legacy)
+
+        assert (await _sync_all(repository, str(user)))[0] == []
+        assert await repository.backfill_updated_at() == 1
+        changed, _, _ = await _sync_all(repository, str(user))
+        assert [d["_id"] for d in changed] == [legacy["_id"]]
+        assert abs(changed[0]["updatedAt"] - created) < timedelta(milliseconds=1)
+
+    asyncio.run(scenario())
+
+
+def test_company_amount_backfill_is_synced(repository):
+    async def scenario():
+        user = ObjectId()
+        await repository.collection.insert_one(_expense(user, 5000, datetime.now() - timedelta(days=10)))
+        _, _, token = await _sync_all(repository, str(user))
+
+        await asyncio.sleep(0.01)
+        counts = await repository.backfill_company_amounts({}, StubFX())
+        assert counts["updated"] == 1
+        changed, _, _ = await _sync_all(repository, str(user), token)
+        assert changed[0]["companyAmount"] == 5000
+
+    asyncio.run(scenario())
+
+
+def test_expense_created_through_api_is_synced(client, current_user, monkeypatch):
+    monkeypatch.setattr(expense_sync, "SYNC_SETTLE_SECONDS", 0)
+    created = client.post("/api/expenses/", json={
+        "userId": current_user["sub"],
+        "companyId": current_user["company_id"],
+        "amount": 8000,
+        "description": "Taxi al aeropuerto",
+        "category": "Transporte",
+        "date": datetime(2024, 5, 2, 9, 0).isoformat()
+    })
+    assert created.status_code == 201, created.text
+
+    synced = client.get("/api/expenses/sync")
+
+    assert synced.status_code == 200
+    assert [expense["_id"] for expense in synced.json()["changed"]] == [created.json()["_id"]]
+
+
+def test_backfill_fills_null_updated_at(repository):
+    async def scenario():
+        user = ObjectId()
+        created_at = datetime.now() - timedelta(days=3)
+        await repository.collection.insert_one({**_expense(user, 10, None), "createdAt": created_at})
+
+        assert await repository.backfill_updated_at() == 1
+        changed, _, _ = await _sync_all(repository, str(user))
+        assert abs(changed[0]["updatedAt"] - created_at) < timedelta(milliseconds=1)
+
+    asyncio.run(scenario())
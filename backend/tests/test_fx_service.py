@@ -0,0 +1,41 @@
+import asyncio
+from datetime import datetime
+
+import mongomock_motor
+from bson import ObjectId
+
+from app.domain.repositories.expense_repository import ExpenseRepository
+from app.infrastructure.external import fx_service
+from app.infrastructure.external.fx_service import FXService
+
+
+def test_amounts_from_reference_rates_are_marked(monkeypatch, capsys):
+    monkeypatch.delenv("FX_RATES_FILE", raising=False)
+    monkeypatch.setattr(fx_service, "_fx_service", None)
+
+    service = fx_service.get_fx_service()
+    fields = service.company_amount_fields({"amount": 10, "currency": "USD", "date": datetime(2025, 2, 1)}, "CLP")
+
+    assert fields["fxSource"] == "fallback"
+    assert "FX_RATES_FILE" in capsys.readouterr().out
+
+
+def test_backfill_replaces_fallback_amounts_with_configured_rates():
+    db = mongomock_motor.AsyncMongoMockClient()["fx_test"]
+    repository = ExpenseRepository(db.expenses, None, db.expenses_archive, db.archive_watermarks, db.expense_tombstones)
+    expense = {"amount": 10, "currency": "USD", "date": datetime(2025, 2, 1), "companyId": ObjectId()}
+    configured = FXService({"USD": {"2025-01-01": 1000.0}})
+
+    async def scenario():
+        await db.expenses.insert_one({**expense, **FXService().company_amount_fields(expense, "CLP")})
+
+        # Sin `include_fallback` los montos ya convertidos no se tocan
+        counts = await repository.backfill_company_amounts({}, configured)
+        assert counts["updated"] == 0
+
+        counts = await repository.backfill_company_amounts({}, configured, include_fallback=True)
+        assert counts["updated"] == 1
+        stored = await db.expenses.find_one({})
+        assert (stored["companyAmount"], stored["fxSource"]) == (10000, "configured")
+
+    asyncio.run(scenario())
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.infrastructure.cache.idempotency import REPLAYED_HEADER
+
+
+def _expense(current_user):
+    return {
+        "userId": current_user["sub"],
+        "companyId": current_user["company_id"],
+        "amount": 12500,
+        "description": "Almuerzo con cliente",
+        "category": "Alimentación",
+        "date": datetime(2024, 5, 2, 13, 0).isoformat()
+    }
+
+
+def test_retry_with_same_key_replays_original_response(client, database, current_user):
+    headers = {"Idempotency-Key": "retry-1"}
+    first = client.post("/api/expenses/", json=_expense(current_user), headers=headers)
+    retry = client.post("/api/expenses/", json=_expense(current_user), headers=headers)
+
+    assert first.status_code == 201, first.text
+    assert retry.status_code == 201, retry.text
+    assert retry.headers.get(REPLAYED_HEADER) == "true"
+    assert retry.json()["_id"] == first.json()["_id"]
+
+
+def test_same_key_with_different_body_is_rejected(client, database, current_user):
+    headers = {"Idempotency-Key": "retry-2"}
+    assert client.post("/api/expenses/", json=_expense(current_user), headers=headers).status_code == 201
+
+    changed = {**_expense(current_user), "amount": 99000}
+    assert client.post("/api/expenses/", json=changed, headers=headers).status_code == 422
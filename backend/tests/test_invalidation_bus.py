@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import mongomock_motor
+import pytest
+from bson import ObjectId
+
+from app.domain.repositories.company_repository import CompanyRepository
+from app.domain.services.company_service import CompanyService
+from app.infrastructure.cache import invalidation
+from app.infrastructure.cache.invalidation import InvalidationBus, on_invalidate, company_key
+
+# Plazo para que un worker vea una publicación de otro sondeando la colección
+DELIVERY_BOUND_SECONDS = 0.5
+
+
+@pytest.fixture
+def db(monkeypatch):
+    # Sin manejadores de otros módulos: cada prueba registra los suyos
+    monkeypatch.setattr(invalidation, "_handlers", {})
+    monkeypatch.setattr(invalidation, "POLL_SECONDS", 0.02)
+    return mongomock_motor.AsyncMongoMockClient()["invalidation_test"]
+
+
+def test_publish_reaches_another_worker_within_bound(db):
+    evicted = []
+    on_invalidate("test:")(evicted.append)
+
+    async def scenario():
+        # mongomock no tiene change streams: los dos workers sondean, como un servidor sin réplica
+        publisher = InvalidationBus(db[invalidation.INVALIDATION_COLLECTION], use_change_stream=False)
+        subscriber = InvalidationBus(db[invalidation.INVALIDATION_COLLECTION], use_change_stream=False)
+        subscriber.start()
+        await asyncio.sleep(0.05)
+
+        published_at = time.monotonic()
+        await publisher.publish("test:1")
+        while subscriber.version("test:1") < 1 and time.monotonic() - published_at < DELIVERY_BOUND_SECONDS:
+            await asyncio.sleep(0.01)
+        elapsed = time.monotonic() - published_at
+        await subscriber.stop()
+        return elapsed
+
+    assert asyncio.run(scenario()) < DELIVERY_BOUND_SECONDS
+    # En un mismo proceso los manejadores son compartidos: uno por quien publica y otro por quien sondea
+    assert evicted == ["test:1", "test:1"]
+
+
+def test_missed_message_is_corrected_by_versioned_key(db, monkeypatch):
+    company_id = ObjectId()
+
+    async def scenario():
+        await db.companies.insert_one({"_id": company_id, "name": "Antes"})
+        publisher = InvalidationBus(db[invalidation.INVALIDATION_COLLECTION], use_change_stream=False)
+        subscriber = InvalidationBus(db[invalidation.INVALIDATION_COLLECTION], use_change_stream=False)
+        service = CompanyService(CompanyRepository(db.companies, subscriber))
+
+        # El sondeo del suscriptor no alcanza a correr: el aviso se pierde
+        monkeypatch.setattr(invalidation, "POLL_SECONDS", 3600)
+        subscriber.start()
+        await asyncio.sleep(0.01)
+        assert (await service.get_by_id(str(company_id)))["name"] == "Antes"
+
+        await db.companies.update_one({"_id": company_id}, {"$set": {"name": "Después"}})
+        await publisher.publish(company_key(str(company_id)))
+        stale = await service.get_by_id(str(company_id))
+
+        # La relectura periódica trae la versión nueva y la clave de la caché deja de coincidir
+        await subscriber.resync()
+        fresh = await service.get_by_id(str(company_id))
+        await subscriber.stop()
+        return stale, fresh
+
+    stale, fresh = asyncio.run(scenario())
+    assert stale["name"] == "Antes"
+    assert fresh["name"] == "Después"
@@ -0,0 +1,50 @@
+import asyncio
+import io
+
+import pytest
+from PIL import Image
+
+from app.infrastructure.storage import media_storage
+
+
+@pytest.fixture
+def storage(monkeypatch, tmp_path):
+    monkeypatch.setenv("MEDIA_ROOT", str(tmp_path))
+    monkeypatch.setattr(media_storage, "_storage", None)
+    return media_storage.get_media_storage()
+
+
+def _png(width: int = 400, height: int = 300) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_upload_rejects_content_that_does_not_match_its_type(client, storage):
+    for name, data, content_type in (
+        ("boleta.png", b"notapng", "image/png"),
+        ("boleta.jpg", _png(), "image/jpeg"),
+        ("boleta.pdf", b"notapdf", "application/pdf"),
+    ):
+        response = client.post("/api/media/receipts", files={"file": (name, data, content_type)})
+        assert response.status_code == 415, content_type
+
+
+def test_variant_of_valid_receipt(client, storage):
+    response = client.post("/api/media/receipts", files={"file": ("boleta.png", _png(), "image/png")})
+    assert response.status_code == 201
+
+    variant = client.get(response.json()["url"], params={"w": 160, "format": "jpeg"})
+    assert variant.status_code == 200
+    assert Image.open(io.BytesIO(variant.content)).size == (160, 120)
+
+
+def test_variant_of_unreadable_original(client, database, current_user, storage):
+    # Boleta guardada antes de validar el contenido en la subida
+    digest, _ = storage.save_original(b"notapng", "image/png")
+    asyncio.run(database.get_receipt_repository().record(
+        digest, current_user["company_id"], current_user["sub"], "image/png", 7, "boleta.png"
+    ))
+
+    response = client.get(f"/api/media/receipts/{digest}", params={"w": 160})
+    assert response.status_code == 415
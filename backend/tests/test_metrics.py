@@ -0,0 +1,9 @@
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from app.infrastructure.monitoring.metrics import metrics_response
+
+
+def test_metrics_content_type_has_a_single_charset():
+    response = metrics_response()
+
+    assert response.headers.getlist("content-type") == [CONTENT_TYPE_LATEST]
@@ -0,0 +1,60 @@
+import asyncio
+from datetime import datetime
+
+from bson import ObjectId
+
+
+def _insert(database, collection, document):
+    return asyncio.run(database.get_collection(collection).insert_one(document)).inserted_id
+
+
+def _company(current_user):
+    return {
+        "_id": ObjectId(current_user["company_id"]),
+        "name": "Empresa de Prueba",
+        "rut": "76123456-7",
+        "settings": {"currency": "CLP", "approvalWorkflow": True, "categories": ["Transporte"]},
+        "adminIds": [ObjectId()],
+        "isActive": True
+    }
+
+
+def test_company_routes_serialize_object_ids(client, database, current_user):
+    _insert(database, "companies", _company(current_user))
+
+    mine = client.get("/api/companies/my-company")
+    by_id = client.get(f"/api/companies/{current_user['company_id']}")
+
+    assert mine.status_code == 200, mine.text
+    assert by_id.status_code == 200, by_id.text
+    assert mine.json()["_id"] == by_id.json()["_id"] == current_user["company_id"]
+
+
+def test_company_settings_update_serializes_object_ids(client, database, current_user):
+    current_user["role"] = "admin"
+    _insert(database, "companies", _company(current_user))
+
+    response = client.put(f"/api/companies/{current_user['company_id']}/settings",
+                          json={"currency": "CLP", "approvalWorkflow": False, "categories": ["Transporte"]})
+
+    assert response.status_code == 200, response.text
+    assert response.json()["_id"] == current_user["company_id"]
+
+
+def test_expense_update_serializes_object_ids(client, database, current_user):
+    expense_id = _insert(database, "expenses", {
+        "userId": ObjectId(current_user["sub"]),
+        "companyId": ObjectId(current_user["company_id"]),
+        "amount": 8000,
+        "currency": "CLP",
+        "description": "Taxi",
+        "category": "Transporte",
+        "date": datetime(2024, 5, 2),
+        "status": "pending"
+    })
+
+    response = client.put(f"/api/expenses/{expense_id}", json={"description": "Taxi aeropuerto"})
+
+    assert response.status_code == 200, response.text
+    assert response.json()["_id"] == str(expense_id)
+    assert response.json()["userId"] == current_user["sub"]
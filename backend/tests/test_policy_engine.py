@@ -0,0 +1,36 @@
+from app.domain.services.policy_engine import compile_policy
+
+
+def test_messages_show_amounts_without_exponent():
+    policy = compile_policy({
+        "maxExpenseAmount": 1500000,
+        "policyRules": [
+            {"type": "categoryCap", "category": "viajes", "amount": 1200000},
+            {"type": "roleLimit", "role": "employee", "amount": 1000000},
+            {"type": "receiptRequired", "amount": 250000.0}
+        ]
+    })
+
+    errors = policy.evaluate({"amount": 2000000, "category": "viajes"}, "employee")
+
+    assert errors == [
+        "El monto excede el máximo permitido de 1.500.000",
+        "El monto excede el tope de 1.200.000 para la categoría viajes",
+        "El monto excede el límite de 1.000.000 para el rol employee",
+        "Se requiere comprobante para montos desde 250.000"
+    ]
+
+
+def test_messages_keep_decimals_for_currencies_that_use_them():
+    policy = compile_policy({
+        "currency": "USD",
+        "maxExpenseAmount": 1500.25,
+        "policyRules": [{"type": "categoryCap", "category": "comidas", "amount": 99.5}]
+    })
+
+    errors = policy.evaluate({"amount": 2000, "category": "comidas", "receiptUrl": "x"}, "employee")
+
+    assert errors == [
+        "El monto excede el máximo permitido de 1.500,25",
+        "El monto excede el tope de 99,50 para la categoría comidas"
+    ]
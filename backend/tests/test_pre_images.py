@@ -0,0 +1,96 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from app.domain.repositories.expense_repository import ARCHIVE_MARKER
+from app.infrastructure.database.mongodb import Database
+from app.infrastructure.events.expense_stream import ExpenseChangeBroker
+
+
+class CommandRecorder:
+    def __init__(self, error=None):
+        self.commands = []
+        self.error = error
+
+    async def command(self, name, value, **options):
+        self.commands.append((name, value, options))
+        if self.error:
+            raise self.error
+
+
+def test_pre_images_are_enabled_on_expenses(monkeypatch):
+    db = CommandRecorder()
+    monkeypatch.setattr(Database, "db", db)
+
+    assert asyncio.run(Database().enable_pre_images("expenses"))
+    assert db.commands == [("collMod", "expenses", {"changeStreamPreAndPostImages": {"enabled": True}})]
+
+
+def test_servers_without_pre_images_do_not_block_startup(monkeypatch):
+    monkeypatch.setattr(Database, "db", CommandRecorder(OperationFailure("no soportado", 40415)))
+
+    assert not asyncio.run(Database().enable_pre_images("expenses"))
+
+
+def test_delete_is_routed_with_its_pre_image():
+    change = {
+        "_id": {"_data": "82"},
+        "operationType": "delete",
+        "documentKey": {"_id": "e1"},
+        "fullDocumentBeforeChange": {"companyId": "c1", "userId": "u1"}
+    }
+
+    event = ExpenseChangeBroker._to_event(change)
+
+    assert (event["type"], event["companyId"], event["expenseId"]) == ("delete", "c1", "e1")
+
+
+def test_move_to_archive_is_not_announced_as_delete():
+    change = {
+        "_id": {"_data": "83"},
+        "operationType": "delete",
+        "documentKey": {"_id": "e1"},
+        "fullDocumentBeforeChange": {"companyId": "c1", "userId": "u1", ARCHIVE_MARKER: "2026-10-19"}
+    }
+
+    assert ExpenseChangeBroker._to_event(change) is None
+
+
+class StubStreamCollection:
+    """Colección cuyo `watch` falla con los errores indicados y luego detiene el broker."""
+
+    def __init__(self, version, errors=()):
+        self.database = SimpleNamespace(client=SimpleNamespace(server_info=self._server_info))
+        self.version = version
+        self.errors = list(errors)
+        self.watch_options = []
+
+    async def _server_info(self):
+        return {"version": ".".join(map(str, self.version)), "versionArray": list(self.version)}
+
+    def watch(self, pipeline, **options):
+        self.watch_options.append(options)
+        raise self.errors.pop(0) if self.errors else asyncio.CancelledError()
+
+
+@pytest.mark.parametrize("version, requested", [((5, 0, 0), False), ((6, 0, 0), True)])
+def test_pre_images_are_requested_only_when_supported(version, requested):
+    collection = StubStreamCollection(version)
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(ExpenseChangeBroker(collection)._watch())
+
+    assert ("full_document_before_change" in collection.watch_options[0]) == requested
+
+
+def test_watch_survives_unexpected_errors(monkeypatch):
+    collection = StubStreamCollection((6, 0, 0), [RuntimeError("inesperado")])
+    fast_sleep = asyncio.sleep
+    monkeypatch.setattr(asyncio, "sleep", lambda seconds: fast_sleep(0))
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(ExpenseChangeBroker(collection)._watch())
+
+    assert len(collection.watch_options) == 2
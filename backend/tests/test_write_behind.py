@@ -0,0 +1,53 @@
+import asyncio
+
+import mongomock_motor
+from bson import ObjectId
+
+from app.infrastructure.database.write_behind import WriteBehindBuffer
+
+
+class BrokenOnceCollection:
+    """Falla la primera escritura con un error que no es de MongoDB."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.failed = False
+
+    async def bulk_write(self, operations, ordered=True):
+        if not self.failed:
+            self.failed = True
+            raise TypeError("error inesperado")
+        return await self.collection.bulk_write(operations, ordered=ordered)
+
+
+def test_flush_loop_survives_unexpected_errors():
+    collection = mongomock_motor.AsyncMongoMockClient()["write_behind_test"]["users"]
+
+    async def scenario():
+        document_id = (await collection.insert_one({"logins": 0})).inserted_id
+        buffer = WriteBehindBuffer("test", BrokenOnceCollection(collection), flush_seconds=0.01)
+
+        buffer.record(document_id, {"$max": {"logins": 1}})
+        await asyncio.sleep(0.05)
+        assert not buffer._task.done()
+
+        buffer.record(document_id, {"$max": {"logins": 2}})
+        await asyncio.sleep(0.05)
+        await buffer.stop()
+        return await collection.find_one({"_id": document_id})
+
+    assert asyncio.run(scenario())["logins"] == 2
+
+
+def test_dead_task_is_restarted():
+    async def scenario():
+        buffer = WriteBehindBuffer("test", None, flush_seconds=60)
+        buffer.record(ObjectId(), {"$set": {"seen": True}})
+        buffer._task.cancel()
+        await asyncio.sleep(0)
+
+        buffer.record(ObjectId(), {"$set": {"seen": True}})
+        assert not buffer._task.done()
+        buffer._task.cancel()
+
+    asyncio.run(scenario())